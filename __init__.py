@@ -28,11 +28,44 @@ if "bpy" in locals_list:
     reload(sprytile_panel)
     reload(sprytile_utils)
     reload(sprytile_uv)
+    reload(sprytile_stats)
+    reload(sprytile_profile)
+    reload(sprytile_chunks)
+    reload(sprytile_greedy)
+    reload(sprytile_cull)
+    reload(sprytile_tiles)
+    reload(sprytile_cutout)
+    reload(sprytile_atlas)
+    reload(sprytile_detect)
+    reload(sprytile_tiled)
+    reload(sprytile_imagemap)
+    reload(sprytile_bvh)
+    reload(sprytile_journal)
+    reload(sprytile_replay)
+    reload(sprytile_export)
     reload(tool_build)
     reload(tool_paint)
     reload(tool_fill)
+    reload(tool_events)
+    reload(tool_recorder)
 else:
     from . import sprytile_gui, sprytile_modal, sprytile_panel, sprytile_utils, sprytile_uv
+    # Imported by absolute name, the same modules the tools use, as they hold state
+    import sprytile_stats
+    import sprytile_profile
+    import sprytile_chunks
+    import sprytile_greedy
+    import sprytile_cull
+    import sprytile_tiles
+    import sprytile_cutout
+    import sprytile_atlas
+    import sprytile_detect
+    import sprytile_tiled
+    import sprytile_imagemap
+    import sprytile_bvh
+    import sprytile_journal
+    import sprytile_replay
+    import sprytile_export
     from sprytile_tools import *
 
 import bpy
@@ -384,6 +417,31 @@ class SprytileSceneSettings(bpy.types.PropertyGroup):
         description="Automatically merge vertices when creating faces",
         default=True
     )
+    merge_at_stroke_end : BoolProperty(
+        name="Merge At Stroke End",
+        description="Auto merge the vertices of the faces built in a stroke once, when the stroke ends, "
+                    "instead of after every face. Much faster when building large areas",
+        default=False
+    )
+    trim_alpha : BoolProperty(
+        name="Alpha Trim",
+        description="Shrink built faces to the visible pixels of their tile, "
+                    "and skip building fully transparent tiles",
+        default=False
+    )
+    build_cutout : BoolProperty(
+        name="Cutout",
+        description="Cut built faces to the outline of their tile's visible pixels, for sprite like decals. "
+                    "Cutout faces aren't auto merged",
+        default=False
+    )
+    cutout_budget : IntProperty(
+        name="Cutout Vertices",
+        description="Most vertices for the outline of a cutout tile",
+        default=12,
+        min=4,
+        max=64
+    )
     auto_join : BoolProperty(
         name="Join Multi",
         description="Join multi tile faces when possible",
@@ -687,6 +745,19 @@ class PROP_OP_SprytilePropsSetup(bpy.types.Operator):
             default=-1
         )
 
+        bpy.types.Object.sprytile_chunk_size = IntProperty(
+            name="Chunk Size",
+            description="Size in tiles of the chunk objects the tilemap is split into, 0 if not chunked",
+            default=0,
+            min=0
+        )
+
+        bpy.types.Object.sprytile_chunk_key = StringProperty(
+            name="Chunk Key",
+            description="Region of the tilemap this chunk object covers",
+            default=""
+        )
+
 
 class PROP_OP_SprytilePropsTeardown(bpy.types.Operator):
     bl_idname = "sprytile.props_teardown"
@@ -718,6 +789,8 @@ class PROP_OP_SprytilePropsTeardown(bpy.types.Operator):
         del bpy.types.Scene.sprytile_ui
 
         del bpy.types.Object.sprytile_gridid
+        del bpy.types.Object.sprytile_chunk_size
+        del bpy.types.Object.sprytile_chunk_key
 
 
 class SprytileAddonPreferences(bpy.types.AddonPreferences):
@@ -737,6 +810,80 @@ class SprytileAddonPreferences(bpy.types.AddonPreferences):
         default=True,
     )
 
+    preview_rate_limit: bpy.props.IntProperty(
+        name="Preview Rate Limit",
+        description="Maximum times per second the build preview is rebuilt while moving the mouse. 0 for no limit",
+        default=60,
+        min=0,
+        max=240
+    )
+
+    use_stroke_journal: bpy.props.BoolProperty(
+        name="Stroke Undo Journal",
+        description="Record undo for Sprytile strokes as the faces they changed, instead of a full mesh copy "
+                    "per stroke. Ctrl+Z with a Sprytile tool active undoes journaled strokes one by one, "
+                    "Blender's own undo reverts them all at once",
+        default=False
+    )
+
+    stroke_journal_memory: bpy.props.IntProperty(
+        name="Journal Memory (MB)",
+        description="Memory the stroke journal can use before falling back to Blender's undo",
+        default=64,
+        min=1,
+        max=4096
+    )
+
+    use_timing_stats: bpy.props.BoolProperty(
+        name="Timing Stats",
+        description="Time each stage of the Sprytile tools and count expensive calls, "
+                    "for finding what makes painting slow. Export the stats as CSV from here",
+        default=False
+    )
+
+    show_timing_hud: bpy.props.BoolProperty(
+        name="Show Timing HUD",
+        description="Draw the timing stats in the corner of the viewport while Sprytile is active",
+        default=True
+    )
+
+    use_profile_capture: bpy.props.BoolProperty(
+        name="Capture Profiles",
+        description="Profile the next Sprytile operator runs or tool strokes with cProfile, saving .prof files "
+                    "and reports tagged with the mesh size and tool settings. Turns off once done",
+        default=False
+    )
+
+    profile_capture_count: bpy.props.IntProperty(
+        name="Captures",
+        description="Number of operator runs or strokes to profile",
+        default=3,
+        min=1,
+        max=100
+    )
+
+    profile_trace_memory: bpy.props.BoolProperty(
+        name="Trace Allocations",
+        description="Also report the top memory allocations with tracemalloc. Slows the captured runs down",
+        default=True
+    )
+
+    profile_capture_dir: bpy.props.StringProperty(
+        name="Profiles Folder",
+        description="Folder to save profiles to, the system temp folder if empty",
+        subtype='DIR_PATH',
+        default=""
+    )
+
+    stroke_sample_interval: bpy.props.IntProperty(
+        name="Stroke Sample Interval",
+        description="Minimum milliseconds between processing mouse moves while painting or building. "
+                    "Mouse moves that queued up while a slow stroke step ran are always skipped",
+        default=0,
+        min=0,
+        max=500
+    )
+
     auto_pixel_viewport: bpy.props.BoolProperty(
         name="Automatically setup pixel viewport",
         description="If enabled, loading a tileset will automatically setup the pixel viewport.\nDisable if you're not going for a flatshaded look",
@@ -773,6 +920,13 @@ class SprytileAddonPreferences(bpy.types.AddonPreferences):
         default=True,
     )
 
+    auto_grid_detect: bpy.props.BoolProperty(
+        name="Detect tile grid",
+        description="If enabled, loading a tileset will look for its tile size, padding and spacing, "
+                    "and suggest them for the tile grid",
+        default=True,
+    )
+
     #def set_picker(self, value):
     #    if "tile_picker_key" not in self.keys():
     #        self["tile_picker_key"] = 1
@@ -888,6 +1042,7 @@ class SprytileAddonPreferences(bpy.types.AddonPreferences):
         
         col = split.column()
         col.prop(self, "auto_grid_setup")
+        col.prop(self, "auto_grid_detect")
         col.prop(self, "auto_pixel_viewport")
         
         row = box.row()
@@ -899,6 +1054,33 @@ class SprytileAddonPreferences(bpy.types.AddonPreferences):
         col = split.column()
         col.prop(self, "auto_adjust_viewport_shading")
 
+        row = box.row()
+        split = row.split(factor=size_left_col)
+
+        col = split.column()
+        col.label(text="Performance:")
+
+        col = split.column(align=True)
+        col.prop(self, "preview_rate_limit")
+        col.prop(self, "stroke_sample_interval")
+        col.prop(self, "use_stroke_journal")
+        sub = col.row()
+        sub.enabled = self.use_stroke_journal
+        sub.prop(self, "stroke_journal_memory")
+        col.prop(self, "use_timing_stats")
+        sub = col.row(align=True)
+        sub.enabled = self.use_timing_stats
+        sub.prop(self, "show_timing_hud")
+        sub.operator("sprytile.stats_export", text="Export CSV")
+        sub.operator("sprytile.stats_reset", text="Reset")
+        row = col.row(align=True)
+        row.prop(self, "use_profile_capture")
+        row.prop(self, "profile_capture_count")
+        row.prop(self, "profile_trace_memory")
+        row = col.row(align=True)
+        row.prop(self, "profile_capture_dir", text="")
+        row.operator("sprytile.profile_open_folder", text="", icon='FILEBROWSER')
+
         #box = layout.box()
         #box.label(text = "Keyboard Shortcuts")
         #box.prop(self, "tile_picker_key")
@@ -1008,6 +1190,9 @@ def generate_tool_keymap(keyconfig, paint_mode):
     km_items.new("sprytile.rotate_right", 'E', 'PRESS')
     km_items.new("sprytile.flip_x_toggle", 'Q', 'PRESS').shift = True
     km_items.new("sprytile.flip_y_toggle", 'E', 'PRESS').shift = True
+    # Only run when the stroke journal has something to undo or redo
+    km_items.new("sprytile.journal_undo", 'Z', 'PRESS', ctrl=True)
+    km_items.new("sprytile.journal_redo", 'Z', 'PRESS', ctrl=True, shift=True)
 
     if paint_mode in {'MAKE_FACE', 'FILL'}:
         km_items.new("sprytile.snap_cursor", 'S', 'PRESS')
@@ -1062,6 +1247,21 @@ submodules = (
     sprytile_panel,
     sprytile_utils,
     sprytile_uv,
+    sprytile_stats,
+    sprytile_profile,
+    sprytile_chunks,
+    sprytile_greedy,
+    sprytile_cull,
+    sprytile_tiles,
+    sprytile_cutout,
+    sprytile_atlas,
+    sprytile_detect,
+    sprytile_tiled,
+    sprytile_imagemap,
+    sprytile_bvh,
+    sprytile_journal,
+    sprytile_replay,
+    sprytile_export,
     tool_build,
     tool_paint,
     tool_fill,
@@ -1085,6 +1285,12 @@ def sprytile_load_handler(dummy):
 def register():
     #addon_updater_ops.register(bl_info)
 
+    # Let profile captures wrap the operators before Blender sees them
+    sprytile_profile.addon_name = __name__
+    sprytile_profile.wrap_operators(classes)
+    for submod in submodules:
+        sprytile_profile.wrap_operators(getattr(submod, "classes", ()))
+
     for cl in classes:
         bpy.utils.register_class(cl)
 
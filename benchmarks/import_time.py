@@ -0,0 +1,77 @@
+"""Measure how long importing the vendored rx package takes.
+
+Runs `python -X importtime -c "import rx"` in fresh interpreters, with the
+add-on folder on the path the same way Blender sets it up, and reports the
+median cumulative import time and the slowest modules.
+
+Usage:
+    python benchmarks/import_time.py [--runs 10] [--top 15] [--module rx]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_once(module):
+    """
+    Imports module in a fresh interpreter
+    :param module: Name of the module to import
+    :return: dict of module name to cumulative import time in microseconds
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = ADDON_DIR
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=ADDON_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True
+    )
+
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            # The header line
+            continue
+        timings[fields[2].strip()] = cumulative
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--module", default="rx")
+    args = parser.parse_args()
+
+    runs = [run_once(args.module) for _ in range(args.runs)]
+
+    names = set()
+    for timings in runs:
+        names.update(timings)
+    medians = {}
+    for name in names:
+        medians[name] = statistics.median(timings.get(name, 0) for timings in runs)
+
+    total = medians.get(args.module, 0)
+    loaded = statistics.median(len(timings) for timings in runs)
+    print("import {}: {:.1f} ms median over {} runs, {:.0f} modules loaded".format(
+        args.module, total / 1000.0, args.runs, loaded))
+    print()
+    print("{:>10}  {}".format("cum. ms", "module"))
+    slowest = sorted(medians.items(), key=lambda item: item[1], reverse=True)
+    for name, value in slowest[1:args.top + 1]:
+        print("{:>10.1f}  {}".format(value / 1000.0, name))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,410 @@
+"""Time Sprytile's geometry and UV kernels on synthetic tilemaps.
+
+Tilemaps are square grids of one unit quads, from 1k to 1M faces by
+default. Inside Blender every kernel is timed against a real edit mesh.
+In plain CPython only the pure math kernels run, with stand-ins for
+Blender's modules (see standin.py), which needs numpy installed.
+
+Kernels that run per face are timed on up to --max-calls faces of each
+tilemap and report the time per call, so large maps stay practical.
+Each kernel is run --repeat times and the best and median times kept.
+
+Usage:
+    blender -b --python benchmarks/kernels.py -- [--sizes 1000 10000] [--output results.json]
+    python benchmarks/kernels.py [--sizes 1000 10000] [--output results.json]
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON_NAME = os.path.basename(ADDON_DIR)
+
+try:
+    import bpy
+    IN_BLENDER = hasattr(bpy, "app")
+except ImportError:
+    IN_BLENDER = False
+
+if IN_BLENDER:
+    import addon_utils
+    import bmesh
+    if os.path.dirname(ADDON_DIR) not in sys.path:
+        sys.path.insert(0, os.path.dirname(ADDON_DIR))
+    addon_utils.enable(ADDON_NAME, default_set=False)
+else:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, ADDON_DIR)
+    import standin
+    standin.install()
+
+from mathutils import Vector
+
+import sprytile_utils
+import sprytile_uv
+from sprytile_tools.tool_events import ToolEventBus
+from sprytile_tools.tool_fill import ToolFill
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+IMAGE_SIZE = (256, 256)
+GRID_SIZE = 32
+WORLD_PIXELS = 32
+TILE_COUNT = 64
+SEED = 1234
+# Tile whose only visible pixels are in its bottom left corner, away from the cell center
+TRIMMED_TILE = (7, 7)
+TRIMMED_PIXELS = 8
+
+
+def parse_args():
+    if "--" in sys.argv:
+        argv = sys.argv[sys.argv.index("--") + 1:]
+    else:
+        # Blender's own arguments come before the --
+        argv = [] if IN_BLENDER else sys.argv[1:]
+    parser = argparse.ArgumentParser(description="Time Sprytile kernels on synthetic tilemaps")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Tilemap face counts")
+    parser.add_argument("--max-calls", type=int, default=10000, help="Most calls of a per face kernel per run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each kernel")
+    parser.add_argument("--kernels", nargs="+", help="Only run these kernels")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def map_side(face_count):
+    return max(1, int(round(math.sqrt(face_count))))
+
+
+def tile_id(x, y):
+    """Tile of the synthetic map at a grid coordinate, stripes of a few tiles"""
+    return ((x // 3) * 7 + (y // 5) * 3) % TILE_COUNT
+
+
+def face_verts(x, y):
+    return [Vector((x, y, 0)), Vector((x + 1, y, 0)), Vector((x + 1, y + 1, 0)), Vector((x, y + 1, 0))]
+
+
+def sample_coords(side, count):
+    """Grid coordinates of count faces of the map, the same ones every run"""
+    rng = random.Random(SEED)
+    return [(rng.randrange(side), rng.randrange(side)) for i in range(count)]
+
+
+class Tilemap:
+    """A synthetic tilemap, with the settings the kernels read"""
+    def __init__(self, face_count):
+        self.side = map_side(face_count)
+        self.face_count = self.side * self.side
+        self.up_vector = Vector((0.0, 1.0, 0.0))
+        self.right_vector = Vector((1.0, 0.0, 0.0))
+        self.plane_normal = Vector((0.0, 0.0, 1.0))
+        self.data = SimpleNamespace(
+            world_pixels=WORLD_PIXELS, uv_flip_x=False, uv_flip_y=False, paint_mode='MAKE_FACE'
+        )
+        self.grid = SimpleNamespace(
+            grid=(GRID_SIZE, GRID_SIZE), padding=(0, 0), margin=(0, 0, 0, 0), offset=(0, 0),
+            rotate=0.0, auto_pad=True, auto_pad_offset=0.05
+        )
+
+    def fill_map(self):
+        """Fill map of a single tile, that floods entirely"""
+        import numpy
+        return numpy.zeros((self.side, self.side), dtype=int)
+
+    def free(self):
+        pass
+
+
+class BlenderTilemap(Tilemap):
+    """A synthetic tilemap as an edit mesh in the current scene, set up for Sprytile"""
+    def __init__(self, face_count):
+        super().__init__(face_count)
+        import sprytile_modal
+
+        context = bpy.context
+        side = self.side
+        verts = [(x, y, 0.0) for y in range(side + 1) for x in range(side + 1)]
+        faces = [(y * (side + 1) + x, y * (side + 1) + x + 1, (y + 1) * (side + 1) + x + 1, (y + 1) * (side + 1) + x)
+                 for y in range(side) for x in range(side)]
+        mesh = bpy.data.meshes.new("sprytile_bench")
+        mesh.from_pydata(verts, [], faces)
+        self.obj = bpy.data.objects.new("sprytile_bench", mesh)
+        context.scene.collection.objects.link(self.obj)
+
+        self.image = bpy.data.images.new("sprytile_bench", IMAGE_SIZE[0], IMAGE_SIZE[1], alpha=True)
+        self.set_trimmed_tile()
+        self.material = bpy.data.materials.new("sprytile_bench")
+        self.material.use_nodes = True
+        self.material.node_tree.nodes.new('ShaderNodeTexImage').image = self.image
+        mesh.materials.append(self.material)
+
+        context.view_layer.objects.active = self.obj
+        bpy.ops.sprytile.validate_grids()
+        self.grid = None
+        for mat_data in context.scene.sprytile_mats:
+            if mat_data.mat_id == self.material.name:
+                self.grid = mat_data.grids[0]
+        self.grid.grid = (GRID_SIZE, GRID_SIZE)
+        self.obj.sprytile_gridid = self.grid.id
+
+        self.data = context.scene.sprytile_data
+        self.data.world_pixels = WORLD_PIXELS
+        self.data.paint_mode = 'MAKE_FACE'
+        self.data.work_layer = 'BASE'
+        self.data.auto_merge = False
+        self.data.lock_normal = True
+        self.data.paint_normal_vector = self.plane_normal
+        self.data.paint_up_vector = self.up_vector
+        context.scene.cursor.location = (0.0, 0.0, 0.0)
+
+        bpy.ops.object.mode_set(mode='EDIT')
+        bm = bmesh.from_edit_mesh(mesh)
+        sprytile_modal.VIEW3D_OP_SprytileModalTool.verify_bmesh_layers(bm)
+        bm = bmesh.from_edit_mesh(mesh)
+        grid_layer = bm.faces.layers.int.get(sprytile_uv.UvDataLayers.GRID_INDEX)
+        tile_layer = bm.faces.layers.int.get(sprytile_uv.UvDataLayers.GRID_TILE_ID)
+        for face in bm.faces:
+            x, y = face.index % side, face.index // side
+            face[grid_layer] = self.grid.id
+            face[tile_layer] = tile_id(x, y)
+        bmesh.update_edit_mesh(mesh, True, True)
+
+        self.host = sprytile_modal.SprytileToolHost()
+        self.host.setup_tools(context)
+        self.host.update_bmesh_tree(context, True)
+        self.grid_right = self.right_vector * (GRID_SIZE / WORLD_PIXELS)
+        self.grid_up = self.up_vector * (GRID_SIZE / WORLD_PIXELS)
+
+    def set_trimmed_tile(self):
+        import numpy
+        pixels = numpy.ones((IMAGE_SIZE[1], IMAGE_SIZE[0], 4), dtype=numpy.float32)
+        x, y = TRIMMED_TILE[0] * GRID_SIZE, TRIMMED_TILE[1] * GRID_SIZE
+        pixels[y:y + GRID_SIZE, x:x + GRID_SIZE, 3] = 0.0
+        pixels[y:y + TRIMMED_PIXELS, x:x + TRIMMED_PIXELS, 3] = 1.0
+        self.image.pixels.foreach_set(pixels.ravel())
+
+    def free(self):
+        bpy.ops.object.mode_set(mode='OBJECT')
+        mesh = self.obj.data
+        bpy.data.objects.remove(self.obj)
+        bpy.data.meshes.remove(mesh)
+        bpy.data.materials.remove(self.material)
+        bpy.data.images.remove(self.image)
+
+
+def kernel_get_grid_area(tilemap, args, run):
+    sprytile_utils.get_grid_area(tilemap.side, tilemap.side)
+    return tilemap.face_count
+
+
+def kernel_get_uv_pos_size(tilemap, args, run):
+    coords = sample_coords(tilemap.side, min(tilemap.face_count, args.max_calls))
+    for x, y in coords:
+        verts = face_verts(x, y)
+        center = Vector((x + 0.5, y + 0.5, 0))
+        sprytile_uv.get_uv_pos_size(tilemap.data, IMAGE_SIZE, tilemap.grid, (x % 8, y % 8),
+                                    GRID_SIZE, GRID_SIZE, tilemap.up_vector, tilemap.right_vector,
+                                    verts, center)
+    return len(coords)
+
+
+def kernel_flood_fill(tilemap, args, run):
+    fill_map = tilemap.fill_map()
+    tool = ToolFill(None, ToolEventBus())
+    start = [0, 0]
+    tool.flood_fill(fill_map, start, -2, int(fill_map[0][0]))
+    return tilemap.face_count
+
+
+def kernel_build_fill_map(tilemap, args, run):
+    """Raycasts building the fill map over the whole tilemap, a row at a time"""
+    import numpy
+    context = bpy.context
+    tool = tilemap.host.tools["fill"]
+    side = tilemap.side
+    rows = max(1, min(side, args.max_calls // side))
+    fill_row = numpy.full(side, -1)
+    face_idx_row = numpy.full(side, -1)
+    for idx_y in range(rows):
+        tool.build_fill_map_row(context, tilemap.grid_up, tilemap.grid_right, tilemap.plane_normal,
+                                [0, 0], [side, side], idx_y, None, fill_row, face_idx_row)
+    return rows * side
+
+
+def construct_faces(tilemap, coords, tile_xy=None):
+    context = bpy.context
+    host = tilemap.host
+    for x, y in coords:
+        host.construct_face(context, [x, y], [1, 1], tile_xy or (x % 8, y % 8), (0, 0),
+                            tilemap.grid_up, tilemap.grid_right,
+                            tilemap.up_vector, tilemap.right_vector, tilemap.plane_normal)
+        if host.refresh_mesh:
+            host.update_bmesh_tree(context)
+            host.refresh_mesh = False
+    return len(coords)
+
+
+def kernel_construct_face_remap(tilemap, args, run):
+    """Stroke over existing faces, changing their tiles"""
+    return construct_faces(tilemap, sample_coords(tilemap.side, min(200, tilemap.face_count)))
+
+
+def kernel_construct_face_build(tilemap, args, run):
+    """Stroke building a new row of faces along the top of the tilemap"""
+    y = tilemap.side + run
+    return construct_faces(tilemap, [(x, y) for x in range(min(200, tilemap.side))])
+
+
+def kernel_construct_face_trimmed(tilemap, args, run):
+    """
+    Strokes going over the same row of a trimmed tile again and again, as a
+    mouse drag does. The tile's face doesn't cover the cell center, it must
+    still be found so each cell gets one face
+    """
+    data = tilemap.data
+    coords = [(x, tilemap.side + 10 + run) for x in range(min(50, tilemap.side))]
+    face_count = len(tilemap.host.bmesh.faces)
+    data.trim_alpha = True
+    try:
+        calls = sum(construct_faces(tilemap, coords, TRIMMED_TILE) for stroke in range(3))
+    finally:
+        data.trim_alpha = False
+    built = len(tilemap.host.bmesh.faces) - face_count
+    if built != len(coords):
+        raise AssertionError("Trimmed strokes built {0} faces on {1} cells".format(built, len(coords)))
+    return calls
+
+
+def kernel_merge_doubles(tilemap, args, run):
+    """Welding new faces built next to the tilemap, as auto merge does"""
+    context = bpy.context
+    host = tilemap.host
+    y = -1 - run
+    calls = 0
+    elapsed = 0.0
+    for x in range(min(20, tilemap.side)):
+        face_index = host.create_face(context, face_verts(x, y))
+        host.update_bmesh_tree(context)
+        face = host.bmesh.faces[face_index]
+        ray_origin = Vector((x + 0.5, y + 0.5, 0.01))
+        start = time.perf_counter()
+        host.merge_doubles(context, face, ray_origin, -tilemap.plane_normal, 1.25 / WORLD_PIXELS)
+        elapsed += time.perf_counter() - start
+        calls += 1
+    return calls, elapsed
+
+
+def kernel_raycast_object(tilemap, args, run):
+    import sprytile_bvh
+    import sprytile_modal
+    obj = bpy.context.object
+    raycast = sprytile_modal.VIEW3D_OP_SprytileModalTool.raycast_object
+    direction = -tilemap.plane_normal
+    coords = sample_coords(tilemap.side, min(tilemap.face_count, args.max_calls))
+    # Trees are built by the first raycast, time them warm
+    sprytile_bvh.invalidate(obj.data)
+    raycast(obj, Vector((0.5, 0.5, 1.0)), direction)
+    start = time.perf_counter()
+    for x, y in coords:
+        raycast(obj, Vector((x + 0.5, y + 0.5, 1.0)), direction)
+    return len(coords), time.perf_counter() - start
+
+
+def kernel_raycast_tree_build(tilemap, args, run):
+    """First raycast after the mesh changed, including building the BVH tree"""
+    import sprytile_bvh
+    import sprytile_modal
+    obj = bpy.context.object
+    sprytile_bvh.invalidate(obj.data)
+    sprytile_modal.VIEW3D_OP_SprytileModalTool.raycast_object(obj, Vector((0.5, 0.5, 1.0)), -tilemap.plane_normal)
+    return 1
+
+
+MATH_KERNELS = (
+    ("get_grid_area", kernel_get_grid_area),
+    ("get_uv_pos_size", kernel_get_uv_pos_size),
+    ("flood_fill", kernel_flood_fill),
+)
+
+MESH_KERNELS = (
+    ("build_fill_map", kernel_build_fill_map),
+    ("construct_face_remap", kernel_construct_face_remap),
+    ("construct_face_build", kernel_construct_face_build),
+    ("construct_face_trimmed", kernel_construct_face_trimmed),
+    ("merge_doubles", kernel_merge_doubles),
+    ("raycast_tree_build", kernel_raycast_tree_build),
+    ("raycast_object", kernel_raycast_object),
+)
+
+
+def time_kernel(kernel, tilemap, args):
+    """
+    Run a kernel args.repeat times
+    :return: dict of the call count and the best and median run times
+    """
+    times = []
+    calls = 0
+    for run in range(args.repeat):
+        start = time.perf_counter()
+        result = kernel(tilemap, args, run)
+        elapsed = time.perf_counter() - start
+        # Kernels with setup work time their own calls
+        if isinstance(result, tuple):
+            result, elapsed = result
+        calls = result
+        times.append(elapsed)
+    best = min(times)
+    return {
+        "calls": calls,
+        "best_ms": best * 1000,
+        "median_ms": statistics.median(times) * 1000,
+        "per_call_us": best * 1e6 / max(calls, 1),
+    }
+
+
+def main():
+    args = parse_args()
+    kernels = MATH_KERNELS + MESH_KERNELS if IN_BLENDER else MATH_KERNELS
+    if args.kernels:
+        kernels = tuple(k for k in kernels if k[0] in args.kernels)
+
+    results = []
+    for size in args.sizes:
+        tilemap = BlenderTilemap(size) if IN_BLENDER else Tilemap(size)
+        try:
+            for name, kernel in kernels:
+                result = time_kernel(kernel, tilemap, args)
+                result["kernel"] = name
+                result["faces"] = tilemap.face_count
+                results.append(result)
+                print("{0:<22}{1:>9} faces {2:>8} calls {3:>12.2f} ms {4:>12.2f} us/call".format(
+                    name, tilemap.face_count, result["calls"], result["best_ms"], result["per_call_us"]))
+        finally:
+            tilemap.free()
+
+    output = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "blender": bpy.app.version_string if IN_BLENDER else None,
+        # Whether the math ran on mathutils or on the pure Python stand-in
+        "mathutils": Vector.__module__,
+        "repeat": args.repeat,
+        "max_calls": args.max_calls,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Replay recorded Sprytile strokes in background mode and time each stage.
+
+Strokes are recorded in Blender with Sprytile Utilities > Record Strokes.
+The replay runs against a mesh object in a .blend file, with the add-on
+loaded from this folder, so the same strokes can be timed across add-on
+versions and mesh sizes. A digest of the resulting mesh is reported so
+runs can be checked to have done the same work.
+
+Usage:
+    blender -b scene.blend --python benchmarks/replay_strokes.py -- strokes.strokes
+        [--object Tilemap] [--repeat 5] [--output results.json]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import addon_utils
+import bmesh
+import bpy
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON_NAME = os.path.basename(ADDON_DIR)
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Replay recorded Sprytile strokes")
+    parser.add_argument("strokes", help="Stroke file to replay")
+    parser.add_argument("--object", help="Mesh object to replay on, defaults to the active object")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of times to replay the strokes")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def mesh_digest(bm):
+    """Hash of the mesh geometry and UVs, rounded to ignore float noise"""
+    digest = hashlib.sha1()
+    uv_layer = bm.loops.layers.uv.verify()
+    for face in bm.faces:
+        for loop in face.loops:
+            co = loop.vert.co
+            uv = loop[uv_layer].uv
+            digest.update("{0:.4f},{1:.4f},{2:.4f},{3:.4f},{4:.4f};".format(
+                co.x, co.y, co.z, uv.x, uv.y).encode())
+    return digest.hexdigest()
+
+
+def main():
+    args = parse_args()
+
+    if os.path.dirname(ADDON_DIR) not in sys.path:
+        sys.path.insert(0, os.path.dirname(ADDON_DIR))
+    addon_utils.enable(ADDON_NAME, default_set=False)
+    import sprytile_replay
+
+    context = bpy.context
+    obj = bpy.data.objects[args.object] if args.object else context.view_layer.objects.active
+    if obj is None or obj.type != 'MESH':
+        raise SystemExit("No mesh object to replay on")
+    context.view_layer.objects.active = obj
+    if obj.mode != 'EDIT':
+        bpy.ops.object.mode_set(mode='EDIT')
+    if len(context.scene.sprytile_mats) < 1:
+        bpy.ops.sprytile.validate_grids()
+
+    bm = bmesh.from_edit_mesh(obj.data)
+    faces_before = len(bm.faces)
+
+    summary = sprytile_replay.replay_file(context, args.strokes, args.repeat)
+
+    bm = bmesh.from_edit_mesh(obj.data)
+    results = {
+        "blender": bpy.app.version_string,
+        "strokes": os.path.basename(args.strokes),
+        "object": obj.name,
+        "repeat": args.repeat,
+        "faces_before": faces_before,
+        "faces_after": len(bm.faces),
+        "digest": mesh_digest(bm),
+        "stages": summary,
+    }
+
+    print(sprytile_replay.format_summary(summary))
+    print("faces {0} -> {1}, digest {2}".format(faces_before, results["faces_after"], results["digest"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
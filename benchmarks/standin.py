@@ -0,0 +1,267 @@
+"""Stand-ins for Blender's modules, to time Sprytile's pure math in plain CPython.
+
+mathutils gets small pure Python Vector and Matrix classes covering what
+the UV and grid math uses. The other Blender modules only need to survive
+the add-on's module level code, like class definitions and decorators, so
+they accept any attribute access or call. Anything that really needs
+Blender, like BVH trees or edit meshes, must be timed inside Blender.
+"""
+
+import math
+import sys
+import types
+
+
+class Vector:
+    __slots__ = ("_v",)
+
+    def __init__(self, seq=(0.0, 0.0, 0.0)):
+        self._v = [float(c) for c in seq]
+
+    def __len__(self):
+        return len(self._v)
+
+    def __iter__(self):
+        return iter(self._v)
+
+    def __getitem__(self, i):
+        return self._v[i]
+
+    def __setitem__(self, i, value):
+        self._v[i] = float(value)
+
+    def __repr__(self):
+        return "Vector({0})".format(tuple(self._v))
+
+    def _get(i):
+        return property(lambda self: self._v[i], lambda self, value: self._v.__setitem__(i, float(value)))
+
+    x = _get(0)
+    y = _get(1)
+    z = _get(2)
+    w = _get(3)
+    del _get
+
+    @property
+    def xy(self):
+        return Vector(self._v[:2])
+
+    def copy(self):
+        return Vector(self._v)
+
+    def dot(self, other):
+        return sum(a * b for a, b in zip(self._v, other))
+
+    def cross(self, other):
+        a, b = self._v, list(other)
+        return Vector((a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]))
+
+    @property
+    def length(self):
+        return math.sqrt(self.dot(self._v))
+
+    magnitude = length
+
+    def normalized(self):
+        length = self.length
+        if length == 0:
+            return self.copy()
+        return Vector(c / length for c in self._v)
+
+    def normalize(self):
+        self._v = self.normalized()._v
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self._v, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self._v, other))
+
+    def __mul__(self, other):
+        if isinstance(other, Vector):
+            return Vector(a * b for a, b in zip(self._v, other))
+        return Vector(a * other for a in self._v)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return Vector(a / other for a in self._v)
+
+    def __neg__(self):
+        return Vector(-a for a in self._v)
+
+    def __iadd__(self, other):
+        self._v = (self + other)._v
+        return self
+
+    def __isub__(self, other):
+        self._v = (self - other)._v
+        return self
+
+    def __imul__(self, other):
+        self._v = (self * other)._v
+        return self
+
+    def __itruediv__(self, other):
+        self._v = (self / other)._v
+        return self
+
+    def __eq__(self, other):
+        return isinstance(other, Vector) and self._v == other._v
+
+
+class Matrix:
+    __slots__ = ("rows",)
+
+    def __init__(self, rows):
+        self.rows = [[float(c) for c in row] for row in rows]
+
+    @classmethod
+    def Identity(cls, size):
+        return cls([[1.0 if i == j else 0.0 for j in range(size)] for i in range(size)])
+
+    @classmethod
+    def Translation(cls, vector):
+        m = cls.Identity(4)
+        for i, c in enumerate(vector):
+            m.rows[i][3] = c
+        return m
+
+    @classmethod
+    def Rotation(cls, angle, size, axis):
+        c, s = math.cos(angle), math.sin(angle)
+        if isinstance(axis, str):
+            axis = {'X': (1, 0, 0), 'Y': (0, 1, 0), 'Z': (0, 0, 1)}[axis]
+        x, y, z = Vector(axis).normalized()
+        t = 1 - c
+        m = cls.Identity(size)
+        rot = [[t * x * x + c, t * x * y - s * z, t * x * z + s * y],
+               [t * x * y + s * z, t * y * y + c, t * y * z - s * x],
+               [t * x * z - s * y, t * y * z + s * x, t * z * z + c]]
+        for i in range(min(size, 3)):
+            for j in range(min(size, 3)):
+                m.rows[i][j] = rot[i][j]
+        return m
+
+    @classmethod
+    def Scale(cls, factor, size, axis=None):
+        m = cls.Identity(size)
+        dims = min(size, 3)
+        if axis is None:
+            for i in range(dims):
+                m.rows[i][i] = factor
+            return m
+        axis = list(Vector(axis).normalized())
+        for i in range(min(dims, len(axis))):
+            for j in range(min(dims, len(axis))):
+                m.rows[i][j] += (factor - 1) * axis[i] * axis[j]
+        return m
+
+    def copy(self):
+        return Matrix(self.rows)
+
+    def __matmul__(self, other):
+        size = len(self.rows)
+        if isinstance(other, Matrix):
+            cols = list(zip(*other.rows))
+            return Matrix([[sum(a * b for a, b in zip(row, col)) for col in cols] for row in self.rows])
+        vec = list(other)
+        # 3D points through 4x4 matrices are homogeneous, with w of 1
+        padded = vec + [1.0] * (size - len(vec))
+        result = [sum(a * b for a, b in zip(row, padded)) for row in self.rows]
+        return Vector(result[:len(vec)])
+
+
+class Quaternion:
+    def __init__(self, axis=(1.0, 0.0, 0.0), angle=0.0):
+        self.matrix = Matrix.Rotation(angle, 3, axis)
+
+    def __matmul__(self, other):
+        return self.matrix @ other
+
+
+def intersect_line_plane(line_a, line_b, plane_co, plane_no):
+    direction = line_b - line_a
+    denom = plane_no.dot(direction)
+    if abs(denom) < 1e-12:
+        return None
+    t = plane_no.dot(plane_co - line_a) / denom
+    return line_a + direction * t
+
+
+def distance_point_to_plane(point, plane_co, plane_no):
+    return plane_no.normalized().dot(point - plane_co)
+
+
+class _StandInMeta(type):
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _stand_in(name)
+
+
+class _StandIn(metaclass=_StandInMeta):
+    """Accepts any attribute access or call made while importing the add-on"""
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _stand_in(name)
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+
+def _stand_in(name):
+    return _StandInMeta(name, (_StandIn,), {})
+
+
+class _StandInModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        value = _stand_in(name)
+        setattr(self, name, value)
+        return value
+
+
+STANDIN_MODULES = (
+    "bpy", "bpy.types", "bpy.props", "bpy.app", "bpy.app.handlers", "bpy.utils", "bpy.utils.previews",
+    "bpy.path", "bpy_extras", "bpy_extras.view3d_utils", "bpy_extras.io_utils",
+    "bmesh", "bmesh.types", "bmesh.ops",
+    "bgl", "blf", "gpu", "gpu_extras", "gpu_extras.batch", "addon_utils",
+    "mathutils.bvhtree",
+)
+
+
+def install():
+    """Put the stand-ins in sys.modules, where Blender's own modules are missing"""
+    try:
+        # The standalone build of mathutils, if installed
+        import mathutils
+        import mathutils.bvhtree
+    except ImportError:
+        mathutils = types.ModuleType("mathutils")
+        mathutils.Vector = Vector
+        mathutils.Matrix = Matrix
+        mathutils.Quaternion = Quaternion
+        geometry = types.ModuleType("mathutils.geometry")
+        geometry.intersect_line_plane = intersect_line_plane
+        geometry.distance_point_to_plane = distance_point_to_plane
+        mathutils.geometry = geometry
+        sys.modules["mathutils"] = mathutils
+        sys.modules["mathutils.geometry"] = geometry
+
+    for name in STANDIN_MODULES:
+        if name in sys.modules:
+            continue
+        module = _StandInModule(name)
+        # Star imports only bring in what a module lists
+        module.__all__ = []
+        sys.modules[name] = module
+        parent, _, child = name.rpartition(".")
+        if parent:
+            setattr(sys.modules[parent], child, module)
+    sys.modules["bpy.app.handlers"].persistent = lambda func: func
@@ -0,0 +1,121 @@
+"""Compare the per event cost of dispatching modal events to the tools.
+
+The Rx path is the pipeline the modal operator used before the tool event
+bus: Observable.create -> publish().auto_connect(1), with each of the three
+tools filtering on paint_mode, fed with dict based event records.
+
+Usage:
+    python benchmarks/tool_dispatch.py [--events 100000] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rx import Observable
+from sprytile_tools.tool_events import ToolData, ToolEvent, ToolEventBus
+
+PAINT_MODES = ('MAKE_FACE', 'PAINT', 'FILL')
+
+
+class DataObjectDict(dict):
+    def __getattr__(self, name):
+        if name in self:
+            return self[name]
+        else:
+            raise AttributeError("No such attribute: " + name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class Tool:
+    def __init__(self):
+        self.count = 0
+
+    def process_tool(self, modal_evt):
+        self.count += 1
+
+    def handle_error(self, err):
+        pass
+
+    def handle_complete(self):
+        pass
+
+
+def rx_dispatch(events):
+    source = {}
+
+    def setup_rx_observer(observer):
+        source['observer'] = observer
+
+    rx_source = Observable.create(setup_rx_observer).publish().auto_connect(1)
+    tools = []
+    for paint_mode in PAINT_MODES:
+        tool = Tool()
+        tools.append(tool)
+        rx_source.filter(
+            lambda modal_evt, mode=paint_mode: modal_evt.paint_mode == mode
+        ).subscribe(
+            on_next=lambda modal_evt, tool=tool: tool.process_tool(modal_evt),
+            on_error=lambda err, tool=tool: tool.handle_error(err),
+            on_completed=lambda tool=tool: tool.handle_complete()
+        )
+
+    observer = source['observer']
+
+    def run():
+        for i in range(events):
+            DataObjectDict(context=None, ray_vector=None, ray_origin=None)
+            observer.on_next(DataObjectDict(
+                paint_mode=PAINT_MODES[i % 3],
+                event=None,
+                left_down=False,
+                build_preview=True,
+            ))
+    return run, tools
+
+
+def bus_dispatch(events):
+    event_bus = ToolEventBus()
+    tools = []
+    for paint_mode in PAINT_MODES:
+        tool = Tool()
+        tools.append(tool)
+        event_bus.subscribe(
+            paint_mode,
+            on_next=tool.process_tool,
+            on_error=tool.handle_error,
+            on_completed=tool.handle_complete
+        )
+
+    def run():
+        for i in range(events):
+            ToolData(None, None, None)
+            event_bus.on_next(ToolEvent(PAINT_MODES[i % 3], None, False, True))
+    return run, tools
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for name, setup in (("rx", rx_dispatch), ("event bus", bus_dispatch)):
+        run, tools = setup(args.events)
+        best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        delivered = sum(tool.count for tool in tools)
+        assert delivered == args.events * args.repeat, delivered
+        results[name] = best / args.events * 1e6
+        print("{:>10}: {:.2f} us/event".format(name, results[name]))
+
+    print("{:>10}: {:.1f}x".format("speedup", results["rx"] / results["event bus"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,57 @@
-try:
-    import asyncio
-except ImportError:
-    try:
-        import trollius as asyncio
-    except ImportError:
-        asyncio = None
-
 try:
     import threading
 except ImportError:
     import rx.internal.concurrency as threading
 
-try:
-    from asyncio import Future
-except ImportError:
+
+def _load_asyncio():
     try:
-        from trollius import Future
+        import asyncio
     except ImportError:
-        Future = None
+        try:
+            import trollius as asyncio
+        except ImportError:
+            asyncio = None
+    return asyncio
+
+
+def _load_future():
+    asyncio = config["asyncio"]
+    return asyncio.Future if asyncio else None
+
+
+class _Config(dict):
+    """Configuration dictionary that only imports asyncio the first time
+    "asyncio" or "Future" is read, since importing it dominates the
+    start up time of rx. Assigned values always take precedence."""
+
+    _loaders = {
+        "asyncio": _load_asyncio,
+        "Future": _load_future
+    }
+
+    def __missing__(self, key):
+        loader = self._loaders.get(key)
+        if loader is None:
+            raise KeyError(key)
+        value = self[key] = loader()
+        return value
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._loaders
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
 
 
 # Rx configuration dictionary
-config = {
+config = _Config({
     "concurrency": threading,
-    "Future": Future,
     "Lock": threading.RLock,  # Deprecated
-    "asyncio": asyncio
-}
+})
 
 from .core import Observer, Observable
 from .core.anonymousobserver import AnonymousObserver
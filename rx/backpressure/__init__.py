@@ -1,7 +1,9 @@
-from . import controlledobservable
-from . import controlledsubject
-from . import pausable
-from . import pausablebuffered
-from . import stopandwait
-from . import windowed
-from . import windowedobservable
+from rx.core import Observable
+from rx.internal import extensionmodules
+
+# The operators are imported when first looked up, see rx.linq.observable
+extensionmodules(Observable, {
+    "controlled": ".controlledobservable",
+    "pausable": ".pausable",
+    "pausable_buffered": ".pausablebuffered",
+}, package=__name__)
@@ -1,5 +1,5 @@
 from rx.core import Observable, ObservableBase
-from rx.internal import extensionmethod
+from rx.internal import extensionmethod, extensionmodules
 
 from .controlledsubject import ControlledSubject
 
@@ -41,3 +41,9 @@ def controlled(self, enable_queue=True, scheduler=None):
     """
 
     return ControlledObservable(self, enable_queue, scheduler)
+
+
+extensionmodules(ControlledObservable, {
+    "stop_and_wait": ".stopandwait",
+    "windowed": ".windowed",
+}, package=__package__)
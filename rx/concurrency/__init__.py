@@ -6,10 +6,6 @@ from .currentthreadscheduler import CurrentThreadScheduler, \
 from .virtualtimescheduler import VirtualTimeScheduler
 from .timeoutscheduler import TimeoutScheduler, timeout_scheduler
 from .newthreadscheduler import NewThreadScheduler, new_thread_scheduler
-try:
-    from .threadpoolscheduler import ThreadPoolScheduler, thread_pool_scheduler
-except ImportError:
-    pass
 from .eventloopscheduler import EventLoopScheduler
 from .historicalscheduler import HistoricalScheduler
 from .catchscheduler import CatchScheduler
@@ -24,3 +20,17 @@ from .mainloopscheduler import PyGameScheduler
 from .mainloopscheduler import QtScheduler
 from .mainloopscheduler import WxScheduler
 from .mainloopscheduler import EventLetEventScheduler
+from .mainloopscheduler import BlenderTimerScheduler
+
+
+def __getattr__(name):
+    # concurrent.futures is slow to import, so the thread pool scheduler is
+    # only loaded once asked for
+    if name in ("ThreadPoolScheduler", "thread_pool_scheduler"):
+        try:
+            from . import threadpoolscheduler
+        except ImportError:
+            pass
+        else:
+            return getattr(threadpoolscheduler, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
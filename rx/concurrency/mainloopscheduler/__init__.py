@@ -8,3 +8,4 @@ from .pygamescheduler import PyGameScheduler
 from .qtscheduler import QtScheduler
 from .wxscheduler import WxScheduler
 from .eventletscheduler import EventLetEventScheduler
+from .blendertimerscheduler import BlenderTimerScheduler
@@ -0,0 +1,138 @@
+import logging
+import time
+from datetime import timedelta
+
+from rx.internal import PriorityQueue
+from rx.concurrency.schedulerbase import SchedulerBase
+from rx.concurrency.scheduleditem import ScheduledItem
+
+log = logging.getLogger("Rx")
+
+
+class BlenderTimerScheduler(SchedulerBase):
+    """A scheduler that schedules work on Blender's main loop through
+    bpy.app.timers.
+
+    A single timer function drains the due actions. Each tick runs actions
+    until the time budget is spent, and leaves the rest for the next tick
+    so the UI stays responsive.
+
+    https://docs.blender.org/api/current/bpy.app.timers.html"""
+
+    def __init__(self, budget=10, timers=None):
+        """
+        Keyword arguments:
+        :param int budget: Milliseconds of work to do per timer tick. At
+            least one due action runs per tick, whatever its duration.
+        :param module timers: Module with bpy.app.timers' register,
+            unregister and is_registered, e.g. a stand-in for testing.
+            Defaults to bpy.app.timers.
+        """
+
+        if timers is None:
+            import bpy
+            timers = bpy.app.timers
+
+        self.timers = timers
+        self.budget = budget
+        self.queue = PriorityQueue()
+        self.in_tick = False
+        # Blender tells timers apart by identity, so the same bound method
+        # object has to be passed on every call
+        self.timer = self.tick
+
+    def schedule(self, action, state=None):
+        """Schedules an action to be executed."""
+
+        log.debug("BlenderTimerScheduler.schedule(state=%s)", state)
+        return self.schedule_relative(0, action, state)
+
+    def schedule_relative(self, duetime, action, state=None):
+        """Schedules an action to be executed after duetime.
+
+        Keyword arguments:
+        duetime -- {timedelta} Relative time after which to execute the action.
+        action -- {Function} Action to be executed.
+
+        Returns {Disposable} The disposable object used to cancel the scheduled
+        action (best effort)."""
+
+        duetime = self.normalize(self.to_timedelta(duetime))
+        si = ScheduledItem(self, state, action, self.now + duetime)
+
+        is_first = len(self.queue) == 0 or si < self.queue.peek()
+        self.queue.enqueue(si)
+
+        # The tick reschedules itself from the queue when it returns
+        if is_first and not self.in_tick:
+            self._register(duetime.total_seconds())
+
+        return si.disposable
+
+    def schedule_absolute(self, duetime, action, state=None):
+        """Schedules an action to be executed at duetime.
+
+        Keyword arguments:
+        duetime -- {datetime} Absolute time after which to execute the action.
+        action -- {Function} Action to be executed.
+
+        Returns {Disposable} The disposable object used to cancel the scheduled
+        action (best effort)."""
+
+        duetime = self.to_datetime(duetime)
+        return self.schedule_relative(duetime - self.now, action, state)
+
+    def dispose(self):
+        """Cancels all pending actions and removes the timer, e.g. when the
+        add-on is unregistered."""
+
+        while len(self.queue):
+            self.queue.dequeue().cancel()
+        if self.timers.is_registered(self.timer):
+            self.timers.unregister(self.timer)
+
+    def tick(self):
+        """Timer function, runs the due actions within the time budget.
+
+        Returns the seconds until the timer should run again, or None to
+        unregister it when nothing is left to do."""
+
+        self.in_tick = True
+        try:
+            self.run()
+        finally:
+            self.in_tick = False
+        return self._next_interval()
+
+    def run(self):
+        start = time.perf_counter()
+        budget = self.budget / 1000.0
+
+        while len(self.queue):
+            item = self.queue.peek()
+            if item.is_cancelled():
+                self.queue.dequeue()
+                continue
+            if item.duetime - self.now > timedelta(0):
+                break
+
+            self.queue.dequeue()
+            item.invoke()
+
+            if time.perf_counter() - start >= budget:
+                break
+
+    def _next_interval(self):
+        while len(self.queue) and self.queue.peek().is_cancelled():
+            self.queue.dequeue()
+
+        if not len(self.queue):
+            return None
+
+        diff = self.queue.peek().duetime - self.now
+        return max(diff.total_seconds(), 0.0)
+
+    def _register(self, first_interval):
+        if self.timers.is_registered(self.timer):
+            self.timers.unregister(self.timer)
+        self.timers.register(self.timer, first_interval=first_interval)
@@ -1,9 +1,23 @@
 from abc import ABCMeta, abstractmethod
 
+from rx.internal.extensionmethod import load_extension
+
+
+class ObservableMeta(ABCMeta):
+    def __getattr__(cls, name):
+        if load_extension(cls, name):
+            return getattr(cls, name)
+        raise AttributeError("type object '%s' has no attribute '%s'" % (cls.__name__, name))
+
 
 class Observable(object):
-    __metaclass__ = ABCMeta
+    __metaclass__ = ObservableMeta
 
     @abstractmethod
     def subscribe(self, observer):
         return NotImplemented
+
+    def __getattr__(self, name):
+        if load_extension(type(self), name):
+            return getattr(self, name)
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
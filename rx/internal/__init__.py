@@ -1,7 +1,7 @@
 from .priorityqueue import PriorityQueue
 from .basic import noop, default_error, default_comparer
 from .exceptions import SequenceContainsNoElementsError, ArgumentOutOfRangeException, DisposedException
-from .extensionmethod import extensionmethod, extensionclassmethod
+from .extensionmethod import extensionmethod, extensionclassmethod, extensionmodules, load_extension
 from .enumerable import Enumerable
 from .enumerator import Enumerator
 from . import concurrency
@@ -1,3 +1,6 @@
+import importlib
+
+
 def extensionmethod(base, name=None, decorator=None, instancemethod=False, alias=None):
     """Function decorator that extends base with the decorated
     function.
@@ -49,3 +52,51 @@ def extensionclassmethod(base, name=None, alias=None):
     """
 
     return extensionmethod(base=base, name=name, decorator=classmethod, alias=alias)
+
+
+def extensionmodules(base, modules, package=None):
+    """Defers importing the modules that extend base until one of the
+    methods they provide is first looked up on base or a subclass.
+
+    Keyword arguments:
+    :param T base: Base class the modules extend. Attribute misses on
+        base must be routed through load_extension
+    :param dict modules: Maps method name to the module providing it
+    :param string package: Package to resolve relative module names in
+    """
+
+    if package:
+        modules = {name: package + module if module.startswith(".") else module
+                   for name, module in modules.items()}
+
+    if "_extension_modules" in vars(base):
+        base._extension_modules.update(modules)
+    else:
+        base._extension_modules = dict(modules)
+
+
+def load_extension(cls, name):
+    """Imports the module registered to provide name for cls, if any.
+
+    Keyword arguments:
+    :param type cls: Class the attribute was looked up on
+    :param string name: Name of the missing attribute
+
+    :returns: True if a module was imported, False if no pending
+        extension module provides name.
+    :rtype: bool
+    """
+
+    for klass in cls.__mro__:
+        modules = vars(klass).get("_extension_modules")
+        if not modules or name not in modules:
+            continue
+
+        module = modules[name]
+        # Drop every name the module provides before importing, so a
+        # module that doesn't define what it claimed can't recurse
+        for other in [key for key, value in modules.items() if value == module]:
+            del modules[other]
+        importlib.import_module(module)
+        return True
+    return False
@@ -1,140 +1,193 @@
-"""Import all the LINQ observable extension methods."""
+"""Register the LINQ observable extension methods.
+
+The modules adding methods as instance methods are imported right away,
+since ObservableBase binds those when an observable is created. Every
+other module is imported the first time one of its methods is looked up,
+which keeps `import rx` from loading well over a hundred modules nobody
+may use.
+"""
 
 # flake8: noqa
-from . import all
+from rx.core import Observable
+from rx.internal import extensionmodules
+
 from . import amb
-from . import and_
-from . import some
-from . import asobservable
-from . import average
-from . import buffer
-from . import bufferwithtime
-from . import bufferwithtimeorcount
-from . import case
 from . import catch
-from . import concat
-from . import contains
 from . import combinelatest
-from . import count
-from . import create
-from . import debounce
-from . import defaultifempty
-from . import defer
-from . import delay
-from . import delaysubscription
-from . import delaywithselector
-from . import dematerialize
-from . import distinct
-from . import distinctuntilchanged
-from . import doaction
-from . import dowhile
-from . import elementat
-from . import elementatordefault
-from . import empty
-from . import exclusive
-from . import expand
-from . import finallyaction
-from . import find
-from . import findindex
-from . import first
-from . import firstordefault
-from . import forin
-from . import fromiterable
-from . import fromcallback
-from . import fromfuture
-from . import generate
-from . import generatewithrelativetime
-from . import groupby
-from . import groupbyuntil
-from . import groupjoin
-from . import ifthen
-from . import ignoreelements
-from . import interval
-from . import isempty
-from . import join
-from . import last
-from . import let
-from . import lastordefault
-from . import manyselect
-from . import materialize
+from . import concat
 from . import merge
-from . import max
-from . import maxby
-from . import min
-from . import minby
-from . import multicast
-from . import never
-from . import observeon
 from . import onerrorresumenext
-from . import of
-from . import pairwise
-from . import partition
-from . import pluck
-from . import publish
-from . import publishvalue
-from . import range
-from . import reduce
 from . import repeat
-from . import replay
-from . import retry
-from . import returnvalue
-from . import scan
-from . import sample
-from . import select
-from . import selectswitch
-from . import selectmany
-from . import sequenceequal
-from . import single
-from . import singleordefault
-from . import skip
-from . import skiplast
-from . import skiplastwithtime
-from . import skipuntil
-from . import skipuntilwithtime
-from . import skipwhile
-from . import skipwithtime
-from . import slice
-from . import start
-from . import startasync
-from . import startswith
-from . import statistics
-from . import subscribeon
-from . import sum
-from . import switchlatest
-from . import take
-from . import takelast
-from . import takelastbuffer
-from . import takelastwithtime
-from . import takeuntil
-from . import takeuntilwithtime
-from . import takewhile
-from . import takewithtime
-from . import thendo
-from . import throttlefirst
-from . import throw
-from . import timeinterval
-from . import timer
-from . import timeout
-from . import timeoutwithselector
-from . import timestamp
-from . import toasync
-from . import toblocking
-from . import todict
-from . import tofuture
-from . import toiterable
-from . import tolist
-from . import toset
-from . import transduce
-from . import using
-from . import when
-from . import where
-from . import whiledo
-from . import window
-from . import windowwithcount
-from . import windowwithtime
-from . import windowwithtimeorcount
 from . import withlatestfrom
 from . import zip
-from . import ziparray
 
+# BlockingObservable reuses names like first/last that also exist on
+# Observable, so its methods must be in place before any lookup falls
+# through to the Observable versions
 from . import blocking
+
+# Special methods are looked up on the type, never through __getattr__,
+# so the modules defining them can't be deferred
+from . import slice
+from . import tofuture
+
+extensionmodules(Observable, {
+    "all": ".all",
+    "every": ".all",
+    "and_": ".and_",
+    "as_observable": ".asobservable",
+    "average": ".average",
+    "buffer": ".buffer",
+    "buffer_with_count": ".buffer",
+    "buffer_with_time": ".bufferwithtime",
+    "buffer_with_time_or_count": ".bufferwithtimeorcount",
+    "case": ".case",
+    "switch_case": ".case",
+    "contains": ".contains",
+    "count": ".count",
+    "create": ".create",
+    "create_with_disposable": ".create",
+    "debounce": ".debounce",
+    "throttle_with_selector": ".debounce",
+    "throttle_with_timeout": ".debounce",
+    "default_if_empty": ".defaultifempty",
+    "defer": ".defer",
+    "delay": ".delay",
+    "delay_subscription": ".delaysubscription",
+    "delay_with_selector": ".delaywithselector",
+    "dematerialize": ".dematerialize",
+    "distinct": ".distinct",
+    "distinct_until_changed": ".distinctuntilchanged",
+    "do_action": ".doaction",
+    "do_after_next": ".doaction",
+    "do_after_terminate": ".doaction",
+    "do_finally": ".doaction",
+    "do_on_dispose": ".doaction",
+    "do_on_subscribe": ".doaction",
+    "do_on_terminate": ".doaction",
+    "tap": ".doaction",
+    "do_while": ".dowhile",
+    "element_at": ".elementat",
+    "element_at_or_default": ".elementatordefault",
+    "empty": ".empty",
+    "exclusive": ".exclusive",
+    "expand": ".expand",
+    "finally_action": ".finallyaction",
+    "find": ".find",
+    "find_index": ".findindex",
+    "first": ".first",
+    "first_or_default": ".firstordefault",
+    "for_in": ".forin",
+    "from_callback": ".fromcallback",
+    "from_future": ".fromfuture",
+    "from_": ".fromiterable",
+    "from_iterable": ".fromiterable",
+    "from_list": ".fromiterable",
+    "generate": ".generate",
+    "generate_with_relative_time": ".generatewithrelativetime",
+    "group_by": ".groupby",
+    "group_by_until": ".groupbyuntil",
+    "group_join": ".groupjoin",
+    "if_then": ".ifthen",
+    "ignore_elements": ".ignoreelements",
+    "interval": ".interval",
+    "is_empty": ".isempty",
+    "join": ".join",
+    "last": ".last",
+    "last_or_default": ".lastordefault",
+    "let": ".let",
+    "let_bind": ".let",
+    "many_select": ".manyselect",
+    "materialize": ".materialize",
+    "max": ".max",
+    "max_by": ".maxby",
+    "min": ".min",
+    "min_by": ".minby",
+    "multicast": ".multicast",
+    "never": ".never",
+    "observe_on": ".observeon",
+    "of": ".of",
+    "pairwise": ".pairwise",
+    "partition": ".partition",
+    "pluck": ".pluck",
+    "pluck_attr": ".pluck",
+    "publish": ".publish",
+    "share": ".publish",
+    "publish_value": ".publishvalue",
+    "range": ".range",
+    "aggregate": ".reduce",
+    "reduce": ".reduce",
+    "replay": ".replay",
+    "retry": ".retry",
+    "from_callable": ".returnvalue",
+    "just": ".returnvalue",
+    "return_value": ".returnvalue",
+    "sample": ".sample",
+    "throttle_last": ".sample",
+    "scan": ".scan",
+    "map": ".select",
+    "select": ".select",
+    "flat_map": ".selectmany",
+    "select_many": ".selectmany",
+    "flat_map_latest": ".selectswitch",
+    "select_switch": ".selectswitch",
+    "switch_map": ".selectswitch",
+    "sequence_equal": ".sequenceequal",
+    "single": ".single",
+    "single_or_default": ".singleordefault",
+    "skip": ".skip",
+    "skip_last": ".skiplast",
+    "skip_last_with_time": ".skiplastwithtime",
+    "skip_until": ".skipuntil",
+    "skip_until_with_time": ".skipuntilwithtime",
+    "skip_while": ".skipwhile",
+    "skip_with_time": ".skipwithtime",
+    "some": ".some",
+    "start": ".start",
+    "start_async": ".startasync",
+    "start_with": ".startswith",
+    "median": ".statistics",
+    "mode": ".statistics",
+    "standard_deviation": ".statistics",
+    "variance": ".statistics",
+    "subscribe_on": ".subscribeon",
+    "sum": ".sum",
+    "switch_latest": ".switchlatest",
+    "take": ".take",
+    "take_last": ".takelast",
+    "take_last_buffer": ".takelastbuffer",
+    "take_last_with_time": ".takelastwithtime",
+    "take_until": ".takeuntil",
+    "take_until_with_time": ".takeuntilwithtime",
+    "take_while": ".takewhile",
+    "take_with_time": ".takewithtime",
+    "then": ".thendo",
+    "then_do": ".thendo",
+    "throttle_first": ".throttlefirst",
+    "throw": ".throw",
+    "throw_exception": ".throw",
+    "time_interval": ".timeinterval",
+    "timeout": ".timeout",
+    "timeout_with_selector": ".timeoutwithselector",
+    "timer": ".timer",
+    "timestamp": ".timestamp",
+    "to_async": ".toasync",
+    "to_blocking": ".toblocking",
+    "to_dict": ".todict",
+    "to_iterable": ".tolist",
+    "to_list": ".tolist",
+    "to_sorted_list": ".tolist",
+    "to_set": ".toset",
+    "transduce": ".transduce",
+    "using": ".using",
+    "when": ".when",
+    "filter": ".where",
+    "where": ".where",
+    "while_do": ".whiledo",
+    "window": ".window",
+    "window_with_count": ".windowwithcount",
+    "window_with_time": ".windowwithtime",
+    "window_with_time_or_count": ".windowwithtimeorcount",
+    "zip_array": ".ziparray",
+    "zip_list": ".ziparray",
+}, package=__name__)
@@ -0,0 +1,601 @@
+import math
+
+import bpy
+import numpy
+
+import sprytile_bvh
+import sprytile_tiles
+import sprytile_utils
+from sprytile_uv import UvDataLayers
+
+
+class TileLayout:
+    """
+    Where the tiles of a grid sit on an image. Has the same layout fields
+    as a Sprytile grid, so it can describe an atlas that isn't set up yet.
+    """
+    def __init__(self, grid, padding, margin, offset, image_size):
+        self.grid = tuple(grid)
+        self.padding = tuple(padding)
+        self.margin = tuple(margin)
+        self.offset = tuple(offset)
+        self.image_size = tuple(image_size)
+
+    @classmethod
+    def from_grid(cls, tile_grid, image_size):
+        return cls(tile_grid.grid, tile_grid.padding, tile_grid.margin, tile_grid.offset, image_size)
+
+    @property
+    def row_size(self):
+        # Same as the tile IDs saved by sprytile_uv.apply_uvs
+        return int(math.ceil(self.image_size[0] / self.grid[0]))
+
+    def get_origins(self, tiles):
+        """Pixel origins of an (n, 2) array of tile coordinates"""
+        cell = numpy.array(sprytile_tiles.get_cell_size(self), dtype=numpy.float64)
+        start = numpy.array(sprytile_tiles.get_tile_origin(self, 0, 0), dtype=numpy.float64)
+        return start + tiles * cell
+
+
+def get_image_bytes(image):
+    """Memory used by an image's pixels once loaded"""
+    return image.size[0] * image.size[1] * (16 if image.is_float else 4)
+
+
+def get_pixels(image):
+    """Image pixels as an (height, width, 4) float array, read in one call"""
+    width, height = image.size
+    pixels = numpy.empty(width * height * 4, dtype=numpy.float32)
+    image.pixels.foreach_get(pixels)
+    return pixels.reshape(height, width, 4)
+
+
+def new_image(name, pixels, source):
+    """Create an image from an (height, width, 4) float array, packed into the blend file"""
+    height, width = pixels.shape[:2]
+    image = bpy.data.images.new(name, width, height, alpha=True, float_buffer=source.is_float)
+    image.pixels.foreach_set(pixels.ravel())
+    try:
+        image.pack()
+    except RuntimeError:
+        pass
+    return image
+
+
+def blit(target, source, target_xy, source_xy, size):
+    """Copy a pixel rect between (height, width, 4) arrays, clipped to both"""
+    x0 = max(0, -source_xy[0], -target_xy[0])
+    y0 = max(0, -source_xy[1], -target_xy[1])
+    x1 = min(size[0], source.shape[1] - source_xy[0], target.shape[1] - target_xy[0])
+    y1 = min(size[1], source.shape[0] - source_xy[1], target.shape[0] - target_xy[1])
+    if x1 <= x0 or y1 <= y0:
+        return
+    target[target_xy[1] + y0:target_xy[1] + y1, target_xy[0] + x0:target_xy[0] + x1] = \
+        source[source_xy[1] + y0:source_xy[1] + y1, source_xy[0] + x0:source_xy[0] + x1]
+
+
+def get_grid_users(context, tile_grid):
+    """Mesh objects with the material of a tile grid"""
+    material = sprytile_utils.get_grid_material(tile_grid)
+    if material is None:
+        return []
+    return [obj for obj in context.scene.objects
+            if obj.type == 'MESH' and any(slot.material == material for slot in obj.material_slots)]
+
+
+def get_int_layer(mesh, name, count):
+    layer = mesh.polygon_layers_int.get(name)
+    if layer is None:
+        return None
+    values = numpy.empty(count, dtype=numpy.int32)
+    layer.data.foreach_get('value', values)
+    return values
+
+
+class FaceTiles:
+    """
+    The tile data of one object's faces that use a tile grid, read into
+    arrays so a whole mesh can be remapped at once. The tiles a face shows
+    are found from the pixels its UVs cover, as an inclusive rect of tile
+    coordinates.
+    """
+    def __init__(self, obj, tile_grid, layout):
+        self.obj = obj
+        self.layout = layout
+        mesh = obj.data
+        face_count = len(mesh.polygons)
+        loop_count = len(mesh.loops)
+        self.uv_layer = mesh.uv_layers.active
+        grid_ids = get_int_layer(mesh, UvDataLayers.GRID_INDEX, face_count)
+        if self.uv_layer is None or grid_ids is None or face_count == 0:
+            self.faces = numpy.zeros(0, dtype=numpy.int64)
+            return
+
+        self.uvs = numpy.empty(loop_count * 2, dtype=numpy.float64)
+        self.uv_layer.data.foreach_get('uv', self.uvs)
+        self.uvs = self.uvs.reshape(loop_count, 2)
+        self.tile_ids = get_int_layer(mesh, UvDataLayers.GRID_TILE_ID, face_count)
+        self.origin_ids = get_int_layer(mesh, UvDataLayers.GRID_SEL_ORIGIN, face_count)
+
+        loop_starts = numpy.empty(face_count, dtype=numpy.int64)
+        loop_totals = numpy.empty(face_count, dtype=numpy.int64)
+        mesh.polygons.foreach_get('loop_start', loop_starts)
+        mesh.polygons.foreach_get('loop_total', loop_totals)
+
+        self.faces = numpy.nonzero(grid_ids == tile_grid.id)[0]
+        totals = loop_totals[self.faces]
+        # Loop indices of the grid's faces, face by face, and the face each belongs to
+        offsets = numpy.cumsum(totals) - totals
+        self.loops = numpy.arange(totals.sum()) - numpy.repeat(offsets, totals) + \
+            numpy.repeat(loop_starts[self.faces], totals)
+        self.loop_faces = numpy.repeat(numpy.arange(len(self.faces)), totals)
+
+        pixels = self.uvs[self.loops] * layout.image_size
+        self.pixel_min = numpy.minimum.reduceat(pixels, offsets, axis=0) if len(self.faces) > 0 else pixels
+        self.pixel_max = numpy.maximum.reduceat(pixels, offsets, axis=0) if len(self.faces) > 0 else pixels
+
+        cell = numpy.array(sprytile_tiles.get_cell_size(layout), dtype=numpy.float64)
+        start = numpy.array(sprytile_tiles.get_tile_origin(layout, 0, 0), dtype=numpy.float64)
+        # Nudged inwards, so UVs on the tile's edge don't count the next tile
+        self.tile_min = numpy.floor((self.pixel_min + 0.01 - start) / cell).astype(numpy.int64)
+        self.tile_max = numpy.floor((self.pixel_max - 0.01 - start) / cell).astype(numpy.int64)
+
+    def __len__(self):
+        return len(self.faces)
+
+    def out_of_image(self):
+        """Faces with UVs past the image, e.g. repeating a tile, which can't be moved on an atlas"""
+        if len(self.faces) == 0:
+            return 0
+        size = numpy.array(self.layout.image_size)
+        outside = (self.pixel_min < -0.01).any(axis=1) | (self.pixel_max > size + 0.01).any(axis=1)
+        return int(outside.sum())
+
+    def remap(self, new_tile_min, new_layout, mask=None):
+        """
+        Move faces to new tile positions, shifting their UVs by the pixels
+        their tiles moved by and updating their tile ID layers
+        :param new_tile_min: (n, 2) array, the new position of each face's tile rect
+        :param new_layout: TileLayout of the new image
+        :param mask: bool array of the faces to move, defaults to all. Other faces are left as they are
+        """
+        if len(self.faces) == 0:
+            return
+        if mask is None:
+            mask = numpy.ones(len(self.faces), dtype=bool)
+        old_size = numpy.array(self.layout.image_size, dtype=numpy.float64)
+        new_size = numpy.array(new_layout.image_size, dtype=numpy.float64)
+
+        shift = new_layout.get_origins(new_tile_min[mask]) - self.layout.get_origins(self.tile_min[mask])
+        # Index of each moved loop's face among the moved faces
+        loop_mask = mask[self.loop_faces]
+        moved_index = numpy.cumsum(mask) - 1
+        loops = self.loops[loop_mask]
+        self.uvs[loops] = (self.uvs[loops] * old_size + shift[moved_index[self.loop_faces[loop_mask]]]) / new_size
+        self.uv_layer.data.foreach_set('uv', self.uvs.ravel())
+
+        mesh = self.obj.data
+        faces = self.faces[mask]
+        tile_shift = new_tile_min[mask] - self.tile_min[mask]
+        for name, values in ((UvDataLayers.GRID_TILE_ID, self.tile_ids),
+                             (UvDataLayers.GRID_SEL_ORIGIN, self.origin_ids)):
+            if values is None:
+                continue
+            ids = values[faces]
+            tile_x = ids % self.layout.row_size + tile_shift[:, 0]
+            tile_y = ids // self.layout.row_size + tile_shift[:, 1]
+            values[faces] = tile_y * new_layout.row_size + tile_x
+            mesh.polygon_layers_int[name].data.foreach_set('value', values)
+        mesh.update()
+        sprytile_bvh.invalidate(mesh)
+
+    def set_grid(self, mask, tile_grid, material_index):
+        """Move faces over to another tile grid and its material slot"""
+        mesh = self.obj.data
+        faces = self.faces[mask]
+        grid_ids = get_int_layer(mesh, UvDataLayers.GRID_INDEX, len(mesh.polygons))
+        grid_ids[faces] = tile_grid.id
+        mesh.polygon_layers_int[UvDataLayers.GRID_INDEX].data.foreach_set('value', grid_ids)
+        material_indices = numpy.empty(len(mesh.polygons), dtype=numpy.int32)
+        mesh.polygons.foreach_get('material_index', material_indices)
+        material_indices[faces] = material_index
+        mesh.polygons.foreach_set('material_index', material_indices)
+        mesh.update()
+
+
+def build_blocks(rects):
+    """
+    Group the tile rects of faces that overlap into blocks, so tiles that are
+    shown together by one face stay together
+    :param rects: iterable of inclusive (min x, min y, max x, max y) tile rects
+    :return: list of block rects, and dict of tile -> index of its block
+    """
+    owner = {}
+    blocks = {}
+    next_id = 0
+    for rect in rects:
+        rect = tuple(int(v) for v in rect)
+        while True:
+            hits = set()
+            for y in range(rect[1], rect[3] + 1):
+                for x in range(rect[0], rect[2] + 1):
+                    if (x, y) in owner:
+                        hits.add(owner[(x, y)])
+            grown = rect
+            for hit in hits:
+                other = blocks[hit]
+                grown = (min(grown[0], other[0]), min(grown[1], other[1]),
+                         max(grown[2], other[2]), max(grown[3], other[3]))
+            if grown == rect:
+                break
+            rect = grown
+        for hit in hits:
+            del blocks[hit]
+        blocks[next_id] = rect
+        for y in range(rect[1], rect[3] + 1):
+            for x in range(rect[0], rect[2] + 1):
+                owner[(x, y)] = next_id
+        next_id += 1
+
+    ids = sorted(blocks)
+    index = {block_id: i for i, block_id in enumerate(ids)}
+    return [blocks[block_id] for block_id in ids], {tile: index[block_id] for tile, block_id in owner.items()}
+
+
+def pack_shelves(sizes, columns):
+    """
+    Pack rect sizes into rows of shelves, tallest first
+    :return: list of (x, y) positions, and the packed height
+    """
+    positions = [None] * len(sizes)
+    x = y = shelf_height = 0
+    for i in sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0])):
+        width, height = sizes[i]
+        if x + width > columns:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+        positions[i] = (x, y)
+        x += width
+        shelf_height = max(shelf_height, height)
+    return positions, y + shelf_height
+
+
+def pack_blocks(sizes, cell_size, power_of_two):
+    """
+    Find the shelf packing of blocks of tiles with the smallest image
+    :param sizes: list of block sizes, in tiles
+    :param cell_size: pixel size of a tile cell
+    :param power_of_two: round the image size up to powers of two
+    :return: list of block positions in tiles, and the image size in pixels
+    """
+    def image_size(columns, rows):
+        size = [columns * cell_size[0], rows * cell_size[1]]
+        if power_of_two:
+            size = [2 ** int(math.ceil(math.log2(max(1, s)))) for s in size]
+        return size
+
+    min_columns = max(size[0] for size in sizes)
+    area = sum(size[0] * size[1] for size in sizes)
+    best = None
+    for columns in range(min_columns, max(min_columns, int(math.ceil(math.sqrt(area))) * 2) + 1):
+        positions, rows = pack_shelves(sizes, columns)
+        size = image_size(columns, rows)
+        # Smallest image first, then the squarest
+        score = (size[0] * size[1], abs(size[0] - size[1]))
+        if best is None or score < best[0]:
+            best = (score, positions, size)
+    return best[1], best[2]
+
+
+def get_users(context, tile_grid, layout):
+    """FaceTiles of every object with faces using a tile grid"""
+    users = [FaceTiles(user, tile_grid, layout) for user in get_grid_users(context, tile_grid)]
+    return [user for user in users if len(user) > 0]
+
+
+class AtlasOperator:
+    """
+    Runs an operation on the tileset of the active object's tile grid, in
+    object mode so the mesh data of every object using it is up to date
+    """
+    @classmethod
+    def poll(cls, context):
+        return context.object is not None and context.object.type == 'MESH'
+
+    def execute(self, context):
+        obj = context.object
+        tile_grid = sprytile_utils.get_grid(context, obj.sprytile_gridid)
+        image = sprytile_utils.get_grid_texture(obj, tile_grid) if tile_grid is not None else None
+        if image is None or image.size[0] == 0:
+            self.report({'ERROR'}, "The object's tile grid has no image")
+            return {'CANCELLED'}
+        if tile_grid.rotate != 0:
+            self.report({'ERROR'}, "Rotated tile grids aren't supported")
+            return {'CANCELLED'}
+
+        was_editing = obj.mode == 'EDIT'
+        if obj.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        result = self.run(context, tile_grid, image)
+        if was_editing:
+            bpy.ops.object.mode_set(mode='EDIT')
+        return result
+
+
+class UTIL_OP_SprytileRepackAtlas(AtlasOperator, bpy.types.Operator):
+    bl_idname = "sprytile.repack_atlas"
+    bl_label = "Repack Used Tiles"
+    bl_description = "Copy only the tiles used by the objects with this tileset into a new compact image, " \
+                     "and move the faces' UVs over to it"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    power_of_two: bpy.props.BoolProperty(
+        name="Power of Two",
+        description="Round the new image size up to powers of two",
+        default=False
+    )
+
+    def run(self, context, tile_grid, image):
+        # Other grids would still point into the old image
+        mat_data = sprytile_utils.get_mat_data(context, tile_grid.mat_id)
+        if mat_data is not None and len(mat_data.grids) > 1:
+            self.report({'ERROR'}, "Repacking needs the material to only have one tile grid")
+            return {'CANCELLED'}
+
+        layout = TileLayout.from_grid(tile_grid, image.size)
+        users = get_users(context, tile_grid, layout)
+        if len(users) == 0:
+            self.report({'INFO'}, "No faces use this tile grid")
+            return {'CANCELLED'}
+        outside = sum(user.out_of_image() for user in users)
+        if outside > 0:
+            self.report({'ERROR'}, "{0} faces have UVs past the image and can't be repacked".format(outside))
+            return {'CANCELLED'}
+
+        rects = set()
+        for user in users:
+            rects.update(map(tuple, numpy.hstack((user.tile_min, user.tile_max))))
+        blocks, owner = build_blocks(sorted(rects))
+        sizes = [(rect[2] - rect[0] + 1, rect[3] - rect[1] + 1) for rect in blocks]
+        cell_size = sprytile_tiles.get_cell_size(layout)
+        positions, size = pack_blocks(sizes, cell_size, self.power_of_two)
+
+        # Whole cells are copied, keeping any padding drawn around the tiles
+        new_layout = TileLayout(layout.grid, layout.padding, layout.margin, (0, 0), size)
+        source = get_pixels(image)
+        pixels = numpy.zeros((size[1], size[0], 4), dtype=numpy.float32)
+        cell_start = (layout.offset[0], layout.offset[1])
+        for rect, position, block_size in zip(blocks, positions, sizes):
+            blit(pixels, source,
+                 (position[0] * cell_size[0], position[1] * cell_size[1]),
+                 (cell_start[0] + rect[0] * cell_size[0], cell_start[1] + rect[1] * cell_size[1]),
+                 (block_size[0] * cell_size[0], block_size[1] * cell_size[1]))
+        packed = new_image(image.name + "_packed", pixels, image)
+
+        for user in users:
+            block_index = numpy.array([owner[tuple(tile)] for tile in user.tile_min.tolist()], dtype=numpy.int64)
+            block_min = numpy.array([blocks[i][:2] for i in range(len(blocks))], dtype=numpy.int64)[block_index]
+            block_position = numpy.array(positions, dtype=numpy.int64)[block_index]
+            user.remap(block_position + (user.tile_min - block_min), new_layout)
+
+        sprytile_utils.set_material_texture(sprytile_utils.get_grid_material(tile_grid), packed)
+        tile_grid.offset = (0, 0)
+        sprytile_tiles.invalidate(image)
+
+        used_tiles = sum(w * h for w, h in sizes)
+        before = get_image_bytes(image)
+        after = get_image_bytes(packed)
+        self.report({'INFO'}, "Packed {0} used tiles into {1}x{2}, saving {3:.2f} MB of {4:.2f} MB".format(
+            used_tiles, size[0], size[1], (before - after) / (1024 * 1024), before / (1024 * 1024)))
+        return {'FINISHED'}
+
+
+def find_duplicates(analysis, ignore_empty):
+    """
+    Group the tiles with identical pixels
+    :return: list of groups of (x, y) tile coordinates, the first tile by tile ID is the canonical one
+    """
+    tiles_x, tiles_y = analysis.tile_count
+    groups = {}
+    for y in range(tiles_y):
+        for x in range(tiles_x):
+            if ignore_empty and analysis.is_empty(x, y):
+                continue
+            groups.setdefault(analysis.get_hash(x, y), []).append((x, y))
+    return [group for group in groups.values() if len(group) > 1]
+
+
+class UTIL_OP_SprytileFindDuplicateTiles(AtlasOperator, bpy.types.Operator):
+    bl_idname = "sprytile.find_duplicate_tiles"
+    bl_label = "Find Duplicate Tiles"
+    bl_description = "Find the tiles of the tileset with identical pixels, " \
+                     "and optionally point the faces using copies at the first one"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    remap_faces: bpy.props.BoolProperty(
+        name="Remap Faces",
+        description="Move the faces showing a duplicate tile over to the first copy of it",
+        default=False
+    )
+    ignore_empty: bpy.props.BoolProperty(
+        name="Ignore Empty",
+        description="Don't count fully transparent tiles as duplicates",
+        default=True
+    )
+
+    def run(self, context, tile_grid, image):
+        analysis = sprytile_tiles.get_analysis(image, tile_grid)
+        if analysis is None:
+            self.report({'ERROR'}, "This tile grid's tiles can't be analyzed")
+            return {'CANCELLED'}
+        groups = find_duplicates(analysis, self.ignore_empty)
+        duplicate_count = sum(len(group) - 1 for group in groups)
+        for group in groups:
+            print("Sprytile duplicate tiles:", ", ".join("{0},{1}".format(x, y) for x, y in group))
+
+        remapped = 0
+        if self.remap_faces and duplicate_count > 0:
+            # Tile coordinate -> canonical tile coordinate, as a lookup array
+            tiles_x, tiles_y = analysis.tile_count
+            canonical = numpy.stack(numpy.meshgrid(numpy.arange(tiles_x), numpy.arange(tiles_y)), axis=-1)
+            for group in groups:
+                for x, y in group[1:]:
+                    canonical[y, x] = group[0]
+
+            layout = TileLayout.from_grid(tile_grid, image.size)
+            for user in get_users(context, tile_grid, layout):
+                # Multi tile faces show a block of tiles, they stay as they are
+                tile_x, tile_y = user.tile_min[:, 0], user.tile_min[:, 1]
+                single = (user.tile_min == user.tile_max).all(axis=1) & \
+                    (tile_x >= 0) & (tile_x < tiles_x) & (tile_y >= 0) & (tile_y < tiles_y)
+                new_tile_min = user.tile_min.copy()
+                new_tile_min[single] = canonical[tile_y[single], tile_x[single]]
+                moved = single & (new_tile_min != user.tile_min).any(axis=1)
+                if moved.any():
+                    user.remap(new_tile_min, layout, moved)
+                    remapped += int(moved.sum())
+
+        self.report({'INFO'}, "Found {0} duplicate tiles in {1} groups{2}".format(
+            duplicate_count, len(groups), ", remapped {0} faces".format(remapped) if self.remap_faces else ""))
+        return {'FINISHED'}
+
+
+def extrude_tiles(pixels, tile_grid, extrude):
+    """
+    Copy every tile of an image into cells surrounded by its own edge pixels,
+    so filtering and mipmaps sample the tile's colors past its edges
+    :param pixels: (height, width, 4) image pixels
+    :param tile_grid: tile grid laying out the tiles of the image
+    :param extrude: pixels to extend the edges of each tile by
+    :return: (height, width, 4) pixels of the padded atlas, and its size in tiles
+    """
+    height, width = pixels.shape[:2]
+    size_x, size_y = tile_grid.grid[0], tile_grid.grid[1]
+    origins_x, origins_y = sprytile_tiles.get_tile_rects((width, height), tile_grid)
+
+    # Pixel of each cell column and row, the extrusion repeats the tile's edge pixels
+    cols = origins_x[:, None] + numpy.clip(numpy.arange(-extrude, size_x + extrude), 0, size_x - 1)
+    rows = origins_y[:, None] + numpy.clip(numpy.arange(-extrude, size_y + extrude), 0, size_y - 1)
+    valid = ((rows >= 0) & (rows < height))[:, :, None, None] & ((cols >= 0) & (cols < width))[None, None, :, :]
+    cells = pixels[numpy.clip(rows, 0, height - 1)[:, :, None, None],
+                   numpy.clip(cols, 0, width - 1)[None, None, :, :]]
+    cells[~valid] = 0
+
+    # Indexed [tile y, cell y, tile x, cell x], which is already row major image order
+    tiles = (len(origins_x), len(origins_y))
+    return cells.reshape(cells.shape[0] * cells.shape[1], cells.shape[2] * cells.shape[3], 4), tiles
+
+
+def get_material_slot(obj, material):
+    """Index of a material on an object's mesh, adding it if missing"""
+    mesh = obj.data
+    for idx, mesh_material in enumerate(mesh.materials):
+        if mesh_material == material:
+            return idx
+    mesh.materials.append(material)
+    return len(mesh.materials) - 1
+
+
+class UTIL_OP_SprytileExtrudeAtlas(AtlasOperator, bpy.types.Operator):
+    bl_idname = "sprytile.extrude_atlas"
+    bl_label = "Build Padded Atlas"
+    bl_description = "Copy the tileset into a new image with the edge pixels of every tile extruded around it, " \
+                     "and move single tile faces over to a padded tile grid, so mipmaps don't bleed between tiles"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    extrude: bpy.props.IntProperty(
+        name="Extrude",
+        description="Pixels to extend the edges of each tile by",
+        default=2,
+        min=1,
+        max=16
+    )
+    use_linear: bpy.props.BoolProperty(
+        name="Linear Filtering",
+        description="Use linear filtering on the new material, the extruded edges keep it from bleeding",
+        default=False
+    )
+
+    def run(self, context, tile_grid, image):
+        material = sprytile_utils.get_grid_material(tile_grid)
+        extrude = self.extrude
+        layout = TileLayout.from_grid(tile_grid, image.size)
+        pixels, tiles = extrude_tiles(get_pixels(image), tile_grid, extrude)
+        if tiles[0] == 0 or tiles[1] == 0:
+            self.report({'ERROR'}, "The tile grid has no tiles on the image")
+            return {'CANCELLED'}
+        padded = new_image(image.name + "_padded", pixels, image)
+
+        # A material of its own, so faces that can't move keep the old tileset
+        padded_material = material.copy()
+        padded_material.name = material.name + "_padded"
+        sprytile_utils.set_material_texture(padded_material, padded)
+        if self.use_linear:
+            texture_node = sprytile_utils.get_material_texture_node(padded_material)
+            if texture_node:
+                texture_node.interpolation = 'Linear'
+
+        mat_data = context.scene.sprytile_mats.add()
+        mat_data.mat_id = padded_material.name
+        padded_grid = mat_data.grids.add()
+        padded_grid.mat_id = padded_material.name
+        padded_grid.id = sprytile_utils.get_highest_grid_id(context) + 1
+        padded_grid.name = tile_grid.name
+        # Padding eats into the grid size, so the grid starts as the whole cell
+        padded_grid.grid = (tile_grid.grid[0] + extrude * 2, tile_grid.grid[1] + extrude * 2)
+        padded_grid.padding = (extrude, extrude)
+        padded_grid.auto_pad = False
+        padded_grid.tile_selection = tile_grid.tile_selection
+        padded_grid_id = padded_grid.id
+        bpy.ops.sprytile.build_grid_list()
+        padded_grid = sprytile_utils.get_grid(context, padded_grid_id)
+
+        new_layout = TileLayout(layout.grid, (extrude, extrude), (0, 0, 0, 0), (0, 0), padded.size)
+        image_size = numpy.array(layout.image_size)
+        moved_count = 0
+        kept_count = 0
+        for user in get_users(context, tile_grid, layout):
+            # Multi tile faces and repeating UVs need their tiles side by side, they stay as they are
+            inside = (user.pixel_min >= -0.01).all(axis=1) & (user.pixel_max <= image_size + 0.01).all(axis=1)
+            single = (user.tile_min == user.tile_max).all(axis=1) & inside & \
+                (user.tile_min >= 0).all(axis=1) & (user.tile_min < tiles).all(axis=1)
+            kept_count += int((~single).sum())
+            if not single.any():
+                continue
+            user.remap(user.tile_min, new_layout, single)
+            user.set_grid(single, padded_grid, get_material_slot(user.obj, padded_material))
+            moved_count += int(single.sum())
+
+        self.report({'INFO'}, "Built {0}x{1} padded atlas, moved {2} faces{3}".format(
+            padded.size[0], padded.size[1], moved_count,
+            ", {0} faces kept the old tileset".format(kept_count) if kept_count > 0 else ""))
+        return {'FINISHED'}
+
+
+def draw_atlas_menu(self, context):
+    layout = self.layout
+    layout.separator()
+    layout.operator("sprytile.repack_atlas")
+    layout.operator("sprytile.find_duplicate_tiles")
+    layout.operator("sprytile.extrude_atlas")
+
+
+# module classes
+classes = (
+    UTIL_OP_SprytileRepackAtlas,
+    UTIL_OP_SprytileFindDuplicateTiles,
+    UTIL_OP_SprytileExtrudeAtlas,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.append(draw_atlas_menu)
+
+
+def unregister():
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.remove(draw_atlas_menu)
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
@@ -0,0 +1,195 @@
+import bpy
+from bpy.app.handlers import persistent
+from mathutils.bvhtree import BVHTree
+
+import sprytile_uv
+import sprytile_stats
+
+
+class LayerTrees:
+    """
+    Spatial indexes for one edit mesh, with a separate BVH tree for the faces
+    of each work layer value. Raycasts masked to a work layer only ever
+    traverse faces of that layer.
+
+    Faces are grouped by their work layer value. The groups are kept in sync
+    as faces are appended or change layer, and only the trees of the groups
+    that changed are rebuilt, on their next query. Face removal, or any
+    geometry edit made outside of Sprytile, rebuilds everything.
+    """
+    def __init__(self):
+        self.face_count = 0
+        self.vert_count = 0
+        # Work layer value of each face, by face index
+        self.face_layers = []
+        # Work layer value -> set of face indices
+        self.layer_faces = {}
+        # Work layer value -> (BVHTree, face index of each tree polygon)
+        self.trees = {}
+        self.is_stale = True
+
+    def rebuild(self, bmesh, work_layer_id):
+        bmesh.faces.ensure_lookup_table()
+        self.face_layers = [face[work_layer_id] for face in bmesh.faces]
+        self.layer_faces = {}
+        for face_index, layer_value in enumerate(self.face_layers):
+            self.layer_faces.setdefault(layer_value, set()).add(face_index)
+        self.trees = {}
+        self.face_count = len(bmesh.faces)
+        self.vert_count = len(bmesh.verts)
+        self.is_stale = False
+
+    def sync(self, bmesh, work_layer_id):
+        """Bring the face groups up to date with the mesh"""
+        face_count = len(bmesh.faces)
+        vert_count = len(bmesh.verts)
+        if self.is_stale or face_count < self.face_count or vert_count < self.vert_count:
+            self.rebuild(bmesh, work_layer_id)
+            return
+
+        # New faces are appended to the end of the face sequence
+        if face_count > self.face_count:
+            bmesh.faces.ensure_lookup_table()
+            for face_index in range(self.face_count, face_count):
+                layer_value = bmesh.faces[face_index][work_layer_id]
+                self.face_layers.append(layer_value)
+                self.layer_faces.setdefault(layer_value, set()).add(face_index)
+                self.trees.pop(layer_value, None)
+            self.face_count = face_count
+        self.vert_count = vert_count
+
+    def set_face_layer(self, face_index, layer_value):
+        if self.is_stale or face_index >= self.face_count:
+            return
+        old_value = self.face_layers[face_index]
+        if old_value == layer_value:
+            return
+        self.face_layers[face_index] = layer_value
+        self.layer_faces[old_value].discard(face_index)
+        self.layer_faces.setdefault(layer_value, set()).add(face_index)
+        self.trees.pop(old_value, None)
+        self.trees.pop(layer_value, None)
+
+    def get_tree(self, bmesh, work_layer_id, layer_value):
+        """
+        Get the BVH tree of the faces on a work layer
+        :return: BVHTree and the face index of each of its polygons, or None, None if the layer has no faces
+        """
+        self.sync(bmesh, work_layer_id)
+        if layer_value in self.trees:
+            return self.trees[layer_value]
+
+        face_indices = sorted(self.layer_faces.get(layer_value, ()))
+        if len(face_indices) == 0:
+            return None, None
+
+        stat_start = sprytile_stats.begin()
+        bmesh.faces.ensure_lookup_table()
+        verts = []
+        polygons = []
+        vert_lookup = {}
+        for face_index in face_indices:
+            polygon = []
+            for vert in bmesh.faces[face_index].verts:
+                tree_index = vert_lookup.get(vert)
+                if tree_index is None:
+                    tree_index = len(verts)
+                    vert_lookup[vert] = tree_index
+                    verts.append(vert.co.copy())
+                polygon.append(tree_index)
+            polygons.append(polygon)
+
+        tree = BVHTree.FromPolygons(verts, polygons, all_triangles=False)
+        sprytile_stats.end("layer_tree_build", stat_start)
+        sprytile_stats.count("layer_tree_rebuilds")
+        self.trees[layer_value] = tree, face_indices
+        return self.trees[layer_value]
+
+
+# Mesh pointer -> LayerTrees
+layer_trees = {}
+# Pointers of meshes Sprytile is editing, keeping their trees in sync itself
+held_meshes = set()
+
+
+def get_layer_tree(mesh, bmesh, layer_value):
+    """
+    Get the BVH tree of the faces of an edit mesh on a work layer
+    :param mesh: Mesh data block being edited
+    :param bmesh: The edit BMesh of the mesh
+    :param layer_value: Work layer value to get the tree of
+    :return: BVHTree and the face index of each of its polygons, or None, None if there are no such faces
+    """
+    work_layer_id = bmesh.faces.layers.int.get(sprytile_uv.UvDataLayers.WORK_LAYER)
+    if work_layer_id is None:
+        return None, None
+    key = mesh.as_pointer()
+    trees = layer_trees.get(key)
+    if trees is None:
+        trees = layer_trees[key] = LayerTrees()
+    return trees.get_tree(bmesh, work_layer_id, layer_value)
+
+
+def set_face_layer(mesh, face_index, layer_value):
+    """Let the indexes of mesh know the face changed work layer"""
+    trees = layer_trees.get(mesh.as_pointer())
+    if trees is not None:
+        trees.set_face_layer(face_index, layer_value)
+
+
+def invalidate(mesh=None):
+    """Rebuild the indexes of mesh, or of all meshes, on their next query"""
+    if mesh is None:
+        layer_trees.clear()
+        return
+    trees = layer_trees.get(mesh.as_pointer())
+    if trees is not None:
+        trees.is_stale = True
+
+
+def hold(mesh):
+    """Sprytile is editing mesh and keeps its indexes in sync, ignore its depsgraph updates"""
+    held_meshes.add(mesh.as_pointer())
+
+
+def release(mesh):
+    held_meshes.discard(mesh.as_pointer())
+
+
+@persistent
+def sprytile_depsgraph_handler(scene, depsgraph):
+    # Geometry edited by anything else, e.g. transforming vertices
+    for update in depsgraph.updates:
+        if not update.is_updated_geometry:
+            continue
+        id_data = update.id.original
+        if isinstance(id_data, bpy.types.Object):
+            id_data = id_data.data
+        if not isinstance(id_data, bpy.types.Mesh):
+            continue
+        key = id_data.as_pointer()
+        if key in layer_trees and key not in held_meshes:
+            layer_trees[key].is_stale = True
+
+
+@persistent
+def sprytile_bvh_load_handler(dummy):
+    invalidate()
+    held_meshes.clear()
+
+
+def register():
+    bpy.app.handlers.depsgraph_update_post.append(sprytile_depsgraph_handler)
+    bpy.app.handlers.load_post.append(sprytile_bvh_load_handler)
+
+
+def unregister():
+    if sprytile_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(sprytile_depsgraph_handler)
+    if sprytile_bvh_load_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(sprytile_bvh_load_handler)
+    invalidate()
+
+
+if __name__ == '__main__':
+    register()
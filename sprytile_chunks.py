@@ -0,0 +1,405 @@
+import math
+
+import bmesh
+import bpy
+from bpy_extras import view3d_utils
+from mathutils import Vector
+from mathutils.geometry import intersect_line_plane
+
+import sprytile_utils
+
+
+def get_root(obj):
+    """The tilemap object a chunk belongs to, or the object itself"""
+    if obj is not None and obj.sprytile_chunk_key != "" and obj.parent is not None:
+        return obj.parent
+    return obj
+
+
+def is_chunked(obj):
+    root = get_root(obj)
+    return root is not None and root.type == 'MESH' and root.sprytile_chunk_size > 0
+
+
+def get_chunks(root):
+    """
+    :return: dict of chunk key -> chunk object, of the chunks of a tilemap
+    """
+    return {child.sprytile_chunk_key: child for child in root.children
+            if child.type == 'MESH' and child.sprytile_chunk_key != ""}
+
+
+def get_cell_size(context, root, chunk_size=None):
+    """Size of a chunk region, in the tilemap's object space"""
+    if chunk_size is None:
+        chunk_size = root.sprytile_chunk_size
+    tile_size = 1.0
+    grid = sprytile_utils.get_grid(context, root.sprytile_gridid)
+    if grid is not None:
+        tile_size = grid.grid[0] / context.scene.sprytile_data.world_pixels
+    return chunk_size * tile_size
+
+
+def get_chunk_key(local_co, cell_size):
+    # Rounded first, so positions on region borders don't flip on float noise
+    return "{0}_{1}_{2}".format(*(math.floor(round(c / cell_size, 6)) for c in local_co))
+
+
+def new_chunk(root, key):
+    mesh = bpy.data.meshes.new("{0}_{1}".format(root.data.name, key))
+    for mat in root.data.materials:
+        mesh.materials.append(mat)
+    chunk = bpy.data.objects.new("{0}_{1}".format(root.name, key), mesh)
+    for collection in root.users_collection:
+        collection.objects.link(chunk)
+    # Chunks share the object space of the tilemap
+    chunk.parent = root
+    chunk.sprytile_gridid = root.sprytile_gridid
+    chunk.sprytile_chunk_key = key
+    return chunk
+
+
+def edit_object(context, obj):
+    """Make obj the only object in edit mode"""
+    if context.object == obj and obj.mode == 'EDIT':
+        return
+    if context.object is not None and context.object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    for other in context.selected_objects:
+        other.select_set(False)
+    obj.select_set(True)
+    context.view_layer.objects.active = obj
+    bpy.ops.object.mode_set(mode='EDIT')
+
+
+def pick_point(context, root, ray_origin, ray_vector, raycast):
+    """
+    Find where a stroke starts, to pick the chunk it edits
+    :param raycast: Raycast function for the object in edit mode
+    :return: World position, or None
+    """
+    scene = context.scene
+    if scene.sprytile_data.paint_mode == 'PAINT':
+        # Painting edits the faces under the mouse, in whichever chunk they are
+        best_dist = None
+        best_loc = None
+        edit_obj = context.object
+        location, normal, face_index, distance = raycast(edit_obj, ray_origin, ray_vector)
+        if location is not None:
+            best_dist = (location - ray_origin).length
+            best_loc = location
+        for chunk in get_chunks(root).values():
+            if chunk == edit_obj or not chunk.visible_get():
+                continue
+            matrix_inv = chunk.matrix_world.inverted()
+            origin = matrix_inv @ ray_origin
+            direction = (matrix_inv @ (ray_origin + ray_vector)) - origin
+            hit, location, normal, face_index = chunk.ray_cast(origin, direction)
+            if not hit:
+                continue
+            location = chunk.matrix_world @ location
+            dist = (location - ray_origin).length
+            if best_dist is None or dist < best_dist:
+                best_dist = dist
+                best_loc = location
+        if best_loc is not None:
+            return best_loc
+
+    up_vector, right_vector, plane_normal = sprytile_utils.get_current_grid_vectors(scene, with_rotation=False)
+    return intersect_line_plane(ray_origin, ray_origin + ray_vector, scene.cursor.location, plane_normal)
+
+
+def activate_chunk(context, event, raycast):
+    """
+    Switch edit mode to the chunk under the mouse, creating it if needed.
+    Only that chunk's mesh is converted in and out of edit mode, so the cost
+    of the switch scales with the chunk and not the whole tilemap.
+    :return: The object now in edit mode
+    """
+    obj = context.object
+    root = get_root(obj)
+    region = context.region
+    rv3d = context.region_data
+    if event is None or rv3d is None:
+        return obj
+
+    coord = event.mouse_region_x, event.mouse_region_y
+    ray_vector = view3d_utils.region_2d_to_vector_3d(region, rv3d, coord)
+    ray_origin = view3d_utils.region_2d_to_origin_3d(region, rv3d, coord)
+    point = pick_point(context, root, ray_origin, ray_vector, raycast)
+    if point is None:
+        return obj
+
+    key = get_chunk_key(root.matrix_world.inverted() @ point, get_cell_size(context, root))
+    if obj.sprytile_chunk_key == key:
+        return obj
+    chunk = get_chunks(root).get(key)
+    if chunk is None:
+        chunk = new_chunk(root, key)
+    edit_object(context, chunk)
+    return context.object
+
+
+def copy_faces(source, faces, target):
+    """Copy faces with their UVs, tile data and materials into another BMesh"""
+    for name in source.faces.layers.int.keys():
+        if target.faces.layers.int.get(name) is None:
+            target.faces.layers.int.new(name)
+    for name in source.loops.layers.uv.keys():
+        if target.loops.layers.uv.get(name) is None:
+            target.loops.layers.uv.new(name)
+    int_layers = [(source.faces.layers.int[name], target.faces.layers.int[name])
+                  for name in source.faces.layers.int.keys()]
+    uv_layers = [(source.loops.layers.uv[name], target.loops.layers.uv[name])
+                 for name in source.loops.layers.uv.keys()]
+
+    vert_map = {}
+    for face in faces:
+        verts = []
+        for vert in face.verts:
+            new_vert = vert_map.get(vert)
+            if new_vert is None:
+                new_vert = target.verts.new(vert.co)
+                vert_map[vert] = new_vert
+            verts.append(new_vert)
+        new_face = target.faces.new(verts)
+        new_face.material_index = face.material_index
+        new_face.smooth = face.smooth
+        new_face.hide = face.hide
+        for src_layer, dst_layer in int_layers:
+            new_face[dst_layer] = face[src_layer]
+        for src_loop, dst_loop in zip(face.loops, new_face.loops):
+            for src_layer, dst_layer in uv_layers:
+                dst_loop[dst_layer].uv = src_loop[src_layer].uv
+
+
+def join_chunks(context, root):
+    """Join all chunks back into the tilemap object. Must be in object mode"""
+    chunks = list(get_chunks(root).values())
+    if len(chunks) == 0:
+        return 0
+    for other in context.selected_objects:
+        other.select_set(False)
+    for chunk in chunks:
+        chunk.select_set(True)
+    root.select_set(True)
+    context.view_layer.objects.active = root
+    bpy.ops.object.join()
+    return len(chunks)
+
+
+def split_chunks(context, root, chunk_size):
+    """
+    Move the faces of the tilemap object into chunk objects, by the region
+    their center is in. Must be in object mode.
+    :return: Number of chunks created
+    """
+    cell_size = get_cell_size(context, root, chunk_size)
+    source = bmesh.new()
+    source.from_mesh(root.data)
+
+    regions = {}
+    for face in source.faces:
+        key = get_chunk_key(face.calc_center_bounds(), cell_size)
+        regions.setdefault(key, []).append(face)
+
+    for key, faces in regions.items():
+        chunk = new_chunk(root, key)
+        target = bmesh.new()
+        copy_faces(source, faces, target)
+        target.to_mesh(chunk.data)
+        target.free()
+    source.free()
+
+    empty = bmesh.new()
+    empty.to_mesh(root.data)
+    empty.free()
+    root.data.update()
+    return len(regions)
+
+
+def get_seam_verts(bm, cell_size, threshold):
+    """Verts lying on the border between chunk regions"""
+    seam_verts = []
+    for vert in bm.verts:
+        for c in vert.co:
+            offset = c / cell_size
+            if abs(offset - round(offset)) * cell_size <= threshold:
+                seam_verts.append(vert)
+                break
+    return seam_verts
+
+
+def weld_seams(context, root, threshold):
+    """
+    Snap seam verts of neighbouring chunks to the same position, closing
+    cracks between chunks without merging them. Must be in object mode.
+    :return: Number of verts moved
+    """
+    cell_size = get_cell_size(context, root)
+    meshes = []
+    groups = {}
+    for chunk in get_chunks(root).values():
+        bm = bmesh.new()
+        bm.from_mesh(chunk.data)
+        mesh_index = len(meshes)
+        meshes.append((chunk, bm))
+        for vert in get_seam_verts(bm, cell_size, threshold):
+            key = tuple(round(c / threshold) for c in vert.co)
+            groups.setdefault(key, []).append((mesh_index, vert))
+
+    moved = 0
+    for members in groups.values():
+        if len(set(mesh_index for mesh_index, vert in members)) < 2:
+            continue
+        center = Vector((0.0, 0.0, 0.0))
+        for mesh_index, vert in members:
+            center += vert.co
+        center /= len(members)
+        for mesh_index, vert in members:
+            if vert.co != center:
+                vert.co = center
+                moved += 1
+
+    for chunk, bm in meshes:
+        bm.to_mesh(chunk.data)
+        chunk.data.update()
+        bm.free()
+    return moved
+
+
+def merge_seams(root, cell_size, threshold):
+    """Merge the doubled verts along chunk seams of a joined tilemap"""
+    bm = bmesh.new()
+    bm.from_mesh(root.data)
+    seam_verts = get_seam_verts(bm, cell_size, threshold)
+    vert_count = len(bm.verts)
+    bmesh.ops.remove_doubles(bm, verts=seam_verts, dist=threshold)
+    merged = vert_count - len(bm.verts)
+    bm.to_mesh(root.data)
+    root.data.update()
+    bm.free()
+    return merged
+
+
+class ChunkOperator:
+    """Runs a chunk operation in object mode, returning to the mode the user was in"""
+    @classmethod
+    def poll(cls, context):
+        return context.object is not None and context.object.type == 'MESH'
+
+    def execute(self, context):
+        root = get_root(context.object)
+        was_editing = context.object.mode == 'EDIT'
+        if context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        result = self.run(context, root)
+        for other in context.selected_objects:
+            other.select_set(False)
+        root.select_set(True)
+        context.view_layer.objects.active = root
+        if was_editing:
+            bpy.ops.object.mode_set(mode='EDIT')
+        return result
+
+
+class UTIL_OP_SprytileSplitChunks(ChunkOperator, bpy.types.Operator):
+    bl_idname = "sprytile.chunks_split"
+    bl_label = "Split Into Chunks"
+    bl_description = "Split the tilemap into child objects per region, so editing only works on the chunk " \
+                     "under the mouse instead of the whole map. Rebuilds the chunks of a chunked tilemap"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    chunk_size: bpy.props.IntProperty(
+        name="Chunk Size",
+        description="Size of a chunk region, in tiles",
+        default=32,
+        min=1,
+        max=4096
+    )
+
+    def invoke(self, context, event):
+        root = get_root(context.object)
+        if root.sprytile_chunk_size > 0:
+            self.chunk_size = root.sprytile_chunk_size
+        return context.window_manager.invoke_props_dialog(self)
+
+    def run(self, context, root):
+        # Faces drawn across a region border stay in the chunk the stroke
+        # started in, rebuilding moves them where they belong
+        join_chunks(context, root)
+        chunk_count = split_chunks(context, root, self.chunk_size)
+        root.sprytile_chunk_size = self.chunk_size
+        self.report({'INFO'}, "Split {0} into {1} chunks".format(root.name, chunk_count))
+        return {'FINISHED'}
+
+
+class UTIL_OP_SprytileMergeChunks(ChunkOperator, bpy.types.Operator):
+    bl_idname = "sprytile.chunks_merge"
+    bl_label = "Merge Chunks"
+    bl_description = "Join the chunks of a tilemap back into a single object, for exporting"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    weld_seams: bpy.props.BoolProperty(
+        name="Weld Seams",
+        description="Merge the doubled vertices along the borders between chunks",
+        default=True
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return ChunkOperator.poll(context) and is_chunked(context.object)
+
+    def run(self, context, root):
+        cell_size = get_cell_size(context, root)
+        threshold = 0.25 / context.scene.sprytile_data.world_pixels
+        chunk_count = join_chunks(context, root)
+        merged = merge_seams(root, cell_size, threshold) if self.weld_seams else 0
+        root.sprytile_chunk_size = 0
+        self.report({'INFO'}, "Merged {0} chunks, welded {1} vertices".format(chunk_count, merged))
+        return {'FINISHED'}
+
+
+class UTIL_OP_SprytileWeldChunkSeams(ChunkOperator, bpy.types.Operator):
+    bl_idname = "sprytile.chunks_weld_seams"
+    bl_label = "Weld Chunk Seams"
+    bl_description = "Snap the vertices on the borders of neighbouring chunks together, closing cracks"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return ChunkOperator.poll(context) and is_chunked(context.object)
+
+    def run(self, context, root):
+        threshold = 0.25 / context.scene.sprytile_data.world_pixels
+        moved = weld_seams(context, root, threshold)
+        self.report({'INFO'}, "Moved {0} seam vertices".format(moved))
+        return {'FINISHED'}
+
+
+def draw_chunks_menu(self, context):
+    layout = self.layout
+    layout.separator()
+    layout.operator("sprytile.chunks_split")
+    layout.operator("sprytile.chunks_weld_seams")
+    layout.operator("sprytile.chunks_merge")
+
+
+# module classes
+classes = (
+    UTIL_OP_SprytileSplitChunks,
+    UTIL_OP_SprytileMergeChunks,
+    UTIL_OP_SprytileWeldChunkSeams,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.append(draw_chunks_menu)
+
+
+def unregister():
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.remove(draw_chunks_menu)
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
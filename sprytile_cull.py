@@ -0,0 +1,185 @@
+import bmesh
+import bpy
+
+import sprytile_bvh
+import sprytile_utils
+from sprytile_uv import UvDataLayers
+
+# Positions are compared after rounding to this many decimals
+PRECISION = 4
+
+
+def round_co(co):
+    return tuple(round(c, PRECISION) for c in co)
+
+
+def get_edge_key(edge):
+    return tuple(sorted((round_co(edge.verts[0].co), round_co(edge.verts[1].co))))
+
+
+class OccupancyIndex:
+    """
+    Hashes faces by the positions of their verts and edges, so faces on the
+    same cell and faces meeting along an edge are found in constant time,
+    whether or not their verts are welded.
+    """
+    def __init__(self, bm):
+        work_layer = bm.faces.layers.int.get(UvDataLayers.WORK_LAYER)
+        # Footprint -> faces covering exactly those positions
+        self.cells = {}
+        # Edge positions -> faces using an edge there
+        self.edges = {}
+        for face in bm.faces:
+            if face.hide:
+                continue
+            layer_value = face[work_layer] if work_layer is not None else 0
+            footprint = (tuple(sorted(round_co(vert.co) for vert in face.verts)), layer_value)
+            self.cells.setdefault(footprint, []).append(face)
+            for edge in face.edges:
+                self.edges.setdefault(get_edge_key(edge), []).append(face)
+
+    def is_enclosed(self, face):
+        """
+        If every edge of the face meets a perpendicular face on the side it
+        faces, it looks into a block and can't be seen
+        """
+        normal = face.normal
+        for edge in face.edges:
+            mid = (edge.verts[0].co + edge.verts[1].co) / 2
+            closed = False
+            for other in self.edges.get(get_edge_key(edge), ()):
+                if other is face or abs(other.normal.dot(normal)) > 0.1:
+                    continue
+                if (other.calc_center_median() - mid).dot(normal) > 10 ** -PRECISION:
+                    closed = True
+                    break
+            if not closed:
+                return False
+        return True
+
+
+def find_hidden_faces(bm):
+    """
+    Find faces that can't be seen in block style builds
+    :return: list of duplicate faces, list of interior faces
+    """
+    index = OccupancyIndex(bm)
+    duplicates = []
+    interior = []
+    for faces in index.cells.values():
+        if len(faces) < 2:
+            continue
+        facing = {}
+        for face in faces:
+            facing.setdefault(round_co(face.normal), []).append(face)
+
+        # Faces built again on the same cell, the last one built is kept
+        kept = []
+        for same_facing in facing.values():
+            same_facing.sort(key=lambda f: f.index)
+            duplicates.extend(same_facing[:-1])
+            kept.append(same_facing[-1])
+
+        # Back to back faces between two blocks. Double sided walls
+        # standing on their own are kept, they aren't enclosed on both sides
+        if len(kept) == 2 and kept[0].normal.dot(kept[1].normal) < -0.99:
+            if index.is_enclosed(kept[0]) and index.is_enclosed(kept[1]):
+                interior.extend(kept)
+    return duplicates, interior
+
+
+class UTIL_OP_SprytileCullHiddenFaces(bpy.types.Operator):
+    bl_idname = "sprytile.cull_hidden_faces"
+    bl_label = "Cull Hidden Faces"
+    bl_description = "Find faces built twice on the same cell, and back to back faces sandwiched between blocks, " \
+                     "and remove them"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    dry_run: bpy.props.BoolProperty(
+        name="Dry Run",
+        description="Only report the hidden faces, selecting them in edit mode, without removing them",
+        default=True
+    )
+    remove_duplicates: bpy.props.BoolProperty(
+        name="Duplicates",
+        description="Faces built again on the same cell, facing the same way. The last one built is kept",
+        default=True
+    )
+    remove_interior: bpy.props.BoolProperty(
+        name="Interior",
+        description="Back to back faces between two blocks",
+        default=True
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.object is not None and context.object.type == 'MESH'
+
+    def execute(self, context):
+        obj = context.object
+        is_edit = obj.mode == 'EDIT'
+        if is_edit:
+            bm = bmesh.from_edit_mesh(obj.data)
+        else:
+            bm = bmesh.new()
+            bm.from_mesh(obj.data)
+        bm.faces.index_update()
+        bm.normal_update()
+
+        duplicates, interior = find_hidden_faces(bm)
+        hidden = []
+        if self.remove_duplicates:
+            hidden.extend(duplicates)
+        if self.remove_interior:
+            hidden.extend(interior)
+        face_count = len(bm.faces)
+
+        if self.dry_run:
+            if is_edit:
+                for face in bm.faces:
+                    face.select = False
+                for face in hidden:
+                    face.select = True
+                bm.select_flush_mode()
+                bmesh.update_edit_mesh(obj.data, False, False)
+            else:
+                bm.free()
+            self.report({'INFO'}, "Found {0} duplicate and {1} interior faces of {2}{3}".format(
+                len(duplicates), len(interior), face_count, ", selected them" if is_edit else ""))
+            return {'FINISHED'}
+
+        bmesh.ops.delete(bm, geom=hidden, context='FACES')
+        if is_edit:
+            for el in [bm.faces, bm.verts, bm.edges]:
+                el.index_update()
+                el.ensure_lookup_table()
+            bmesh.update_edit_mesh(obj.data, True, True)
+        else:
+            bm.to_mesh(obj.data)
+            obj.data.update()
+            bm.free()
+        sprytile_bvh.invalidate(obj.data)
+        self.report({'INFO'}, "Removed {0} of {1} faces".format(len(hidden), face_count))
+        return {'FINISHED'}
+
+
+def draw_cull_menu(self, context):
+    self.layout.operator("sprytile.cull_hidden_faces")
+
+
+# module classes
+classes = (
+    UTIL_OP_SprytileCullHiddenFaces,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.append(draw_cull_menu)
+
+
+def unregister():
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.remove(draw_cull_menu)
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
@@ -0,0 +1,480 @@
+import bmesh
+import bpy
+import numpy
+
+import sprytile_bvh
+import sprytile_tiles
+import sprytile_utils
+from sprytile_uv import UvDataLayers
+
+# Step directions around the pixel corners, counter clockwise from right
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+
+
+def fill_holes(mask):
+    """Fill the pixels the outside of the tile can't reach, so only outer outlines are traced"""
+    height, width = mask.shape
+    solid = numpy.pad(mask, 1)
+    outside = numpy.zeros_like(solid)
+    outside[0, :] = outside[-1, :] = outside[:, 0] = outside[:, -1] = True
+    # Diagonal steps too, empty pixels are connected across corners
+    while True:
+        grown = outside.copy()
+        grown[1:, :] |= outside[:-1, :]
+        grown[:-1, :] |= outside[1:, :]
+        grown[:, 1:] |= grown[:, :-1]
+        grown[:, :-1] |= grown[:, 1:]
+        grown &= ~solid
+        if numpy.array_equal(grown, outside):
+            break
+        outside = grown
+    return ~outside[1:height + 1, 1:width + 1]
+
+
+def trace_outlines(mask):
+    """
+    Marching squares over the pixel corners, tracing the outline of each
+    island of visible pixels. Outlines run counter clockwise on pixel edges,
+    and islands touching at a corner are traced separately.
+    :param mask: 2D bool array indexed [y, x]
+    :return: list of outlines, as lists of (x, y) pixel corners
+    """
+    solid = numpy.pad(mask, 1)
+    # Directed boundary edges, with the visible pixel on their left
+    edges = {}
+    for y, x in zip(*solid.nonzero()):
+        px, py = int(x) - 1, int(y) - 1
+        if not solid[y - 1, x]:
+            edges.setdefault((px, py), []).append(0)
+        if not solid[y, x + 1]:
+            edges.setdefault((px + 1, py), []).append(1)
+        if not solid[y + 1, x]:
+            edges.setdefault((px + 1, py + 1), []).append(2)
+        if not solid[y, x - 1]:
+            edges.setdefault((px, py + 1), []).append(3)
+
+    outlines = []
+    while len(edges) > 0:
+        start = next(iter(edges))
+        point = start
+        direction = first_step = edges[start][0]
+        outline = []
+        while True:
+            outgoing = edges.get(point)
+            if outgoing is None:
+                break
+            # Where two islands touch, turn left to stay on the same island
+            for turn in (1, 0, 3):
+                step = (direction + turn) % 4
+                if step in outgoing:
+                    break
+            else:
+                step = outgoing[0]
+            outgoing.remove(step)
+            if len(outgoing) == 0:
+                del edges[point]
+            if len(outline) == 0 or step != direction:
+                outline.append(point)
+            direction = step
+            point = (point[0] + DIRECTIONS[step][0], point[1] + DIRECTIONS[step][1])
+            if point == start:
+                break
+        # The start may sit in the middle of a straight edge
+        if len(outline) > 2 and direction == first_step:
+            outline.pop(0)
+        if len(outline) >= 3:
+            outlines.append(outline)
+    return outlines
+
+
+def signed_area(outline):
+    """Area of an outline, positive if it runs counter clockwise"""
+    area = 0.0
+    for i in range(len(outline)):
+        a, b = outline[i - 1], outline[i]
+        area += a[0] * b[1] - b[0] * a[1]
+    return area / 2
+
+
+def split_outline(outline):
+    """
+    Split an outline that touches itself, where islands meet at a corner,
+    into simple loops at its repeated corners. A loop running clockwise is
+    a pocket of empty pixels inside another loop, which already covers it,
+    so it's dropped.
+    :return: list of counter clockwise outlines without repeated corners
+    """
+    loops = []
+    pending = [list(outline)]
+    while len(pending) > 0:
+        loop = pending.pop()
+        seen = {}
+        for i, point in enumerate(loop):
+            if point in seen:
+                j = seen[point]
+                pending.append(loop[j:i])
+                pending.append(loop[i:] + loop[:j])
+                break
+            seen[point] = i
+        else:
+            if len(loop) >= 3 and signed_area(loop) > 0:
+                loops.append(loop)
+    return loops
+
+
+def contains_points(outline, points):
+    """
+    Even odd test of which points are inside an outline
+    :param points: (count, 2) array of (x, y)
+    :return: bool array
+    """
+    start = numpy.array(outline, dtype=numpy.float64)
+    end = numpy.roll(start, -1, axis=0)
+    x = points[:, 0, None]
+    y = points[:, 1, None]
+    spans = (start[:, 1] > y) != (end[:, 1] > y)
+    height = numpy.where(end[:, 1] != start[:, 1], end[:, 1] - start[:, 1], 1.0)
+    x_cross = start[:, 0] + (y - start[:, 1]) * (end[:, 0] - start[:, 0]) / height
+    return (spans & (x < x_cross)).sum(axis=1) % 2 == 1
+
+
+def cross(a, b, c):
+    return (b[0] - a[0]) * (c[1] - b[1]) - (b[1] - a[1]) * (c[0] - b[0])
+
+
+def segments_cross(a, b, c, d):
+    """
+    True if segments ab and cd cross or touch. Segments sharing an end point
+    only count when they run along each other from it.
+    """
+    def orient(p, q, r):
+        value = (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+        return (value > 1e-9) - (value < -1e-9)
+
+    def on_segment(p, q, r):
+        return min(p[0], q[0]) - 1e-9 <= r[0] <= max(p[0], q[0]) + 1e-9 and \
+               min(p[1], q[1]) - 1e-9 <= r[1] <= max(p[1], q[1]) + 1e-9
+
+    for shared, other in ((a, b), (b, a)):
+        for shared_cd, other_cd in ((c, d), (d, c)):
+            if shared == shared_cd:
+                same_way = (other[0] - shared[0]) * (other_cd[0] - shared[0]) + \
+                           (other[1] - shared[1]) * (other_cd[1] - shared[1]) > 0
+                return orient(shared, other, other_cd) == 0 and same_way
+
+    o1, o2 = orient(a, b, c), orient(a, b, d)
+    o3, o4 = orient(c, d, a), orient(c, d, b)
+    if o1 != o2 and o3 != o4:
+        return True
+    return (o1 == 0 and on_segment(a, b, c)) or (o2 == 0 and on_segment(a, b, d)) or \
+           (o3 == 0 and on_segment(c, d, a)) or (o4 == 0 and on_segment(c, d, b))
+
+
+def is_clear(outline, new_edges, skip):
+    """True if the new edges don't cross the outline's edges, other than the ones being replaced"""
+    count = len(outline)
+    for i in range(count):
+        if i in skip:
+            continue
+        a, b = outline[i], outline[(i + 1) % count]
+        for c, d in new_edges:
+            if segments_cross(a, b, c, d):
+                return False
+    return True
+
+
+def simplify(outline, budget, size):
+    """
+    Reduce an outline to at most budget vertices, only ever growing it so
+    no visible pixel is cut off. Concave corners are cut across, and once
+    the outline is convex, pairs of corners are replaced by the point their
+    neighbouring edges meet at. The cheapest step in added area goes first.
+    :param outline: counter clockwise list of (x, y)
+    :param budget: vertex budget
+    :param size: tile size, points are kept inside of it
+    :return: simplified outline
+    """
+    outline = list(outline)
+    while len(outline) > max(budget, 3):
+        count = len(outline)
+        steps = []
+        for i in range(count):
+            a, v, b = outline[i - 1], outline[i], outline[(i + 1) % count]
+            turn = cross(a, v, b)
+            if turn < 0:
+                # Concave corner, the edge straight from a to b covers it
+                steps.append((-turn / 2, i, None))
+                continue
+            # Edge from v to b, extend the edges before and after it until they meet
+            c = outline[(i + 2) % count]
+            da = (v[0] - a[0], v[1] - a[1])
+            dc = (b[0] - c[0], b[1] - c[1])
+            denom = da[0] * dc[1] - da[1] * dc[0]
+            if abs(denom) < 1e-9:
+                continue
+            t = ((b[0] - v[0]) * dc[1] - (b[1] - v[1]) * dc[0]) / denom
+            point = (v[0] + da[0] * t, v[1] + da[1] * t)
+            if t <= 0 or not (0 <= point[0] <= size[0] and 0 <= point[1] <= size[1]):
+                continue
+            # Landing on another corner would make the outline touch itself
+            if point in outline:
+                continue
+            # Only grow on the outside of the edge
+            if cross(v, b, point) >= 0:
+                continue
+            # The extensions must meet past b too, or the point is on the inside
+            if (point[0] - b[0]) * dc[0] + (point[1] - b[1]) * dc[1] <= 0:
+                continue
+            area = abs(cross(v, point, b)) / 2
+            steps.append((area, i, point))
+        steps.sort(key=lambda s: s[0])
+
+        applied = False
+        for area, i, point in steps:
+            a, v, b = outline[i - 1], outline[i], outline[(i + 1) % count]
+            if point is None:
+                if is_clear(outline, ((a, b),), {(i - 1) % count, i}):
+                    outline.pop(i)
+                    applied = True
+                    break
+                continue
+            c = outline[(i + 2) % count]
+            if is_clear(outline, ((a, point), (point, c)), {(i - 1) % count, i, (i + 1) % count}):
+                outline[i] = point
+                outline.pop((i + 1) % count)
+                applied = True
+                break
+        if not applied:
+            break
+    return outline
+
+
+def simplify_covering(outline, budget, size):
+    """
+    Simplify an outline, keeping it as traced if the simplified one would
+    leave out any pixel the traced one covers
+    """
+    simplified = simplify(outline, budget, size)
+    if len(simplified) == len(outline):
+        return simplified
+    min_x, min_y = numpy.min(outline, axis=0)
+    max_x, max_y = numpy.max(outline, axis=0)
+    grid_x, grid_y = numpy.meshgrid(numpy.arange(min_x, max_x) + 0.5, numpy.arange(min_y, max_y) + 0.5)
+    centers = numpy.stack((grid_x.ravel(), grid_y.ravel()), axis=1)
+    centers = centers[contains_points(outline, centers)]
+    if not contains_points(simplified, centers).all():
+        return outline
+    return simplified
+
+
+def get_outlines(mask, budget):
+    """
+    Simplified outlines of the visible pixels of a tile
+    :param mask: 2D bool array of the tile's visible pixels, indexed [y, x]
+    :param budget: total vertex budget, shared by the islands by their size
+    :return: list of outlines, as lists of (x, y) in tile pixels
+    """
+    outlines = [loop for outline in trace_outlines(fill_holes(mask)) for loop in split_outline(outline)]
+    total = sum(len(outline) for outline in outlines)
+    size = (mask.shape[1], mask.shape[0])
+    return [simplify_covering(outline, max(4, round(budget * len(outline) / total)), size)
+            for outline in outlines]
+
+
+# (tile content hash, tile size, budget) -> outlines
+cache = {}
+
+
+def get_tile_outlines(analysis, tile_x, tile_y, budget):
+    """Cached outlines of a tile, tiles with the same pixels share them"""
+    tile_hash = analysis.get_hash(tile_x, tile_y)
+    if tile_hash is None:
+        return None
+    key = (tile_hash, analysis.tile_size, budget)
+    outlines = cache.get(key)
+    if outlines is None:
+        outlines = get_outlines(analysis.get_alpha(tile_x, tile_y) > 0, budget)
+        cache[key] = outlines
+    return outlines
+
+
+def get_uv_transform(face, uv_layer):
+    """
+    Map from UV to position over a quad, if its UVs are an affine map of it
+    :return: function taking a UV and returning a local position, or None
+    """
+    if len(face.loops) != 4:
+        return None
+    loops = face.loops
+    uv_0 = loops[0][uv_layer].uv.copy()
+    uv_x = loops[1][uv_layer].uv - uv_0
+    uv_y = loops[3][uv_layer].uv - uv_0
+    co_0 = loops[0].vert.co.copy()
+    co_x = loops[1].vert.co - co_0
+    co_y = loops[3].vert.co - co_0
+    if (uv_0 + uv_x + uv_y - loops[2][uv_layer].uv).length > 1e-5 or \
+            (co_0 + co_x + co_y - loops[2].vert.co).length > 1e-4:
+        return None
+    det = uv_x.x * uv_y.y - uv_x.y * uv_y.x
+    if abs(det) < 1e-12:
+        return None
+
+    def uv_to_co(uv):
+        rel_x = uv[0] - uv_0.x
+        rel_y = uv[1] - uv_0.y
+        a = (rel_x * uv_y.y - rel_y * uv_y.x) / det
+        b = (uv_x.x * rel_y - uv_x.y * rel_x) / det
+        return co_0 + co_x * a + co_y * b
+    return uv_to_co
+
+
+def get_face_tile(face, uv_layer, image_size, tile_grid, analysis):
+    """
+    The tile a face shows, if its UVs cover all the tile's visible pixels without going past the tile
+    :return: (tile x, tile y) or None
+    """
+    pixels = [(loop[uv_layer].uv.x * image_size[0], loop[uv_layer].uv.y * image_size[1]) for loop in face.loops]
+    min_x = min(p[0] for p in pixels)
+    max_x = max(p[0] for p in pixels)
+    min_y = min(p[1] for p in pixels)
+    max_y = max(p[1] for p in pixels)
+    tile_x, tile_y = sprytile_tiles.get_tile_at(tile_grid, (min_x + max_x) / 2, (min_y + max_y) / 2)
+    if not analysis.in_range(tile_x, tile_y):
+        return None
+    origin_x, origin_y = sprytile_tiles.get_tile_origin(tile_grid, tile_x, tile_y)
+    bounds = analysis.get_bounds(tile_x, tile_y)
+    if bounds is None:
+        return tile_x, tile_y
+    tolerance = 0.01
+    covers = min_x <= origin_x + bounds[0] + tolerance and max_x >= origin_x + bounds[2] - tolerance and \
+        min_y <= origin_y + bounds[1] + tolerance and max_y >= origin_y + bounds[3] - tolerance
+    inside = min_x >= origin_x - tolerance and max_x <= origin_x + tile_grid.grid[0] + tolerance and \
+        min_y >= origin_y - tolerance and max_y <= origin_y + tile_grid.grid[1] + tolerance
+    if not covers or not inside:
+        return None
+    return tile_x, tile_y
+
+
+def cutout_face(bm, face, uv_layer, image_size, tile_grid, analysis, budget):
+    """
+    Build faces cut to the outline of the tile a quad shows, keeping its UV
+    mapping, material and Sprytile face layers. The quad itself is left for
+    the caller to remove.
+    :return: list of new faces, empty if the tile is fully transparent, or None if the face can't be cut out
+    """
+    uv_to_co = get_uv_transform(face, uv_layer)
+    if uv_to_co is None:
+        return None
+    tile = get_face_tile(face, uv_layer, image_size, tile_grid, analysis)
+    if tile is None:
+        return None
+    state = analysis.get_state(tile[0], tile[1])
+    if state == sprytile_tiles.TILE_EMPTY:
+        return []
+    # A quad is already the tightest outline of an opaque tile
+    if state == sprytile_tiles.TILE_OPAQUE:
+        return None
+    outlines = get_tile_outlines(analysis, tile[0], tile[1], budget)
+    if outlines is None:
+        return None
+
+    origin_x, origin_y = sprytile_tiles.get_tile_origin(tile_grid, tile[0], tile[1])
+    new_faces = []
+    for outline in outlines:
+        uvs = [((origin_x + x) / image_size[0], (origin_y + y) / image_size[1]) for x, y in outline]
+        verts = [bm.verts.new(uv_to_co(uv)) for uv in uvs]
+        new_face = bm.faces.new(verts, face)
+        new_face.normal_update()
+        if new_face.normal.dot(face.normal) < 0:
+            new_face.normal_flip()
+        for loop in new_face.loops:
+            loop[uv_layer].uv = uvs[verts.index(loop.vert)]
+        new_face.select = face.select
+        new_faces.append(new_face)
+    return new_faces
+
+
+class UTIL_OP_SprytileConvertCutouts(bpy.types.Operator):
+    bl_idname = "sprytile.convert_cutouts"
+    bl_label = "Convert Tiles to Cutouts"
+    bl_description = "Replace the selected tile quads with faces cut to the outline of their tile's visible pixels"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    vertex_budget: bpy.props.IntProperty(
+        name="Vertex Budget",
+        description="Most vertices for the outline of a tile",
+        default=12,
+        min=4,
+        max=64
+    )
+    remove_empty: bpy.props.BoolProperty(
+        name="Remove Empty",
+        description="Remove faces showing fully transparent tiles",
+        default=True
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.object is not None and context.object.type == 'MESH' and context.object.mode == 'EDIT'
+
+    def execute(self, context):
+        obj = context.object
+        bm = bmesh.from_edit_mesh(obj.data)
+        uv_layer = bm.loops.layers.uv.verify()
+        grid_layer = bm.faces.layers.int.get(UvDataLayers.GRID_INDEX)
+        if grid_layer is None:
+            self.report({'INFO'}, "No Sprytile faces to convert")
+            return {'CANCELLED'}
+
+        # Grid id -> (grid, image size, tile analysis)
+        grids = {}
+        removed = []
+        created = 0
+        for face in [f for f in bm.faces if f.select and not f.hide]:
+            grid_id = face[grid_layer]
+            if grid_id not in grids:
+                tile_grid = sprytile_utils.get_grid(context, grid_id)
+                image = sprytile_utils.get_grid_texture(obj, tile_grid) if tile_grid is not None else None
+                analysis = sprytile_tiles.get_analysis(image, tile_grid)
+                grids[grid_id] = (tile_grid, tuple(image.size), analysis) if analysis is not None else None
+            if grids[grid_id] is None:
+                continue
+            tile_grid, image_size, analysis = grids[grid_id]
+            new_faces = cutout_face(bm, face, uv_layer, image_size, tile_grid, analysis, self.vertex_budget)
+            if new_faces is None or (len(new_faces) == 0 and not self.remove_empty):
+                continue
+            removed.append(face)
+            created += len(new_faces)
+
+        if len(removed) > 0:
+            bmesh.ops.delete(bm, geom=removed, context='FACES')
+            for el in [bm.faces, bm.verts, bm.edges]:
+                el.index_update()
+                el.ensure_lookup_table()
+            bmesh.update_edit_mesh(obj.data, True, True)
+            sprytile_bvh.invalidate(obj.data)
+        self.report({'INFO'}, "Replaced {0} quads with {1} cutout faces".format(len(removed), created))
+        return {'FINISHED'}
+
+
+def draw_cutout_menu(self, context):
+    self.layout.operator("sprytile.convert_cutouts")
+
+
+# module classes
+classes = (
+    UTIL_OP_SprytileConvertCutouts,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.append(draw_cutout_menu)
+
+
+def unregister():
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.remove(draw_cutout_menu)
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
+    cache.clear()
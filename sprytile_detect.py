@@ -0,0 +1,341 @@
+import bpy
+import numpy
+
+import sprytile_stats
+import sprytile_utils
+
+# Smallest tile size looked for, in pixels
+MIN_TILE_SIZE = 4
+# Autocorrelation a period needs to count as a tile grid, from 0 to 1
+MIN_CONFIDENCE = 0.25
+# Periods within this fraction of the best one count as equally good, the smallest is taken
+PERIOD_TOLERANCE = 0.8
+# Fraction of a line's repeats that must be a single color for it to count as a separator
+SEPARATOR_RATIO = 0.95
+# Lines across the other axis sampled for the profiles, keeps large images fast
+MAX_SAMPLES = 256
+
+
+class GridSuggestion:
+    """
+    A tile grid found in an image, with the same layout fields as a
+    Sprytile grid. Spacing between tiles is put in the right and bottom
+    margins, the sides the tile origins don't use.
+    """
+    def __init__(self, grid, padding, margin, offset, confidence):
+        self.grid = tuple(grid)
+        self.padding = tuple(padding)
+        self.margin = tuple(margin)
+        self.offset = tuple(offset)
+        self.confidence = confidence
+
+    def apply(self, tile_grid):
+        # Setting the padding takes it out of the grid size, so the grid
+        # is made large enough first and then set to the tile size
+        tile_grid.grid = (tile_grid.grid[0] + self.padding[0] * 2, tile_grid.grid[1] + self.padding[1] * 2)
+        tile_grid.padding = self.padding
+        tile_grid.grid = self.grid
+        tile_grid.margin = self.margin
+        tile_grid.offset = self.offset
+
+    def __str__(self):
+        return "{0}x{1} tiles, padding {2}x{3}, spacing {4}x{5}, offset {6}x{7}".format(
+            self.grid[0], self.grid[1], self.padding[0], self.padding[1],
+            self.margin[1], self.margin[2], self.offset[0], self.offset[1])
+
+
+def get_profiles(pixels, axis):
+    """
+    How the lines of pixels along an axis relate to their neighbours
+    :param pixels: (height, width, 4) float pixel array
+    :param axis: 1 for the image columns, 0 for the rows
+    :return: mean color difference between each line and the next, and which lines are a single color
+    """
+    # Lines are compared along an evenly spaced sample of the other axis
+    step = max(1, pixels.shape[1 - axis] // MAX_SAMPLES)
+    lines = pixels[::step] if axis == 1 else pixels[:, ::step].transpose(1, 0, 2)
+    difference = numpy.abs(lines[:, 1:] - lines[:, :-1]).sum(axis=2).mean(axis=0)
+    uniform = (lines == lines[:1]).all(axis=(0, 2))
+    return difference, uniform
+
+
+def autocorrelate(signal):
+    """
+    Normalized autocorrelation of a signal at every lag, computed with an FFT
+    :return: array of correlations, 1 at lag 0, or None for a flat signal
+    """
+    x = signal - signal.mean()
+    n = len(x)
+    spectrum = numpy.fft.rfft(x, n * 2)
+    corr = numpy.fft.irfft(spectrum * numpy.conj(spectrum), n * 2)[:n]
+    if corr[0] <= 1e-12:
+        return None
+    # Scaled by the overlap, so long periods aren't penalized for having fewer repeats
+    return corr / (n - numpy.arange(n)) / (corr[0] / n)
+
+
+def find_period(profiles, min_size, max_size):
+    """
+    The period the lines of an image repeat with
+    :param profiles: signals along the axis, the correlation of each is averaged
+    :return: period and its correlation, or None if nothing repeats
+    """
+    corrs = [corr for corr in (autocorrelate(signal) for signal in profiles) if corr is not None]
+    if len(corrs) == 0:
+        return None
+    corr = numpy.mean([c[:min(len(c) for c in corrs)] for c in corrs], axis=0)
+    max_size = min(max_size, len(corr) - 2)
+    if max_size < min_size:
+        return None
+
+    periods = numpy.arange(min_size, max_size + 1)
+    scores = corr[periods]
+    is_peak = (scores >= corr[periods - 1]) & (scores >= corr[periods + 1])
+    if not is_peak.any():
+        return None
+    best = scores[is_peak].max()
+    if best < MIN_CONFIDENCE:
+        return None
+    # Multiples of the tile size correlate as well, the smallest period is the tile
+    candidates = periods[is_peak & (scores >= best * PERIOD_TOLERANCE)]
+    return int(candidates[0]), float(best)
+
+
+def fold(signal, period, start=0):
+    """Mean of a signal at each phase of a period, position i has phase (i + start) % period"""
+    phases = (numpy.arange(len(signal)) + start) % period
+    counts = numpy.bincount(phases, minlength=period)
+    return numpy.bincount(phases, weights=signal, minlength=period) / numpy.maximum(counts, 1)
+
+
+def find_separator(is_separator):
+    """
+    The longest cyclic run of separator phases
+    :return: first phase and length of the run, or None
+    """
+    period = len(is_separator)
+    if not is_separator.any() or is_separator.all():
+        return None
+    # Start scanning after a phase that isn't a separator, so no run wraps
+    first = int(numpy.argmin(is_separator)) + 1
+    best = None
+    run_start = None
+    for i in range(period + 1):
+        phase = (first + i) % period
+        if i < period and is_separator[phase]:
+            if run_start is None:
+                run_start = i
+            continue
+        if run_start is not None:
+            length = i - run_start
+            if best is None or length > best[1]:
+                best = ((first + run_start) % period, length)
+            run_start = None
+    return best
+
+
+def find_extrusion(changes):
+    """
+    Edge pixels extruded around tiles repeat a line on either side of the
+    cell edge, so the lines never change for the same number of phases
+    before and after it
+    :return: cell edge phase and padding, or None
+    """
+    period = len(changes)
+    flat = changes <= 1e-9
+    if not flat.any() or flat.all():
+        return None
+    for edge in numpy.nonzero(~flat)[0]:
+        after = 0
+        while after < period and flat[(edge + after + 1) % period]:
+            after += 1
+        before = 0
+        while before < period and flat[(edge - before - 1) % period]:
+            before += 1
+        if after > 0 and after == before and after * 2 + 1 < period:
+            return int(edge), after
+    return None
+
+
+def detect_axis(pixels, axis, period=None):
+    """
+    Find the tile layout along one axis of an image
+    :param period: a period to use instead of searching for one
+    :return: (tile size, padding, spacing, offset, confidence), or None
+    """
+    changes, uniform = get_profiles(pixels, axis)
+    length = pixels.shape[axis]
+    confidence = 0.0
+    if period is None:
+        found = find_period((changes, uniform.astype(numpy.float64)), MIN_TILE_SIZE, length // 2)
+        if found is None:
+            return None
+        period, confidence = found[0], min(1.0, found[1])
+    if period > length:
+        return None
+    # A single row of tiles has no edges between tiles to find
+    if length < period * 2:
+        return period, 0, 0, 0, confidence
+
+    # Lines of one color at the same place in every tile are separators
+    separator = find_separator(fold(uniform.astype(numpy.float64), period) >= SEPARATOR_RATIO)
+    if separator is not None:
+        sep_start, spacing = separator
+        start = (sep_start + spacing) % period
+        # An image starting with half a separator has tiles with empty borders, not separators
+        if spacing % 2 == 1 or start != spacing // 2:
+            return period - spacing, 0, spacing, start, confidence
+        return period, 0, 0, 0, confidence
+
+    # changes[i] is between line i and i + 1, so it folds onto the phase of line i + 1
+    folded = fold(changes, period, 1)
+    extrusion = find_extrusion(folded)
+    if extrusion is not None:
+        start, padding = extrusion
+        return period - padding * 2, padding, 0, start, confidence
+    # Otherwise tiles start where the lines change the most
+    return period, 0, 0, int(numpy.argmax(folded)), confidence
+
+
+def detect_grid(pixels):
+    """
+    Infer a tile grid from the pixels of a tileset. The tile size comes from
+    the autocorrelation of how the columns and rows change, spacing from
+    single color separator lines and padding from extruded tile edges
+    :param pixels: (height, width, 4) float pixel array, rows from the bottom like Blender images
+    :return: GridSuggestion or None
+    """
+    stat_start = sprytile_stats.begin()
+    found_x = detect_axis(pixels, 1)
+    found_y = detect_axis(pixels, 0)
+    # Tiles are mostly square, a strip of tiles only repeats along one axis
+    if found_x is not None and found_y is None:
+        found_y = detect_axis(pixels, 0, found_x[0] + found_x[1] * 2 + found_x[2])
+    elif found_y is not None and found_x is None:
+        found_x = detect_axis(pixels, 1, found_y[0] + found_y[1] * 2 + found_y[2])
+    sprytile_stats.end("grid_detect", stat_start)
+    if found_x is None or found_y is None:
+        return None
+
+    size_x, pad_x, spacing_x, offset_x, confidence_x = found_x
+    size_y, pad_y, spacing_y, offset_y, confidence_y = found_y
+    return GridSuggestion((size_x, size_y), (pad_x, pad_y), (0, spacing_x, spacing_y, 0),
+                          (offset_x, offset_y), max(confidence_x, confidence_y))
+
+
+def detect_image_grid(image):
+    """Grid suggestion for an image, see detect_grid"""
+    if image is None or image.size[0] == 0 or image.size[1] == 0:
+        return None
+    width, height = image.size
+    pixels = numpy.empty(width * height * 4, dtype=numpy.float32)
+    image.pixels.foreach_get(pixels)
+    return detect_grid(pixels.reshape(height, width, 4))
+
+
+class UTIL_OP_SprytileDetectGrid(bpy.types.Operator):
+    bl_idname = "sprytile.detect_grid"
+    bl_label = "Detect Tile Grid"
+    bl_description = "Find the tile size, padding and spacing of the tileset from its pixels, " \
+                     "and suggest them for the current tile grid"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    grid: bpy.props.IntVectorProperty(
+        name="Size",
+        description="Grid size, in pixels",
+        min=1,
+        size=2,
+        default=(32, 32)
+    )
+    padding: bpy.props.IntVectorProperty(
+        name="Padding",
+        description="Cell padding, in pixels",
+        min=0,
+        size=2,
+        default=(0, 0)
+    )
+    margin: bpy.props.IntVectorProperty(
+        name="Margin",
+        description="Spacing between tiles (top, right, bottom, left)",
+        min=0,
+        size=4,
+        default=(0, 0, 0, 0)
+    )
+    offset: bpy.props.IntVectorProperty(
+        name="Offset",
+        description="Offset of the grid",
+        size=2,
+        default=(0, 0)
+    )
+    confidence: bpy.props.FloatProperty(
+        options={'HIDDEN'},
+        default=0.0
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.object is not None and context.object.type == 'MESH'
+
+    def detect(self, context):
+        """Fill in the properties from the tileset, returns False if no grid was found"""
+        obj = context.object
+        tile_grid = sprytile_utils.get_grid(context, obj.sprytile_gridid)
+        if tile_grid is None:
+            return False
+        suggestion = detect_image_grid(sprytile_utils.get_grid_texture(obj, tile_grid))
+        if suggestion is None:
+            return False
+        self.grid = suggestion.grid
+        self.padding = suggestion.padding
+        self.margin = suggestion.margin
+        self.offset = suggestion.offset
+        self.confidence = suggestion.confidence
+        return True
+
+    def invoke(self, context, event):
+        if not self.detect(context):
+            self.report({'INFO'}, "No tile grid found in the tileset")
+            return {'CANCELLED'}
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.label(text="Suggested grid, {0:.0f}% confidence".format(self.confidence * 100))
+        layout.prop(self, "grid")
+        layout.prop(self, "padding")
+        layout.prop(self, "margin")
+        layout.prop(self, "offset")
+
+    def execute(self, context):
+        if not self.properties.is_property_set("grid") and not self.detect(context):
+            self.report({'INFO'}, "No tile grid found in the tileset")
+            return {'CANCELLED'}
+        tile_grid = sprytile_utils.get_grid(context, context.object.sprytile_gridid)
+        if tile_grid is None:
+            return {'CANCELLED'}
+        suggestion = GridSuggestion(self.grid, self.padding, self.margin, self.offset, self.confidence)
+        suggestion.apply(tile_grid)
+        self.report({'INFO'}, "Set tile grid to {0}".format(suggestion))
+        return {'FINISHED'}
+
+
+def draw_detect_menu(self, context):
+    self.layout.operator("sprytile.detect_grid")
+
+
+# module classes
+classes = (
+    UTIL_OP_SprytileDetectGrid,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.append(draw_detect_menu)
+
+
+def unregister():
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.remove(draw_detect_menu)
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
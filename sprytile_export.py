@@ -0,0 +1,486 @@
+import json
+import math
+import os
+import struct
+import zlib
+
+import bpy
+import numpy
+from bpy_extras.io_utils import ExportHelper
+
+import sprytile_stats
+import sprytile_utils
+from sprytile_uv import UvDataLayers
+
+# Cells along each side of a chunk in the binary format
+CHUNK_SIZE = 64
+# Layers up to this many cells in total are written as JSON in automatic mode
+JSON_MAX_CELLS = 256 * 256
+# Faces with a normal this close to an axis count as on a layer plane
+AXIS_THRESHOLD = 0.999
+
+FILE_MAGIC = b'SPRYMAP\0'
+FILE_VERSION = 1
+# Cell values keep the tile ID + 1 in the low bits and the paint rotation and flips in the high bits
+TILE_BITS = 28
+TILE_MASK = (1 << TILE_BITS) - 1
+
+# Layer plane axes: +X, -X, +Y, -Y, +Z, -Z
+AXES = numpy.array([(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)], dtype=numpy.float64)
+AXIS_NAMES = ('+X', '-X', '+Y', '-Y', '+Z', '-Z')
+
+
+def get_axis_basis(axis):
+    """Right and up vectors of a layer plane, up is Z unless the plane faces along Z, like the work plane"""
+    normal = AXES[axis]
+    up = numpy.array((0.0, 1.0, 0.0)) if abs(normal[2]) > 0.5 else numpy.array((0.0, 0.0, 1.0))
+    return numpy.cross(up, normal), up
+
+
+AXIS_RIGHT = numpy.array([get_axis_basis(axis)[0] for axis in range(len(AXES))])
+AXIS_UP = numpy.array([get_axis_basis(axis)[1] for axis in range(len(AXES))])
+# The basis vectors are all along an axis, so projecting on them picks a coordinate
+AXIS_RIGHT_INDEX, AXIS_UP_INDEX = numpy.abs(AXIS_RIGHT).argmax(axis=1), numpy.abs(AXIS_UP).argmax(axis=1)
+AXIS_RIGHT_SIGN, AXIS_UP_SIGN = AXIS_RIGHT.sum(axis=1), AXIS_UP.sum(axis=1)
+
+
+class FaceRects:
+    """
+    Sprytile faces of one or more objects, as pixel rects on their layer
+    planes. Positions are converted to world pixels and rounded, so float
+    noise doesn't move a face into the next cell.
+    """
+    FIELDS = ('axis', 'plane', 'work_layer', 'grid_id', 'tile_id', 'paint', 'min_px', 'max_px')
+
+    def __init__(self, **arrays):
+        for field in self.FIELDS:
+            setattr(self, field, arrays[field])
+
+    def __len__(self):
+        return len(self.tile_id)
+
+    @classmethod
+    def concatenate(cls, rects):
+        return cls(**{field: numpy.concatenate([getattr(r, field) for r in rects]) for field in cls.FIELDS})
+
+    @classmethod
+    def from_arrays(cls, coords, loop_verts, loop_starts, loop_totals, normals, layers, world_pixels):
+        """
+        :param coords: (verts, 3) world positions
+        :param normals: (faces, 3) world face normals
+        :param layers: dict of UvDataLayers name -> face values
+        :return: FaceRects of the faces facing along an axis, and the count of other faces
+        """
+        axis = numpy.argmax(numpy.abs(normals), axis=1) * 2
+        axis += numpy.take_along_axis(normals, (axis // 2)[:, None], axis=1)[:, 0] < 0
+        on_axis = numpy.abs(normals).max(axis=1) >= AXIS_THRESHOLD
+
+        loop_axis = numpy.repeat(axis.astype(numpy.int8), loop_totals)
+        loop_x = coords[loop_verts, AXIS_RIGHT_INDEX[loop_axis]] * (AXIS_RIGHT_SIGN[loop_axis] * world_pixels)
+        loop_x = numpy.rint(loop_x).astype(numpy.int64)
+        loop_y = coords[loop_verts, AXIS_UP_INDEX[loop_axis]] * (AXIS_UP_SIGN[loop_axis] * world_pixels)
+        loop_y = numpy.rint(loop_y).astype(numpy.int64)
+        min_px = numpy.stack((numpy.minimum.reduceat(loop_x, loop_starts),
+                              numpy.minimum.reduceat(loop_y, loop_starts)), axis=1)
+        max_px = numpy.stack((numpy.maximum.reduceat(loop_x, loop_starts),
+                              numpy.maximum.reduceat(loop_y, loop_starts)), axis=1)
+        first = coords[loop_verts[loop_starts]]
+        plane = numpy.rint((first * AXES[axis]).sum(axis=1) * world_pixels).astype(numpy.int64)
+
+        rects = cls(axis=axis[on_axis], plane=plane[on_axis],
+                    work_layer=layers[UvDataLayers.WORK_LAYER][on_axis],
+                    grid_id=layers[UvDataLayers.GRID_INDEX][on_axis],
+                    tile_id=layers[UvDataLayers.GRID_TILE_ID][on_axis],
+                    paint=layers[UvDataLayers.PAINT_SETTINGS][on_axis],
+                    min_px=min_px[on_axis], max_px=max_px[on_axis])
+        return rects, int((~on_axis).sum())
+
+    @classmethod
+    def from_object(cls, obj, world_pixels):
+        """Read the faces of a mesh object in bulk, None if it has no Sprytile data"""
+        mesh = obj.data
+        face_count = len(mesh.polygons)
+        if face_count == 0 or mesh.polygon_layers_int.get(UvDataLayers.GRID_INDEX) is None:
+            return None, 0
+
+        coords = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float64)
+        mesh.vertices.foreach_get('co', coords)
+        loop_verts = numpy.empty(len(mesh.loops), dtype=numpy.int64)
+        mesh.loops.foreach_get('vertex_index', loop_verts)
+        loop_starts = numpy.empty(face_count, dtype=numpy.int64)
+        loop_totals = numpy.empty(face_count, dtype=numpy.int64)
+        mesh.polygons.foreach_get('loop_start', loop_starts)
+        mesh.polygons.foreach_get('loop_total', loop_totals)
+        normals = numpy.empty(face_count * 3, dtype=numpy.float64)
+        mesh.polygons.foreach_get('normal', normals)
+
+        layers = {}
+        for name in (UvDataLayers.GRID_INDEX, UvDataLayers.GRID_TILE_ID,
+                     UvDataLayers.PAINT_SETTINGS, UvDataLayers.WORK_LAYER):
+            values = numpy.zeros(face_count, dtype=numpy.int64)
+            layer = mesh.polygon_layers_int.get(name)
+            if layer is not None:
+                layer.data.foreach_get('value', values)
+            layers[name] = values
+
+        matrix = numpy.array(obj.matrix_world)
+        coords = coords.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+        normals = normals.reshape(-1, 3) @ numpy.linalg.inv(matrix[:3, :3])
+        normals /= numpy.maximum(numpy.linalg.norm(normals, axis=1), 1e-12)[:, None]
+        return cls.from_arrays(coords, loop_verts, loop_starts, loop_totals, normals, layers, world_pixels)
+
+
+class GridLayer:
+    """
+    The cells of one layer plane and tile grid. Cells are counted from the
+    layer's pixel origin in tiles, rows going up, and hold the tile ID + 1
+    in the low bits with the paint rotation and flips above them
+    """
+    def __init__(self, name, grid_id, tile_size, axis, plane, work_layer, origin, cell_x, cell_y, values):
+        self.name = name
+        self.grid_id = grid_id
+        self.tile_size = tile_size
+        self.axis = axis
+        self.plane = plane
+        self.work_layer = work_layer
+        self.origin = origin
+        self.cell_x = cell_x
+        self.cell_y = cell_y
+        self.values = values
+
+    @property
+    def bounds(self):
+        """min x, min y, width, height of the cells"""
+        if len(self.values) == 0:
+            return 0, 0, 0, 0
+        min_x, min_y = int(self.cell_x.min()), int(self.cell_y.min())
+        return min_x, min_y, int(self.cell_x.max()) - min_x + 1, int(self.cell_y.max()) - min_y + 1
+
+    @property
+    def area(self):
+        bounds = self.bounds
+        return bounds[2] * bounds[3]
+
+
+def get_phase(values, size):
+    """Most common pixel offset of the faces from the tile grid"""
+    return int(numpy.argmax(numpy.bincount(values % size, minlength=size)))
+
+
+def get_tile_offsets(offset_x, offset_y, cell_span, paint):
+    """
+    Offsets in the tile selection of the tiles shown in the cells of faces
+    covering several cells. The paint rotation turns the selection on the
+    face counterclockwise and the flips mirror it after, like the face UVs
+    :param offset_x: cell offsets from the bottom left cell of each face
+    :param cell_span: (cells, 2) width and height of each face in cells
+    :param paint: paint settings of each face
+    :return: tile offsets along x and y
+    """
+    width, height = cell_span[:, 0], cell_span[:, 1]
+    rotation = (paint >> 10) & 3
+    # Rotation values are 0-3 clockwise, 1 is 270 degrees counterclockwise
+    tile_offset_x = numpy.select((rotation == 3, rotation == 2, rotation == 1),
+                                 (offset_y, width - 1 - offset_x, height - 1 - offset_y), offset_x)
+    tile_offset_y = numpy.select((rotation == 3, rotation == 2, rotation == 1),
+                                 (width - 1 - offset_x, height - 1 - offset_y, offset_x), offset_y)
+    # Quarter turns lay the selection across the face
+    turned = (rotation & 1) == 1
+    selection_width = numpy.where(turned, height, width)
+    selection_height = numpy.where(turned, width, height)
+    tile_offset_x = numpy.where((paint & (1 << 9)) > 0, selection_width - 1 - tile_offset_x, tile_offset_x)
+    tile_offset_y = numpy.where((paint & (1 << 8)) > 0, selection_height - 1 - tile_offset_y, tile_offset_y)
+    return tile_offset_x, tile_offset_y
+
+
+def build_layer(rects, grid_id, tile_size, tile_count, key):
+    """
+    Turn the face rects of one layer into cells. Faces covering several
+    cells, like tile selections or merged quads, fill each cell with the
+    tile shown there, taken from the tileset around the face's tile and
+    wrapping around it
+    :param tile_count: tiles of the grid's image along x and y
+    """
+    axis, plane, work_layer = key
+    origin = (get_phase(rects.min_px[:, 0], tile_size[0]), get_phase(rects.min_px[:, 1], tile_size[1]))
+    size = numpy.array(tile_size, dtype=numpy.int64)
+    cell_min = (rects.min_px - origin) // size
+    # Trimmed or cut out faces are smaller than a cell, they still fill one
+    cell_span = numpy.maximum(1, numpy.rint((rects.max_px - rects.min_px) / size).astype(numpy.int64))
+
+    counts = cell_span[:, 0] * cell_span[:, 1]
+    face = numpy.repeat(numpy.arange(len(rects)), counts)
+    within = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    offset_x = within % cell_span[face, 0]
+    offset_y = within // cell_span[face, 0]
+
+    tile_offset_x, tile_offset_y = get_tile_offsets(offset_x, offset_y, cell_span[face], rects.paint[face])
+    tile_x = (rects.tile_id[face] % tile_count[0] + tile_offset_x) % tile_count[0]
+    tile_y = (rects.tile_id[face] // tile_count[0] + tile_offset_y) % tile_count[1]
+    transform = (rects.paint[face] >> 8) & 0xF
+    values = ((tile_y * tile_count[0] + tile_x + 1) & TILE_MASK) | (transform << TILE_BITS)
+    name = "{0}{1}_grid{2}_layer{3}".format(AXIS_NAMES[axis], plane, grid_id, work_layer)
+    return GridLayer(name, grid_id, tuple(tile_size), axis, plane, work_layer, origin,
+                     cell_min[face, 0] + offset_x, cell_min[face, 1] + offset_y, values.astype(numpy.uint32))
+
+
+LAYER_KEY_FIELDS = ('axis', 'plane', 'work_layer', 'grid_id')
+
+
+def get_layer_codes(rects, grids):
+    """
+    Number the layer keys, (axis, plane, work layer, grid ID), of the faces
+    with a known grid. Each key field is numbered on its own and the numbers
+    combined, sorting plain integers is much faster than sorting key rows
+    :return: layer code and index of each of those faces
+    """
+    known = numpy.isin(rects.grid_id, list(grids.keys()))
+    codes = numpy.zeros(int(known.sum()), dtype=numpy.int64)
+    for field in LAYER_KEY_FIELDS:
+        values, inverse = numpy.unique(getattr(rects, field)[known], return_inverse=True)
+        codes = codes * len(values) + inverse.ravel()
+    return codes, numpy.nonzero(known)[0]
+
+
+def get_layer_count(rects, grids):
+    return len(numpy.unique(get_layer_codes(rects, grids)[0]))
+
+
+def iter_layers(rects, grids):
+    """
+    Split face rects into a GridLayer per plane, work layer and tile grid,
+    one layer at a time so only one layer's cells are held at once
+    :param grids: dict of grid ID -> (tile size, tile count)
+    """
+    codes, face_index = get_layer_codes(rects, grids)
+    order = numpy.argsort(codes, kind='stable')
+    codes = codes[order]
+    ends = numpy.concatenate((numpy.nonzero(codes[1:] != codes[:-1])[0] + 1, [len(codes)]))
+    start = 0
+    for end in ends.tolist():
+        faces = face_index[order[start:end]]
+        start = end
+        layer_rects = FaceRects(**{field: getattr(rects, field)[faces] for field in FaceRects.FIELDS})
+        axis, plane, work_layer, grid_id = (int(getattr(layer_rects, field)[0]) for field in LAYER_KEY_FIELDS)
+        tile_size, tile_count = grids[grid_id]
+        yield build_layer(layer_rects, grid_id, tile_size, tile_count, (axis, plane, work_layer))
+
+
+def fits_json(rects, grids):
+    """If the layers together cover few enough cells to be written as JSON, stops at the first layer over"""
+    cell_count = 0
+    for layer in iter_layers(rects, grids):
+        cell_count += layer.area
+        if cell_count > JSON_MAX_CELLS:
+            return False
+    return True
+
+
+def iter_chunks(layer, chunk_size):
+    """
+    The non empty chunks of a layer, one at a time
+    :return: generator of chunk x, chunk y and (chunk_size, chunk_size) uint32 cells, rows going up
+    """
+    chunk_x = layer.cell_x // chunk_size
+    chunk_y = layer.cell_y // chunk_size
+    order = numpy.lexsort((chunk_x, chunk_y))
+    chunk_x, chunk_y = chunk_x[order], chunk_y[order]
+    changes = numpy.nonzero((chunk_x[1:] != chunk_x[:-1]) | (chunk_y[1:] != chunk_y[:-1]))[0] + 1
+    starts = numpy.concatenate(([0], changes))
+    ends = numpy.concatenate((changes, [len(order)]))
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        cells = order[start:end]
+        cx, cy = int(chunk_x[start]), int(chunk_y[start])
+        chunk = numpy.zeros((chunk_size, chunk_size), dtype=numpy.uint32)
+        chunk[layer.cell_y[cells] - cy * chunk_size, layer.cell_x[cells] - cx * chunk_size] = layer.values[cells]
+        yield cx, cy, chunk
+
+
+class BinaryGridWriter:
+    """
+    Streams layers into the chunked binary format, little endian:
+    file header: magic "SPRYMAP\\0", uint32 version, uint32 chunk size, uint32 layer count
+    layer header: int32 grid ID, tile width, tile height, axis (+X -X +Y -Y +Z -Z), plane in pixels,
+        work layer, origin x and y in pixels, min cell x and y, width and height in cells,
+        uint32 chunk count, uint32 name length and the UTF-8 name
+    chunk: int32 chunk x and y, uint32 data length, then chunk size * chunk size
+        uint32 cells, zlib compressed, row by row from the bottom
+    """
+    LAYER_HEADER = struct.Struct('<12iI')
+    CHUNK_HEADER = struct.Struct('<2iI')
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+
+    def write_header(self, layer_count):
+        self.file.write(FILE_MAGIC)
+        self.file.write(struct.pack('<3I', FILE_VERSION, self.chunk_size, layer_count))
+
+    def write_layer(self, layer):
+        # The chunk count goes before the chunks, it's filled in once they are written
+        name = layer.name.encode('utf-8')
+        header_pos = self.file.tell()
+        self.file.write(self.LAYER_HEADER.pack(layer.grid_id, layer.tile_size[0], layer.tile_size[1],
+                                               layer.axis, layer.plane, layer.work_layer,
+                                               layer.origin[0], layer.origin[1], *layer.bounds, 0))
+        self.file.write(struct.pack('<I', len(name)))
+        self.file.write(name)
+        chunk_count = 0
+        for chunk_x, chunk_y, chunk in iter_chunks(layer, self.chunk_size):
+            data = zlib.compress(chunk.astype('<u4').tobytes())
+            self.file.write(self.CHUNK_HEADER.pack(chunk_x, chunk_y, len(data)))
+            self.file.write(data)
+            chunk_count += 1
+        end_pos = self.file.tell()
+        self.file.seek(header_pos + self.LAYER_HEADER.size - 4)
+        self.file.write(struct.pack('<I', chunk_count))
+        self.file.seek(end_pos)
+        return chunk_count
+
+    def close(self):
+        pass
+
+
+class JsonGridWriter:
+    """
+    Streams layers into a JSON file, a layer at a time. Each layer holds its
+    cells as one row major list covering its bounds, rows from the bottom
+    """
+    def __init__(self, file):
+        self.file = file
+        self.layer_count = 0
+
+    def write_header(self, layer_count):
+        self.file.write('{{"version": {0}, "layers": ['.format(FILE_VERSION))
+
+    def write_layer(self, layer):
+        min_x, min_y, width, height = layer.bounds
+        cells = numpy.zeros((height, width), dtype=numpy.uint32)
+        cells[layer.cell_y - min_y, layer.cell_x - min_x] = layer.values
+        if self.layer_count > 0:
+            self.file.write(', ')
+        json.dump({
+            "name": layer.name,
+            "grid": layer.grid_id,
+            "tile_size": list(layer.tile_size),
+            "axis": AXIS_NAMES[layer.axis],
+            "plane": layer.plane,
+            "work_layer": layer.work_layer,
+            "origin": list(layer.origin),
+            "x": min_x,
+            "y": min_y,
+            "width": width,
+            "height": height,
+            "data": cells.ravel().tolist(),
+        }, self.file)
+        self.layer_count += 1
+        return 1
+
+    def close(self):
+        self.file.write(']}')
+
+
+def get_grid_info(context, obj, grid_ids):
+    """Tile size and tile count along x and y of each tile grid with an image"""
+    grids = {}
+    for grid_id in grid_ids:
+        tile_grid = sprytile_utils.get_grid(context, grid_id)
+        image = sprytile_utils.get_grid_texture(obj, tile_grid) if tile_grid is not None else None
+        if image is None or image.size[0] == 0:
+            continue
+        grids[grid_id] = ((tile_grid.grid[0], tile_grid.grid[1]),
+                          (int(math.ceil(image.size[0] / tile_grid.grid[0])),
+                           int(math.ceil(image.size[1] / tile_grid.grid[1]))))
+    return grids
+
+
+class UTIL_OP_SprytileExportTileGrid(bpy.types.Operator, ExportHelper):
+    bl_idname = "sprytile.export_tile_grid"
+    bl_label = "Export Tile Grid"
+    bl_description = "Write the tiles of the selected Sprytile objects as a tile grid per layer plane, " \
+                     "instead of as meshes"
+
+    filename_ext = ".sprymap"
+    filter_glob: bpy.props.StringProperty(
+        default="*.sprymap;*.json",
+        options={'HIDDEN'},
+    )
+    file_format: bpy.props.EnumProperty(
+        name="Format",
+        description="File format of the tile grid",
+        items=[
+            ('AUTO', "Automatic", "JSON for small maps, chunked binary otherwise", 1),
+            ('BINARY', "Binary", "Chunked binary, with zlib compressed chunks", 2),
+            ('JSON', "JSON", "One JSON file with the cells of every layer", 3),
+        ],
+        default='AUTO'
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == 'OBJECT' and any(obj.type == 'MESH' for obj in context.selected_objects)
+
+    def execute(self, context):
+        stat_start = sprytile_stats.begin()
+        world_pixels = context.scene.sprytile_data.world_pixels
+        objects = [obj for obj in context.selected_objects if obj.type == 'MESH']
+
+        all_rects = []
+        skipped = 0
+        for obj in objects:
+            rects, off_axis = FaceRects.from_object(obj, world_pixels)
+            skipped += off_axis
+            if rects is not None and len(rects) > 0:
+                all_rects.append(rects)
+        if len(all_rects) == 0:
+            self.report({'ERROR'}, "The selected objects have no Sprytile faces")
+            return {'CANCELLED'}
+        rects = FaceRects.concatenate(all_rects)
+        grids = get_grid_info(context, objects[0], numpy.unique(rects.grid_id).tolist())
+
+        layer_count = get_layer_count(rects, grids)
+        if layer_count == 0:
+            self.report({'ERROR'}, "The tile grids of the selected objects have no tileset images")
+            return {'CANCELLED'}
+        use_json = self.file_format == 'JSON'
+        if self.file_format == 'AUTO':
+            use_json = fits_json(rects, grids)
+        filepath = os.path.splitext(self.filepath)[0] + (".json" if use_json else self.filename_ext)
+
+        with open(filepath, 'w' if use_json else 'wb') as file:
+            writer = JsonGridWriter(file) if use_json else BinaryGridWriter(file)
+            writer.write_header(layer_count)
+            cell_count = 0
+            for layer in iter_layers(rects, grids):
+                writer.write_layer(layer)
+                cell_count += len(layer.values)
+            writer.close()
+
+        sprytile_stats.end("export_tile_grid", stat_start)
+        self.report({'INFO'}, "Wrote {0} cells on {1} layers to {2}{3}".format(
+            cell_count, layer_count, os.path.basename(filepath),
+            ", skipped {0} faces not facing an axis".format(skipped) if skipped > 0 else ""))
+        return {'FINISHED'}
+
+
+def draw_export_menu(self, context):
+    self.layout.operator(UTIL_OP_SprytileExportTileGrid.bl_idname, text="Sprytile Tile Grid (.sprymap)")
+
+
+# module classes
+classes = (
+    UTIL_OP_SprytileExportTileGrid,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+    bpy.types.TOPBAR_MT_file_export.append(draw_export_menu)
+
+
+def unregister():
+    bpy.types.TOPBAR_MT_file_export.remove(draw_export_menu)
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
@@ -0,0 +1,312 @@
+import math
+
+import bmesh
+import bpy
+from mathutils import Vector
+
+import sprytile_bvh
+import sprytile_utils
+from sprytile_uv import UvDataLayers
+
+# Positions are compared after rounding to this many decimals
+PRECISION = 5
+
+
+def get_plane_basis(normal):
+    """Two in-plane axes for a face normal, with x cross y along the normal"""
+    ref = Vector((0.0, 0.0, 1.0)) if abs(normal.z) < 0.9 else Vector((0.0, 1.0, 0.0))
+    x_axis = ref.cross(normal).normalized()
+    y_axis = normal.cross(x_axis)
+    return x_axis, y_axis
+
+
+def round_uv(uv, wrap):
+    if not wrap:
+        return round(uv[0], PRECISION), round(uv[1], PRECISION)
+    # With repeating textures, UVs a whole texture apart sample the same texels
+    return round(round(uv[0], PRECISION) % 1.0, PRECISION), round(round(uv[1], PRECISION) % 1.0, PRECISION)
+
+
+def get_grid_pads(context, obj):
+    """
+    Auto pad inset of the grids that have it on, by grid ID
+    :return: dict of grid ID -> ((pad u, pad v), (pixel u, pixel v)), in UV units
+    """
+    pads = {}
+    for mat_data in context.scene.sprytile_mats:
+        for tile_grid in mat_data.grids:
+            if not tile_grid.auto_pad or tile_grid.auto_pad_offset <= 0:
+                continue
+            image = sprytile_utils.get_grid_texture(obj, tile_grid)
+            if image is None or image.size[0] == 0 or image.size[1] == 0:
+                continue
+            width, height = image.size
+            pads[tile_grid.id] = ((tile_grid.auto_pad_offset / width, tile_grid.auto_pad_offset / height),
+                                  (1 / width, 1 / height))
+    return pads
+
+
+def unpad_uvs(uvs, pad):
+    """
+    Undo the auto pad inset of a quad's UVs. Auto pad shrinks every face's
+    UV rect by the pad, so neighbouring cells of a tile selection don't
+    continue each other until it's taken out.
+    :param uvs: corner UVs of the quad
+    :param pad: ((pad u, pad v), (pixel u, pixel v)) of the face's grid, or None
+    :return: the corner UVs grown by half the pad on every side, or None if they aren't inset
+    """
+    if pad is None:
+        return None
+    (pad_u, pad_v), (pixel_u, pixel_v) = pad
+    us = [uv[0] for uv in uvs]
+    vs = [uv[1] for uv in uvs]
+    # An inset rect is the pad short of a whole number of pixels
+    for extent, pad_size, pixel_size in ((max(us) - min(us), pad_u, pixel_u), (max(vs) - min(vs), pad_v, pixel_v)):
+        pixels = (extent + pad_size) / pixel_size
+        if abs(pixels - round(pixels)) > 1e-3:
+            return None
+    center_u = sum(us) / len(us)
+    center_v = sum(vs) / len(vs)
+    return [Vector((uv[0] + math.copysign(pad_u / 2, uv[0] - center_u),
+                    uv[1] + math.copysign(pad_v / 2, uv[1] - center_v))) for uv in uvs]
+
+
+def pad_uvs(uvs, pad):
+    """Inset corner UVs by the auto pad again, the reverse of unpad_uvs"""
+    pad_u, pad_v = pad[0]
+    center_u = sum(uv[0] for uv in uvs) / len(uvs)
+    center_v = sum(uv[1] for uv in uvs) / len(uvs)
+    return [Vector((uv[0] - math.copysign(pad_u / 2, uv[0] - center_u),
+                    uv[1] - math.copysign(pad_v / 2, uv[1] - center_v))) for uv in uvs]
+
+
+def get_cell(face, uv_layer, key_layers, wrap, pad=None):
+    """
+    Describe a quad as a cell of a regular grid on its plane, with the UVs
+    as an affine map over the grid. Quads with the same key and UV map can
+    be merged into one face without changing how they look.
+    :param pad: auto pad of the face's grid, see get_grid_pads, UVs inset by it are compared without it
+    :return: group key, cell coordinate, corner loops, the unpadded UV origin and axes of the quad
+        and the pad taken out of them, or None if the face can't be merged
+    """
+    if len(face.verts) != 4 or face.hide:
+        return None
+    normal = Vector(round(c, 3) for c in face.normal)
+    if normal.length < 0.5:
+        return None
+    normal.normalize()
+    x_axis, y_axis = get_plane_basis(normal)
+
+    corners = {}
+    for loop in face.loops:
+        co = loop.vert.co
+        corners[(round(co.dot(x_axis), PRECISION), round(co.dot(y_axis), PRECISION))] = loop
+    xs = sorted(set(c[0] for c in corners))
+    ys = sorted(set(c[1] for c in corners))
+    # Only rectangles aligned to the plane axes
+    if len(corners) != 4 or len(xs) != 2 or len(ys) != 2:
+        return None
+    x0, x1 = xs
+    y0, y1 = ys
+    width = round(x1 - x0, PRECISION)
+    height = round(y1 - y0, PRECISION)
+
+    loop_00 = corners[(x0, y0)]
+    loop_10 = corners[(x1, y0)]
+    loop_11 = corners[(x1, y1)]
+    loop_01 = corners[(x0, y1)]
+    uvs = [loop[uv_layer].uv.copy() for loop in (loop_00, loop_10, loop_11, loop_01)]
+    unpadded = unpad_uvs(uvs, pad)
+    is_padded = unpadded is not None
+    if is_padded:
+        uvs = unpadded
+    uv_00 = uvs[0]
+    uv_dx = uvs[1] - uv_00
+    uv_dy = uvs[3] - uv_00
+    # Stretched or skewed UVs don't continue across neighbouring cells
+    if (uv_00 + uv_dx + uv_dy - uvs[2]).length > 10 ** -PRECISION * 10:
+        return None
+
+    phase_x = round(x0 % width, PRECISION - 1)
+    phase_y = round(y0 % height, PRECISION - 1)
+    cell_x = round((x0 - phase_x) / width)
+    cell_y = round((y0 - phase_y) / height)
+    uv_origin = uv_00 - uv_dx * cell_x - uv_dy * cell_y
+
+    plane_offset = round(loop_00.vert.co.dot(normal), PRECISION - 1)
+    key = (tuple(normal), plane_offset, width, height, phase_x, phase_y,
+           face.material_index, face.smooth, is_padded,
+           tuple(face[layer] for layer in key_layers),
+           round_uv(uv_dx, False), round_uv(uv_dy, False), round_uv(uv_origin, wrap))
+    return key, (cell_x, cell_y), (loop_00, loop_10, loop_11, loop_01), (uv_00, uv_dx, uv_dy), \
+        pad if is_padded else None
+
+
+def find_rectangles(cells):
+    """
+    Greedily cover a set of grid cells with rectangles
+    :param cells: set of (x, y) cell coordinates
+    :return: list of (x, y, width, height)
+    """
+    remaining = set(cells)
+    rects = []
+    for x, y in sorted(cells, key=lambda c: (c[1], c[0])):
+        if (x, y) not in remaining:
+            continue
+        width = 1
+        while (x + width, y) in remaining:
+            width += 1
+        height = 1
+        while all((x + i, y + height) in remaining for i in range(width)):
+            height += 1
+        for j in range(height):
+            for i in range(width):
+                remaining.discard((x + i, y + j))
+        rects.append((x, y, width, height))
+    return rects
+
+
+def greedy_merge(bm, selected_only=False, wrap=True, pads=None):
+    """
+    Merge coplanar quads that continue each other's tile and UVs into larger quads.
+    The merged quads only keep their corner verts, so where a neighbour isn't
+    merged the same way its verts are left as T-junctions on the merged edge.
+    :param bm: BMesh to merge in
+    :param selected_only: Only merge selected faces
+    :param wrap: Allow merging repeats of a tile that covers the whole texture, relying on texture repeat
+    :param pads: Auto pad of each grid from get_grid_pads, padded quads are merged and inset again
+    :return: Face count before and after merging
+    """
+    uv_layer = bm.loops.layers.uv.verify()
+    # Merged faces keep the tile ID of their first cell, the rest of the tile data must match
+    key_layers = [bm.faces.layers.int.get(name) for name in UvDataLayers.LAYER_NAMES
+                  if name != UvDataLayers.GRID_TILE_ID]
+    key_layers = [layer for layer in key_layers if layer is not None]
+    grid_layer = bm.faces.layers.int.get(UvDataLayers.GRID_INDEX)
+    if pads is None or grid_layer is None:
+        pads = {}
+
+    face_count = len(bm.faces)
+    groups = {}
+    for face in bm.faces:
+        if selected_only and not face.select:
+            continue
+        pad = pads.get(face[grid_layer]) if grid_layer is not None else None
+        cell = get_cell(face, uv_layer, key_layers, wrap, pad)
+        if cell is None:
+            continue
+        key, coord, loops, uv_frame, face_pad = cell
+        groups.setdefault(key, {})[coord] = (face, loops, uv_frame, face_pad)
+
+    merged_faces = []
+    for key, cells in groups.items():
+        if len(cells) < 2:
+            continue
+        for x, y, width, height in find_rectangles(cells.keys()):
+            if width == 1 and height == 1:
+                continue
+            first_face, first_loops, uv_frame, pad = cells[(x, y)]
+            # Corners come from the corner cells, keeping any welds with neighbours
+            corner_loops = (
+                first_loops[0],
+                cells[(x + width - 1, y)][1][1],
+                cells[(x + width - 1, y + height - 1)][1][2],
+                cells[(x, y + height - 1)][1][3],
+            )
+            corner_verts = [loop.vert for loop in corner_loops]
+            uv_00, uv_dx, uv_dy = uv_frame
+            uvs = [uv_00, uv_00 + uv_dx * width, uv_00 + uv_dx * width + uv_dy * height, uv_00 + uv_dy * height]
+            # The key keeps padded and unpadded quads apart, padded ones get their inset back
+            if pad is not None:
+                uvs = pad_uvs(uvs, pad)
+
+            # The first face is the example, so the new face copies its tile data and material
+            new_face = bm.faces.new(corner_verts, first_face)
+            new_face.normal_update()
+            if new_face.normal.dot(first_face.normal) < 0:
+                new_face.normal_flip()
+            for loop in new_face.loops:
+                loop[uv_layer].uv = uvs[corner_verts.index(loop.vert)]
+
+            for j in range(height):
+                for i in range(width):
+                    merged_faces.append(cells[(x + i, y + j)][0])
+
+    if len(merged_faces) > 0:
+        # Also removes the inner edges and verts, the corners are kept by the new faces
+        bmesh.ops.delete(bm, geom=merged_faces, context='FACES')
+        for el in [bm.faces, bm.verts, bm.edges]:
+            el.index_update()
+            el.ensure_lookup_table()
+    return face_count, len(bm.faces)
+
+
+class UTIL_OP_SprytileGreedyMerge(bpy.types.Operator):
+    bl_idname = "sprytile.greedy_merge"
+    bl_label = "Merge Tile Quads"
+    bl_description = "Merge neighbouring coplanar quads of the same tile, or of a contiguous tile selection, " \
+                     "into larger quads for fewer polygons at runtime"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    selected_only: bpy.props.BoolProperty(
+        name="Selected Only",
+        description="Only merge selected faces, in edit mode",
+        default=False
+    )
+    use_wrap: bpy.props.BoolProperty(
+        name="UV Wrapping",
+        description="Merge repeats of tiles that cover their whole texture, with UVs that rely on the texture repeating",
+        default=True
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.object is not None and context.object.type == 'MESH'
+
+    def execute(self, context):
+        obj = context.object
+        pads = get_grid_pads(context, obj)
+        if obj.mode == 'EDIT':
+            bm = bmesh.from_edit_mesh(obj.data)
+            before, after = greedy_merge(bm, self.selected_only, self.use_wrap, pads)
+            bmesh.update_edit_mesh(obj.data, True, True)
+        else:
+            bm = bmesh.new()
+            bm.from_mesh(obj.data)
+            before, after = greedy_merge(bm, False, self.use_wrap, pads)
+            bm.to_mesh(obj.data)
+            obj.data.update()
+            bm.free()
+        sprytile_bvh.invalidate(obj.data)
+
+        if before == after:
+            self.report({'INFO'}, "No quads to merge, neighbouring quads need the same tile data "
+                                  "and UVs that continue each other")
+            return {'FINISHED'}
+        reduction = 100 * (before - after) / before if before > 0 else 0
+        self.report({'INFO'}, "Merged {0} faces into {1}, {2:.1f}% fewer".format(before, after, reduction))
+        return {'FINISHED'}
+
+
+def draw_greedy_menu(self, context):
+    layout = self.layout
+    layout.separator()
+    layout.operator("sprytile.greedy_merge")
+
+
+# module classes
+classes = (
+    UTIL_OP_SprytileGreedyMerge,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.append(draw_greedy_menu)
+
+
+def unregister():
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.remove(draw_greedy_menu)
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
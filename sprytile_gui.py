@@ -4,6 +4,7 @@ import gpu
 import blf
 import bmesh
 from bpy_extras import view3d_utils
+import time
 from math import floor, ceil, copysign
 from bgl import *
 from bpy.props import *
@@ -12,7 +13,10 @@ from . import sprytile_utils, sprytile_modal
 from gpu_extras.batch import batch_for_shader
 from sprytile_tools.tool_build import ToolBuild
 from sprytile_tools.tool_paint import ToolPaint
+from sprytile_tools.tool_events import EventThrottle
 import sprytile_preview
+import sprytile_stats
+import sprytile_tiles
 
 
 # Shaders
@@ -136,6 +140,13 @@ class VIEW3D_OP_SprytileGui(bpy.types.Operator):
 
         self.label_counter = 0
         self.get_zoom_level(context)
+
+        # Caps how often mouse moves rebuild the preview, the window timer
+        # events still rebuild it so it settles where the mouse stopped
+        addon_prefs = context.preferences.addons[__package__].preferences
+        rate_limit = addon_prefs.preview_rate_limit
+        self.preview_throttle = EventThrottle(1 / rate_limit if rate_limit > 0 else 0.0)
+        sprytile_stats.configure(addon_prefs.use_timing_stats)
         self.prev_in_region = False
         self.handle_ui(context, event)
 
@@ -210,6 +221,9 @@ class VIEW3D_OP_SprytileGui(bpy.types.Operator):
         coord = event.mouse_region_x, event.mouse_region_y
         no_data = rv3d is None
 
+        if no_data is False and event.type == 'MOUSEMOVE':
+            no_data = not self.preview_throttle.is_ready(time.perf_counter())
+
         if no_data is False:
             # get the ray from the viewport and mouse
             ray_vector = view3d_utils.region_2d_to_vector_3d(region, rv3d, coord)
@@ -217,8 +231,12 @@ class VIEW3D_OP_SprytileGui(bpy.types.Operator):
 
             mode = bpy.context.scene.sprytile_data.paint_mode
             if VIEW3D_OP_SprytileGui.build_previews[mode]:
+                self.preview_throttle.begin(time.perf_counter())
+                stat_start = sprytile_stats.begin()
                 sprytile_modal.VIEW3D_OP_SprytileModalTool.verify_bmesh_layers(bmesh.from_edit_mesh(context.object.data))
                 VIEW3D_OP_SprytileGui.build_previews[mode].build_preview(context, context.scene, ray_origin, ray_vector)
+                sprytile_stats.end("preview_build", stat_start)
+                self.preview_throttle.end(time.perf_counter())
             else:
                 sprytile_preview.set_preview_data(None, None)
 
@@ -593,11 +611,51 @@ class VIEW3D_OP_SprytileGui(bpy.types.Operator):
 
         middle_btn = context.scene.sprytile_ui.middle_btn
 
+        stat_start = sprytile_stats.begin()
         VIEW3D_OP_SprytileGui.draw_offscreen(context)
         VIEW3D_OP_SprytileGui.draw_to_viewport(self.gui_min, self.gui_max, show_extra,
                                      self.label_counter, tilegrid, sprytile_data,
                                      context.scene.cursor.location, region, rv3d,
                                      middle_btn, context)
+        sprytile_stats.end("draw", stat_start)
+
+        addon_prefs = context.preferences.addons[__package__].preferences
+        if addon_prefs.use_timing_stats and addon_prefs.show_timing_hud:
+            VIEW3D_OP_SprytileGui.draw_stats_hud(context)
+
+    @staticmethod
+    def draw_stats_hud(context):
+        """Draw the timing stats in the bottom left corner of the viewport"""
+        lines = ["{0:<18}{1:>8}{2:>9}{3:>9}{4:>9}".format("stage ms", "count", "p50", "p90", "p99")]
+        counters = []
+        for kind, name, count, mean, p50, p90, p99, peak in sprytile_stats.stats.rows():
+            if kind == 'stage_ms':
+                lines.append("{0:<18}{1:>8}{2:>9.2f}{3:>9.2f}{4:>9.2f}".format(name, count, p50, p90, p99))
+            elif kind != 'total':
+                counters.append("{0:<18}{1:>8}{2:>9.1f}{3:>9.1f}{4:>9.1f}".format(
+                    "{0}/{1}".format(name, kind[4:]), count, p50, p90, p99))
+        lines.extend(counters)
+
+        font_id = 0
+        font_size = 11
+        pad = 6
+        line_height = font_size + 4
+        blf.size(font_id, font_size, 72)
+        width = max(blf.dimensions(font_id, line)[0] for line in lines) + pad * 2
+        height = line_height * len(lines) + pad * 2
+
+        projection_mat = sprytile_utils.get_ortho2D_matrix(0, context.region.width, 0, context.region.height)
+        bgl.glEnable(bgl.GL_BLEND)
+        vtx = [(pad, pad), (pad, pad + height), (pad + width, pad), (pad + width, pad + height)]
+        VIEW3D_OP_SprytileGui.draw_full_quad(vtx, projection_mat, (0.0, 0.0, 0.0, 0.6))
+
+        blf.color(font_id, 1.0, 1.0, 1.0, 1.0)
+        y_pos = pad * 2 + line_height * (len(lines) - 1)
+        for line in lines:
+            blf.position(font_id, pad * 2, y_pos, 0)
+            blf.draw(font_id, line)
+            y_pos -= line_height
+        bgl.glDisable(bgl.GL_BLEND)
 
     @staticmethod
     def draw_selection(mvpMat, color, sel_min, sel_max, adjust=1):
@@ -836,7 +894,7 @@ class VIEW3D_OP_SprytileGui(bpy.types.Operator):
     @staticmethod
     def draw_tile_select_ui(mvp_mat, view_min, view_max, view_size,
                             tex_size, grid_size, tile_selection,
-                            padding, margin, show_extra, is_pixel):
+                            padding, margin, show_extra, is_pixel, tile_analysis=None):
         # Draw the texture quad
         quad_pos = ((view_min.x, view_min.y), (view_max.x, view_min.y),
                (view_min.x, view_max.y), (view_max.x, view_max.y))
@@ -883,6 +941,19 @@ class VIEW3D_OP_SprytileGui(bpy.types.Operator):
                 batch = batch_for_shader(flat_shader, 'LINES', { "i_position": vtxs, "i_color": vcol})
                 batch.draw(flat_shader)
 
+            # Shade the tiles that have no visible pixels
+            if tile_analysis is not None:
+                vtxs = []
+                for y, x in zip(*(tile_analysis.states == sprytile_tiles.TILE_EMPTY).nonzero()):
+                    x_min, y_min = x * cell_size[0], y * cell_size[1]
+                    x_max, y_max = x_min + cell_size[0], y_min + cell_size[1]
+                    vtxs.extend(((x_min, y_min), (x_max, y_min), (x_max, y_max),
+                                 (x_min, y_min), (x_max, y_max), (x_min, y_max)))
+                if len(vtxs) > 0:
+                    vcol = ((0.0, 0.0, 0.0, 0.35),)*len(vtxs)
+                    batch = batch_for_shader(flat_shader, 'TRIS', { "i_position": vtxs, "i_color": vcol})
+                    batch.draw(flat_shader)
+
         # Draw selected tile outline
         sel_min, sel_max = VIEW3D_OP_SprytileGui.get_sel_bounds(grid_size, padding, margin,
                                                       tile_selection[0], tile_selection[1],
@@ -967,6 +1038,11 @@ class VIEW3D_OP_SprytileGui(bpy.types.Operator):
         margin = VIEW3D_OP_SprytileGui.loaded_grid.margin
         is_pixel = sprytile_utils.grid_is_single_pixel(VIEW3D_OP_SprytileGui.loaded_grid)
 
+        tile_analysis = None
+        if show_extra and is_pixel is False:
+            target_img = bpy.data.images.get(VIEW3D_OP_SprytileGui.texture_grid)
+            tile_analysis = sprytile_tiles.get_analysis(target_img, VIEW3D_OP_SprytileGui.loaded_grid)
+
         # Draw work plane
         VIEW3D_OP_SprytileGui.draw_work_plane(projection_mat, grid_size, sprytile_data, cursor_loc, region, rv3d, middle_btn)
 
@@ -1006,7 +1082,8 @@ class VIEW3D_OP_SprytileGui(bpy.types.Operator):
 
         # Draw the tile select UI
         VIEW3D_OP_SprytileGui.draw_tile_select_ui(projection_mat, view_min, view_max, view_size, VIEW3D_OP_SprytileGui.tex_size,
-                                       grid_size, tile_sel, padding, margin, show_extra, is_pixel)
+                                       grid_size, tile_sel, padding, margin, show_extra, is_pixel,
+                                       tile_analysis)
 
         # restore opengl defaults
         bgl.glScissor(scissor_box[0], scissor_box[1], scissor_box[2], scissor_box[3])
@@ -0,0 +1,302 @@
+import bmesh
+import bpy
+import numpy
+
+import sprytile_bvh
+import sprytile_greedy
+import sprytile_stats
+import sprytile_tiles
+import sprytile_utils
+from sprytile_uv import UvDataLayers
+
+# Layout pixels more transparent than this are left empty
+ALPHA_THRESHOLD = 128
+# Paint setting bits holding rotation and flips, built tiles are placed unrotated
+PAINT_TRANSFORM_BITS = 0xF00
+
+
+def parse_tile_table(text):
+    """
+    Read a color to tile table, one "#rrggbb tile_x tile_y" entry per line,
+    with tile coordinates counted from the bottom left of the tileset like
+    the tile selection. Empty lines and lines starting with # followed by a
+    space are skipped
+    :return: dict of 0xRRGGBB color -> (tile_x, tile_y)
+    """
+    table = {}
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if len(line) == 0 or line.startswith('# ') or line == '#':
+            continue
+        parts = line.split()
+        color = parts[0].lstrip('#')
+        if len(parts) != 3 or len(color) != 6:
+            raise ValueError("Line {0}: expected \"#rrggbb tile_x tile_y\"".format(line_number))
+        try:
+            table[int(color, 16)] = (int(parts[1]), int(parts[2]))
+        except ValueError:
+            raise ValueError("Line {0}: \"{1}\" isn't a color and tile coordinate".format(line_number, line))
+    return table
+
+
+def get_layout_tiles(pixels, table):
+    """
+    Look up the tile of every layout pixel
+    :param pixels: (height, width, 4) byte pixels, rows from the bottom
+    :return: cell x, cell y, tile x and tile y arrays of the cells with a tile, and the count of unknown colors
+    """
+    colors = (pixels[..., 0].astype(numpy.int64) << 16) | (pixels[..., 1].astype(numpy.int64) << 8) | pixels[..., 2]
+    cell_y, cell_x = numpy.nonzero(pixels[..., 3] >= ALPHA_THRESHOLD)
+    colors = colors[cell_y, cell_x]
+
+    keys = numpy.array(sorted(table.keys()), dtype=numpy.int64)
+    tiles = numpy.array([table[key] for key in keys.tolist()], dtype=numpy.int64).reshape(-1, 2)
+    if len(keys) == 0:
+        return cell_x[:0], cell_y[:0], cell_x[:0], cell_y[:0], len(colors)
+    index = numpy.minimum(numpy.searchsorted(keys, colors), len(keys) - 1)
+    found = keys[index] == colors
+    index = index[found]
+    return cell_x[found], cell_y[found], tiles[index, 0], tiles[index, 1], int((~found).sum())
+
+
+def get_shared_corners(cell_x, cell_y, size):
+    """
+    Weld the corners of grid cells into shared verts, without sorting
+    :param size: (width, height) of the cell grid
+    :return: (n, 2) grid positions of the verts, and (cells, 4) vert index of each cell corner
+    """
+    width = size[0] + 1
+    corner_x = numpy.stack((cell_x, cell_x + 1, cell_x + 1, cell_x), axis=1)
+    corner_y = numpy.stack((cell_y, cell_y, cell_y + 1, cell_y + 1), axis=1)
+    corner_keys = corner_y * width + corner_x
+    used = numpy.zeros(width * (size[1] + 1), dtype=bool)
+    used[corner_keys.ravel()] = True
+    vert_keys = numpy.nonzero(used)[0]
+    vert_index = numpy.cumsum(used) - 1
+    verts = numpy.stack((vert_keys % width, vert_keys // width), axis=1)
+    return verts, vert_index[corner_keys]
+
+
+def get_tile_uvs(tile_grid, image_size, tile_x, tile_y):
+    """UVs of each tile's corners, inset by the grid's subpixel padding like sprytile_uv"""
+    origin_x, origin_y = sprytile_tiles.get_tile_origin(tile_grid, tile_x, tile_y)
+    inset = tile_grid.auto_pad_offset / 2 if tile_grid.auto_pad else 0.0
+    u0 = (origin_x + inset) / image_size[0]
+    u1 = (origin_x + tile_grid.grid[0] - inset) / image_size[0]
+    v0 = (origin_y + inset) / image_size[1]
+    v1 = (origin_y + tile_grid.grid[1] - inset) / image_size[1]
+    return numpy.stack((numpy.stack((u0, v0), axis=1), numpy.stack((u1, v0), axis=1),
+                        numpy.stack((u1, v1), axis=1), numpy.stack((u0, v1), axis=1)), axis=1)
+
+
+def append_layer_values(mesh, name, new_values, count):
+    """Write the values of the last count faces of a mesh, keeping the existing ones"""
+    layer = mesh.polygon_layers_int.get(name)
+    if layer is None:
+        layer = mesh.polygon_layers_int.new(name=name)
+    values = numpy.empty(len(mesh.polygons), dtype=numpy.int32)
+    layer.data.foreach_get('value', values)
+    values[len(values) - count:] = new_values
+    layer.data.foreach_set('value', values)
+
+
+def append_faces(mesh, coords, corner_verts, uvs, material_index, face_values):
+    """
+    Add quads to the end of a mesh in one pass, with their UVs and tile data
+    :param coords: (n, 3) positions of the new verts
+    :param corner_verts: (faces, 4) index of each face corner into coords
+    :param uvs: (faces, 4, 2) UVs of each face corner
+    :param face_values: dict of UvDataLayers name -> value or value array for the new faces
+    """
+    vert_start = len(mesh.vertices)
+    loop_start = len(mesh.loops)
+    face_start = len(mesh.polygons)
+    face_count = len(corner_verts)
+
+    mesh.vertices.add(len(coords))
+    all_coords = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float32)
+    mesh.vertices.foreach_get('co', all_coords)
+    all_coords[vert_start * 3:] = coords.ravel()
+    mesh.vertices.foreach_set('co', all_coords)
+
+    mesh.loops.add(face_count * 4)
+    vertex_index = numpy.empty(len(mesh.loops), dtype=numpy.int32)
+    mesh.loops.foreach_get('vertex_index', vertex_index)
+    vertex_index[loop_start:] = corner_verts.ravel() + vert_start
+    mesh.loops.foreach_set('vertex_index', vertex_index)
+
+    mesh.polygons.add(face_count)
+    loop_starts = numpy.empty(len(mesh.polygons), dtype=numpy.int32)
+    loop_totals = numpy.empty(len(mesh.polygons), dtype=numpy.int32)
+    mesh.polygons.foreach_get('loop_start', loop_starts)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+    loop_starts[face_start:] = numpy.arange(loop_start, loop_start + face_count * 4, 4)
+    loop_totals[face_start:] = 4
+    mesh.polygons.foreach_set('loop_start', loop_starts)
+    mesh.polygons.foreach_set('loop_total', loop_totals)
+
+    material_indices = numpy.empty(len(mesh.polygons), dtype=numpy.int32)
+    mesh.polygons.foreach_get('material_index', material_indices)
+    material_indices[face_start:] = material_index
+    mesh.polygons.foreach_set('material_index', material_indices)
+    # Only the new faces are selected, so a merge afterwards leaves the rest alone
+    selected = numpy.zeros(len(mesh.polygons), dtype=bool)
+    selected[face_start:] = True
+    mesh.polygons.foreach_set('select', selected)
+    mesh.update(calc_edges=True)
+
+    uv_layer = mesh.uv_layers.active
+    if uv_layer is None:
+        uv_layer = mesh.uv_layers.new()
+    all_uvs = numpy.empty(len(mesh.loops) * 2, dtype=numpy.float32)
+    uv_layer.data.foreach_get('uv', all_uvs)
+    all_uvs[loop_start * 2:] = uvs.ravel()
+    uv_layer.data.foreach_set('uv', all_uvs)
+
+    for name in UvDataLayers.LAYER_NAMES:
+        append_layer_values(mesh, name, face_values.get(name, 0), face_count)
+    mesh.update()
+
+
+class UTIL_OP_SprytileBuildFromImage(bpy.types.Operator):
+    bl_idname = "sprytile.build_from_image"
+    bl_label = "Build From Layout Image"
+    bl_description = "Build a tile for every pixel of a layout image on the work plane, " \
+                     "picking the tile of each pixel's color from a text table"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    image_name: bpy.props.StringProperty(
+        name="Layout",
+        description="Image with a pixel per tile, its bottom left pixel is built on the cell at the 3D cursor"
+    )
+    table_name: bpy.props.StringProperty(
+        name="Tile Table",
+        description="Text with a \"#rrggbb tile_x tile_y\" line per color, "
+                    "tile coordinates counted from the bottom left of the tileset"
+    )
+    use_merge: bpy.props.BoolProperty(
+        name="Merge Tile Quads",
+        description="Run Merge Tile Quads on the built faces",
+        default=False
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.object is not None and context.object.type == 'MESH'
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop_search(self, "image_name", bpy.data, "images")
+        layout.prop_search(self, "table_name", bpy.data, "texts")
+        layout.prop(self, "use_merge")
+
+    def execute(self, context):
+        obj = context.object
+        image = bpy.data.images.get(self.image_name)
+        text = bpy.data.texts.get(self.table_name)
+        if image is None or image.size[0] == 0 or text is None:
+            self.report({'ERROR'}, "Pick a layout image and a tile table text")
+            return {'CANCELLED'}
+        tile_grid = sprytile_utils.get_grid(context, obj.sprytile_gridid)
+        tileset = sprytile_utils.get_grid_texture(obj, tile_grid) if tile_grid is not None else None
+        if tileset is None or tileset.size[0] == 0:
+            self.report({'ERROR'}, "The object's tile grid has no image")
+            return {'CANCELLED'}
+        if tile_grid.rotate != 0:
+            self.report({'ERROR'}, "Rotated tile grids aren't supported")
+            return {'CANCELLED'}
+        try:
+            table = parse_tile_table(text.as_string())
+        except ValueError as error:
+            self.report({'ERROR'}, "Tile table: {0}".format(error))
+            return {'CANCELLED'}
+
+        was_editing = obj.mode == 'EDIT'
+        if obj.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        result = self.build(context, obj, tile_grid, tileset, image, table)
+        if was_editing:
+            bpy.ops.object.mode_set(mode='EDIT')
+        return result
+
+    def build(self, context, obj, tile_grid, tileset, image, table):
+        stat_start = sprytile_stats.begin()
+        scene = context.scene
+        data = scene.sprytile_data
+        cell_x, cell_y, tile_x, tile_y, unknown = get_layout_tiles(sprytile_tiles.read_pixels(image), table)
+        if len(cell_x) == 0:
+            self.report({'INFO'}, "No layout pixels match the tile table")
+            return {'CANCELLED'}
+        verts, corner_verts = get_shared_corners(cell_x, cell_y, image.size)
+
+        # Cells are laid out the way get_grid_pos snaps positions, from the 3D cursor along the work plane
+        up_vector, right_vector, plane_normal = sprytile_utils.get_current_grid_vectors(scene, with_rotation=False)
+        grid_right, grid_up = sprytile_utils.get_grid_right_up(right_vector.copy(), up_vector.copy(),
+                                                               data.world_pixels,
+                                                               tile_grid.grid[0], tile_grid.grid[1])
+        grid_origin = scene.cursor.location.copy()
+        if data.work_layer == 'DECAL_1':
+            grid_origin += plane_normal * data.mesh_decal_offset
+        world = numpy.array(grid_origin) + \
+            verts[:, :1] * numpy.array(grid_right) + verts[:, 1:] * numpy.array(grid_up)
+        to_local = numpy.array(obj.matrix_world.inverted())
+        coords = world @ to_local[:3, :3].T + to_local[:3, 3]
+
+        row_size = int(numpy.ceil(tileset.size[0] / tile_grid.grid[0]))
+        tile_ids = tile_y * row_size + tile_x
+        face_count = len(tile_ids)
+        ones = numpy.ones(face_count, dtype=numpy.int32)
+        face_values = {
+            UvDataLayers.GRID_INDEX: obj.sprytile_gridid,
+            UvDataLayers.GRID_TILE_ID: tile_ids,
+            UvDataLayers.GRID_SEL_WIDTH: ones,
+            UvDataLayers.GRID_SEL_HEIGHT: ones,
+            UvDataLayers.GRID_SEL_ORIGIN: tile_ids,
+            UvDataLayers.PAINT_SETTINGS: sprytile_utils.get_paint_settings(data) & ~PAINT_TRANSFORM_BITS,
+            UvDataLayers.WORK_LAYER: sprytile_utils.get_work_layer_data(data),
+        }
+        material_index = max(0, obj.material_slots.find(tile_grid.mat_id))
+        append_faces(obj.data, coords, corner_verts, get_tile_uvs(tile_grid, tileset.size, tile_x, tile_y),
+                     material_index, face_values)
+
+        if self.use_merge:
+            bm = bmesh.new()
+            bm.from_mesh(obj.data)
+            before, after = sprytile_greedy.greedy_merge(bm, selected_only=True,
+                                                         pads=sprytile_greedy.get_grid_pads(context, obj))
+            bm.to_mesh(obj.data)
+            obj.data.update()
+            bm.free()
+            face_count -= before - after
+        sprytile_bvh.invalidate(obj.data)
+        sprytile_stats.end("build_from_image", stat_start)
+
+        self.report({'INFO'}, "Built {0} faces from {1}x{2} layout{3}".format(
+            face_count, image.size[0], image.size[1],
+            ", {0} pixels had colors missing from the table".format(unknown) if unknown > 0 else ""))
+        return {'FINISHED'}
+
+
+def draw_imagemap_menu(self, context):
+    self.layout.operator("sprytile.build_from_image")
+
+
+# module classes
+classes = (
+    UTIL_OP_SprytileBuildFromImage,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.append(draw_imagemap_menu)
+
+
+def unregister():
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.remove(draw_imagemap_menu)
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
@@ -0,0 +1,151 @@
+import time
+
+import bmesh
+import bpy
+
+import sprytile_journal
+
+
+class SprytileJob:
+    """
+    Long running work split into small steps, so it can be run a time slice
+    at a time without freezing Blender.
+
+    steps is a generator that does a chunk of work and yields its progress
+    as a 0 to 1 fraction. Every yield evaluates to the context of the modal
+    call running the next chunk, as Blender contexts should not be kept
+    between calls: context = (yield progress) or context
+    """
+    def __init__(self, name, steps, rollback=None, on_finish=None):
+        """
+        :param name: Shown in the header and used as the undo step name
+        :param steps: Generator doing the work
+        :param rollback: Called with the context to revert the work when cancelled
+        :param on_finish: Called with the context once all the work is done
+        """
+        self.name = name
+        self.steps = steps
+        self.rollback = rollback
+        self.on_finish = on_finish
+
+
+class MeshSnapshot:
+    """
+    Copy of an object's edit mesh that can be written back over it,
+    for rolling back jobs that modify the mesh in many small steps
+    """
+    def __init__(self, obj):
+        self.obj = obj
+        self.mesh = bpy.data.meshes.new(obj.data.name + "_sprytile_snapshot")
+        edit_mesh = bmesh.from_edit_mesh(obj.data)
+        snapshot = edit_mesh.copy()
+        snapshot.to_mesh(self.mesh)
+        snapshot.free()
+
+    def restore(self, context):
+        edit_mesh = bmesh.from_edit_mesh(self.obj.data)
+        edit_mesh.clear()
+        edit_mesh.from_mesh(self.mesh)
+        for el in [edit_mesh.faces, edit_mesh.verts, edit_mesh.edges]:
+            el.index_update()
+            el.ensure_lookup_table()
+        bmesh.update_edit_mesh(self.obj.data, True, True)
+        self.free()
+
+    def free(self):
+        if self.mesh is not None:
+            bpy.data.meshes.remove(self.mesh)
+            self.mesh = None
+
+
+class JobRunner:
+    """
+    Runs a SprytileJob in time slices from a modal operator. A window timer
+    keeps modal events coming while the job runs, progress shows in the area
+    header and a single undo step is recorded when the job is done.
+    """
+    def __init__(self, budget=0.02, timer_step=0.01):
+        """
+        :param budget: Seconds of work to do per modal event
+        :param timer_step: Seconds between the timer events driving the job
+        """
+        self.budget = budget
+        self.timer_step = timer_step
+        self.job = None
+        self.timer = None
+        self.progress = 0.0
+        self.started = False
+
+    @property
+    def is_running(self):
+        return self.job is not None
+
+    def start(self, context, job):
+        if self.is_running:
+            self.cancel(context)
+        self.job = job
+        self.progress = 0.0
+        self.started = False
+
+        win_mgr = context.window_manager
+        self.timer = win_mgr.event_timer_add(self.timer_step, window=context.window)
+        win_mgr.progress_begin(0, 100)
+        self.update_status(context)
+
+    def step(self, context):
+        """
+        Run the job for one time slice
+        :param context:
+        :return: True if the job finished during this slice
+        """
+        if not self.is_running:
+            return False
+
+        steps = self.job.steps
+        end_time = time.perf_counter() + self.budget
+        try:
+            while time.perf_counter() < end_time:
+                self.progress = steps.send(context if self.started else None)
+                self.started = True
+        except StopIteration:
+            self.finish(context)
+            return True
+        except Exception:
+            self.cancel(context)
+            raise
+
+        self.update_status(context)
+        return False
+
+    def cancel(self, context):
+        """Stop the job and revert what it did so far"""
+        if not self.is_running:
+            return
+        job = self.job
+        job.steps.close()
+        self.stop(context)
+        if job.rollback is not None:
+            job.rollback(context)
+
+    def finish(self, context):
+        job = self.job
+        self.stop(context)
+        if job.on_finish is not None:
+            job.on_finish(context)
+        sprytile_journal.end_stroke(context, job.name)
+
+    def stop(self, context):
+        win_mgr = context.window_manager
+        if self.timer is not None:
+            win_mgr.event_timer_remove(self.timer)
+            self.timer = None
+        win_mgr.progress_end()
+        if context.area is not None:
+            context.area.header_text_set(None)
+        self.job = None
+
+    def update_status(self, context):
+        percent = int(self.progress * 100)
+        context.window_manager.progress_update(percent)
+        if context.area is not None:
+            context.area.header_text_set("{0}: {1}% (Esc to cancel)".format(self.job.name, percent))
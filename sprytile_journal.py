@@ -0,0 +1,373 @@
+import bmesh
+import bpy
+from bpy.app.handlers import persistent
+
+import sprytile_uv
+
+
+def capture_face(face, uv_layer, int_layers):
+    """
+    Capture the tile data Sprytile writes to a face
+    :return: tuple of (loop UVs, face layer values, material index)
+    """
+    uvs = tuple(tuple(loop[uv_layer].uv) for loop in face.loops)
+    values = tuple(face[layer] for layer in int_layers)
+    return uvs, values, face.material_index
+
+
+def apply_face(face, state, uv_layer, int_layers):
+    uvs, values, material_index = state
+    for loop, uv in zip(face.loops, uvs):
+        loop[uv_layer].uv = uv
+    for layer, value in zip(int_layers, values):
+        face[layer] = value
+    face.material_index = material_index
+
+
+# Operators editing the mesh through the journal, they don't leave its entries stale
+JOURNAL_OPERATORS = {"SPRYTILE_OT_modal_tool", "SPRYTILE_OT_journal_undo", "SPRYTILE_OT_journal_redo"}
+
+
+def get_operator_stamp(context):
+    """
+    Pointer of the last registered operator that didn't go through the
+    journal. Native undo steps are pushed by registered operators, so a new
+    stamp means the undo stack moved on past the journal's entries
+    """
+    for op in reversed(context.window_manager.operators):
+        if op.bl_idname not in JOURNAL_OPERATORS:
+            return op.as_pointer()
+    return None
+
+
+def state_size(state):
+    """Rough size in bytes of a captured face state"""
+    return 120 + 40 * len(state[0]) + 8 * len(state[1])
+
+
+class StrokeEntry:
+    """Changes a single stroke made to a mesh"""
+    def __init__(self, name, mesh_key, face_count, vert_count):
+        self.name = name
+        self.mesh_key = mesh_key
+        # Mesh size before the stroke, created faces and verts come after
+        self.face_count = face_count
+        self.vert_count = vert_count
+        # face index -> state, of the faces that existed before the stroke
+        self.before = {}
+        self.after = {}
+        # (object space vertex positions, state) of each created face
+        self.created = []
+        self.size = 0
+
+    def created_counts(self):
+        return len(self.created), sum(len(coords) for coords, state in self.created)
+
+
+class StrokeJournal:
+    """
+    Undo history of Sprytile strokes, as per stroke deltas of the tile data
+    and created faces instead of full copies of the mesh.
+
+    Entries stack on top of the last native undo step. Strokes that change
+    the mesh in ways the journal can't record, like merging vertices, and
+    going over the memory budget fall back to a native undo push, which
+    clears the journal. Auto merge welds vertices, so with it on most build
+    strokes take the native path. Any other operator run after an entry
+    pushes its own undo step and also clears the journal.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.memory_budget = 0
+        self.undo_entries = []
+        self.redo_entries = []
+        self.memory_used = 0
+        self.stroke = None
+        self.operator_stamp = None
+
+    def clear(self):
+        self.undo_entries = []
+        self.redo_entries = []
+        self.memory_used = 0
+        self.stroke = None
+
+    def begin_stroke(self, mesh, bm):
+        if not self.enabled:
+            self.stroke = None
+            return
+        self.stroke = StrokeEntry(None, mesh.as_pointer(), len(bm.faces), len(bm.verts))
+        # Mesh edited since the last entry, by something the journal can't see
+        if len(self.undo_entries) > 0:
+            last = self.undo_entries[-1]
+            created_faces, created_verts = last.created_counts()
+            if last.mesh_key != self.stroke.mesh_key or \
+                    last.face_count + created_faces != self.stroke.face_count or \
+                    last.vert_count + created_verts != self.stroke.vert_count:
+                self.clear()
+                self.stroke = StrokeEntry(None, mesh.as_pointer(), len(bm.faces), len(bm.verts))
+
+    def record_face(self, bm, face):
+        """Record the state of a face before the stroke changes it"""
+        stroke = self.stroke
+        if stroke is None or face.index >= stroke.face_count or face.index in stroke.before:
+            return
+        uv_layer = bm.loops.layers.uv.verify()
+        int_layers = get_int_layers(bm)
+        stroke.before[face.index] = capture_face(face, uv_layer, int_layers)
+
+    def end_stroke(self, context, name):
+        """
+        Finish recording a stroke
+        :return: True if the stroke was journaled, False if it needs a native undo push
+        """
+        stroke = self.stroke
+        self.stroke = None
+        if stroke is None or context.object is None or context.object.data.as_pointer() != stroke.mesh_key:
+            return False
+
+        bm = bmesh.from_edit_mesh(context.object.data)
+        face_count = len(bm.faces)
+        vert_count = len(bm.verts)
+        # Faces or verts were removed, e.g. merged, can't be replayed by index
+        if face_count < stroke.face_count or vert_count < stroke.vert_count:
+            return False
+
+        bm.verts.index_update()
+        bm.faces.index_update()
+        bm.faces.ensure_lookup_table()
+        uv_layer = bm.loops.layers.uv.verify()
+        int_layers = get_int_layers(bm)
+
+        created_vert_count = 0
+        for face_index in range(stroke.face_count, face_count):
+            face = bm.faces[face_index]
+            # Created faces have their own new verts
+            if any(vert.index < stroke.vert_count for vert in face.verts):
+                return False
+            coords = tuple(tuple(vert.co) for vert in face.verts)
+            created_vert_count += len(coords)
+            state = capture_face(face, uv_layer, int_layers)
+            stroke.created.append((coords, state))
+            stroke.size += state_size(state) + 24 * len(coords)
+        if created_vert_count != vert_count - stroke.vert_count:
+            return False
+
+        for face_index, state in stroke.before.items():
+            after = capture_face(bm.faces[face_index], uv_layer, int_layers)
+            stroke.after[face_index] = after
+            stroke.size += state_size(state) + state_size(after)
+
+        if len(stroke.created) == 0 and len(stroke.after) == 0:
+            return True
+
+        if self.memory_used + stroke.size > self.memory_budget:
+            return False
+
+        # A native undo step was pushed since the last entry, the new one can't stack on the old ones
+        operator_stamp = get_operator_stamp(context)
+        if operator_stamp != self.operator_stamp:
+            self.clear()
+            self.operator_stamp = operator_stamp
+
+        stroke.name = name
+        self.undo_entries.append(stroke)
+        self.memory_used += stroke.size
+        for entry in self.redo_entries:
+            self.memory_used -= entry.size
+        self.redo_entries = []
+        return True
+
+    def can_step(self, context, entries):
+        obj = context.object
+        if len(entries) == 0 or obj is None or obj.mode != 'EDIT' or obj.data.as_pointer() != entries[-1].mesh_key:
+            return False
+        # Another operator ran after the entries, native undo has to step back over it first
+        if get_operator_stamp(context) != self.operator_stamp:
+            self.clear()
+            return False
+        return True
+
+    def undo(self, context):
+        """
+        Revert the last journaled stroke
+        :return: Name of the undone stroke, or None if the mesh no longer matches the journal
+        """
+        entry = self.undo_entries[-1]
+        bm = bmesh.from_edit_mesh(context.object.data)
+        created_faces, created_verts = entry.created_counts()
+        if len(bm.faces) != entry.face_count + created_faces or \
+                len(bm.verts) != entry.vert_count + created_verts:
+            self.clear()
+            return None
+
+        bm.verts.ensure_lookup_table()
+        bm.faces.ensure_lookup_table()
+        uv_layer = bm.loops.layers.uv.verify()
+        int_layers = get_int_layers(bm)
+
+        for face_index, state in entry.before.items():
+            apply_face(bm.faces[face_index], state, uv_layer, int_layers)
+
+        created = [bm.verts[i] for i in range(entry.vert_count, entry.vert_count + created_verts)]
+        if len(created) > 0:
+            bmesh.ops.delete(bm, geom=created, context='VERTS')
+
+        self.undo_entries.pop()
+        self.redo_entries.append(entry)
+        update_mesh(context, bm)
+        return entry.name
+
+    def redo(self, context):
+        """
+        Reapply the last undone stroke
+        :return: Name of the redone stroke, or None if the mesh no longer matches the journal
+        """
+        entry = self.redo_entries[-1]
+        bm = bmesh.from_edit_mesh(context.object.data)
+        if len(bm.faces) != entry.face_count or len(bm.verts) != entry.vert_count:
+            self.clear()
+            return None
+
+        bm.faces.ensure_lookup_table()
+        uv_layer = bm.loops.layers.uv.verify()
+        int_layers = get_int_layers(bm)
+
+        for face_index, state in entry.after.items():
+            apply_face(bm.faces[face_index], state, uv_layer, int_layers)
+
+        for coords, state in entry.created:
+            verts = [bm.verts.new(co) for co in coords]
+            face = bm.faces.new(verts)
+            face.normal_update()
+            apply_face(face, state, uv_layer, int_layers)
+
+        self.redo_entries.pop()
+        self.undo_entries.append(entry)
+        update_mesh(context, bm)
+        return entry.name
+
+
+def get_int_layers(bm):
+    layers = []
+    for layer_name in sprytile_uv.UvDataLayers.LAYER_NAMES:
+        layer = bm.faces.layers.int.get(layer_name)
+        if layer is None:
+            layer = bm.faces.layers.int.new(layer_name)
+        layers.append(layer)
+    return layers
+
+
+def update_mesh(context, bm):
+    for el in [bm.faces, bm.verts, bm.edges]:
+        el.index_update()
+        el.ensure_lookup_table()
+    bmesh.update_edit_mesh(context.object.data, True, True)
+
+
+journal = StrokeJournal()
+
+
+def configure(enabled, memory_budget_mb):
+    journal.enabled = enabled
+    journal.memory_budget = memory_budget_mb * 1024 * 1024
+    if not enabled:
+        journal.clear()
+
+
+def begin_stroke(mesh, bm):
+    journal.begin_stroke(mesh, bm)
+
+
+def record_face(bm, face):
+    journal.record_face(bm, face)
+
+
+def end_stroke(context, name="Sprytile Stroke"):
+    """
+    End the stroke in the journal, or with a native undo push if the journal
+    is off or the stroke can't be journaled
+    """
+    if journal.end_stroke(context, name):
+        return
+    journal.clear()
+    bpy.ops.ed.undo_push(message=name)
+
+
+class UTIL_OP_SprytileJournalUndo(bpy.types.Operator):
+    bl_idname = "sprytile.journal_undo"
+    bl_label = "Undo Sprytile Stroke"
+    bl_description = "Undo the last stroke recorded in the Sprytile stroke journal"
+
+    @classmethod
+    def poll(cls, context):
+        return journal.can_step(context, journal.undo_entries)
+
+    def invoke(self, context, event):
+        return self.execute(context)
+
+    def execute(self, context):
+        name = journal.undo(context)
+        if name is None:
+            # Let the native undo handle it
+            return {'PASS_THROUGH'}
+        self.report({'INFO'}, "Undo {0}".format(name))
+        return {'FINISHED'}
+
+
+class UTIL_OP_SprytileJournalRedo(bpy.types.Operator):
+    bl_idname = "sprytile.journal_redo"
+    bl_label = "Redo Sprytile Stroke"
+    bl_description = "Redo the last stroke undone from the Sprytile stroke journal"
+
+    @classmethod
+    def poll(cls, context):
+        return journal.can_step(context, journal.redo_entries)
+
+    def invoke(self, context, event):
+        return self.execute(context)
+
+    def execute(self, context):
+        name = journal.redo(context)
+        if name is None:
+            return {'PASS_THROUGH'}
+        self.report({'INFO'}, "Redo {0}".format(name))
+        return {'FINISHED'}
+
+
+@persistent
+def sprytile_journal_handler(dummy):
+    # Native undo, redo or loading replaced the mesh the journal refers to
+    journal.clear()
+
+
+handlers = (
+    bpy.app.handlers.undo_post,
+    bpy.app.handlers.redo_post,
+    bpy.app.handlers.load_post,
+)
+
+# module classes
+classes = (
+    UTIL_OP_SprytileJournalUndo,
+    UTIL_OP_SprytileJournalRedo,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+    for handler in handlers:
+        handler.append(sprytile_journal_handler)
+
+
+def unregister():
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
+    for handler in handlers:
+        if sprytile_journal_handler in handler:
+            handler.remove(sprytile_journal_handler)
+    journal.clear()
+
+
+if __name__ == '__main__':
+    register()
@@ -1,4 +1,5 @@
 import math
+import time
 from collections import deque
 
 import bmesh
@@ -6,50 +7,56 @@ import bpy
 import numpy
 from bpy_extras import view3d_utils
 from mathutils import Vector, Matrix, Quaternion
-from mathutils.bvhtree import BVHTree
 from mathutils.geometry import intersect_line_plane, distance_point_to_plane
 
-from rx import Observable
 from sprytile_tools.tool_build import ToolBuild
 from sprytile_tools.tool_paint import ToolPaint
 from sprytile_tools.tool_fill import ToolFill
+from sprytile_tools.tool_events import ToolData, ToolEvent, ToolEventBus, EventThrottle
+from sprytile_tools.tool_recorder import recorder
 import sprytile_uv
 from sprytile_uv import UvDataLayers
 import sprytile_utils
 import sprytile_preview
-
-
-class DataObjectDict(dict):
-    def __getattr__(self, name):
-        if name in self:
-            return self[name]
-        else:
-            raise AttributeError("No such attribute: " + name)
-
-    def __setattr__(self, name, value):
-        self[name] = value
-
-    def __delattr__(self, name):
-        if name in self:
-            del self[name]
-        else:
-            raise AttributeError("No such attribute: " + name)
-
-
-class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
-    """Tile based mesh creation/UV layout tool"""
-    bl_idname = "sprytile.modal_tool"
-    bl_label = "Sprytile Paint"
-    bl_options = {'REGISTER'}
-
-    no_undo = False
-
-    addon_keymaps = []
-    default_keymaps = []
-    tool_keymaps = { 
-        'MAKE_FACE' : "Sprytile Build Tool Map", 
-        'PAINT' : "Sprytile Paint Tool Map", 
-        'FILL' : "Sprytile Fill Tool Map"
+import sprytile_bvh
+import sprytile_journal
+import sprytile_stats
+import sprytile_profile
+import sprytile_chunks
+import sprytile_tiles
+import sprytile_cutout
+from sprytile_jobs import JobRunner
+
+
+class SprytileToolHost:
+    """
+    Edit mesh state and helpers the tools work through. Hosted by the modal
+    operator while painting, and by stroke replays without a viewport.
+    """
+    def setup_tools(self, context, stroke_interval=0.0):
+        """
+        Set up the edit mesh state and the tools receiving events from the event bus
+        :param context:
+        :param stroke_interval: Minimum seconds between processing stroke mouse moves
+        """
+        self.virtual_cursor = deque([], 3)
+        self.update_bmesh_tree(context)
+        self.refresh_mesh = False
+        self.draw_preview = False
+        # Pixel snapped position -> verts built this stroke, welded when it ends
+        self.weld_verts = {}
+
+        # Tools receive events from the event bus, by paint mode
+        self.tool_data = None
+        self.skipped_tool_data = None
+        self.job_runner = JobRunner()
+        self.exit_after_job = False
+        self.tool_throttle = EventThrottle(stroke_interval)
+        self.event_bus = ToolEventBus()
+        self.tools = {
+            "build": ToolBuild(self, self.event_bus),
+            "paint": ToolPaint(self, self.event_bus),
+            "fill": ToolFill(self, self.event_bus)
         }
 
     @staticmethod
@@ -229,8 +236,78 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
 
         ray_direction = -normal
 
-        return VIEW3D_OP_SprytileModalTool.raycast_object(obj, ray_origin, ray_direction, ray_dist=ray_offset*2,
+        hit = VIEW3D_OP_SprytileModalTool.raycast_object(obj, ray_origin, ray_direction, ray_dist=ray_offset*2,
                                    work_layer_mask=work_layer_mask)
+        if hit[2] is not None:
+            return hit
+
+        # Trimmed and cutout faces may not cover the cell center, look for them over the whole cell
+        cell_origin = Vector(context.scene.cursor.location.copy())
+        cell_origin += x * right_vector
+        cell_origin += y * up_vector
+        return VIEW3D_OP_SprytileModalTool.find_cell_face(obj, cell_origin, right_vector, up_vector, normal,
+                                                           work_layer_mask=work_layer_mask, plane_dist=ray_offset)
+
+    @staticmethod
+    def find_cell_face(obj, cell_origin, right_vector, up_vector, normal, work_layer_mask=0, plane_dist=0.01):
+        """
+        Find a face on the work plane that lies inside a grid cell, even where it doesn't cover the cell center
+        :param cell_origin: World position of the cell's bottom left corner
+        :param right_vector: Width of the cell
+        :param up_vector: Height of the cell
+        :param normal: Work plane normal
+        :param work_layer_mask:
+        :param plane_dist: How far from the work plane a face can be
+        :return: location, normal, face index and distance, like raycast_object
+        """
+        matrix = obj.matrix_world.copy()
+        matrix_inv = matrix.inverted()
+        mesh = bmesh.from_edit_mesh(obj.data)
+        tree, tree_face_indices = sprytile_bvh.get_layer_tree(obj.data, mesh, work_layer_mask)
+        if tree is None:
+            return None, None, None, None
+
+        cell_center = cell_origin + (right_vector + up_vector) * 0.5
+        center_obj = matrix_inv @ cell_center
+        # Every point of the cell is within the longest half diagonal of its center
+        radius = max((matrix_inv @ (cell_center + (right_vector + up_vector) * 0.5) - center_obj).length,
+                     (matrix_inv @ (cell_center + (right_vector - up_vector) * 0.5) - center_obj).length)
+
+        stat_start = sprytile_stats.begin()
+        hits = tree.find_nearest_range(center_obj, radius)
+        sprytile_stats.end("raycast", stat_start)
+        sprytile_stats.count("raycasts")
+
+        allow_backface = bpy.context.scene.sprytile_data.allow_backface
+        normal_matrix = matrix.to_3x3().inverted().transposed()
+        right_length = right_vector.length_squared
+        up_length = up_vector.length_squared
+        edge_margin = 1e-4
+        found = None
+        for location, hit_normal, tree_index, distance in hits:
+            face_index = tree_face_indices[tree_index]
+            face = mesh.faces[face_index]
+            if face.hide:
+                continue
+            face_normal = (normal_matrix @ face.normal).normalized()
+            if abs(face_normal.dot(normal)) < 0.95:
+                continue
+            if face_normal.dot(normal) < 0 and not allow_backface:
+                continue
+            world_location = matrix @ location
+            offset = world_location - cell_origin
+            if abs(offset.dot(normal)) > plane_dist:
+                continue
+            # The nearest point of a face in a neighbouring cell is on the shared cell edge, not inside
+            cell_x = offset.dot(right_vector) / right_length
+            cell_y = offset.dot(up_vector) / up_length
+            if not (edge_margin < cell_x < 1 - edge_margin and edge_margin < cell_y < 1 - edge_margin):
+                continue
+            if found is None or distance < found[3]:
+                found = (world_location, hit_normal, face_index, distance)
+        if found is None:
+            return None, None, None, None
+        return found
 
     @staticmethod
     def raycast_object(obj, ray_origin, ray_direction, ray_dist=1000.0,
@@ -242,24 +319,23 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
         ray_target_obj = matrix_inv @ (ray_origin + ray_direction)
         ray_direction_obj = ray_target_obj - ray_origin_obj
         mesh = bmesh.from_edit_mesh(obj.data)
-        tree = BVHTree.FromBMesh(mesh)
+        # Only faces on the masked work layer are in this tree
+        tree, tree_face_indices = sprytile_bvh.get_layer_tree(obj.data, mesh, work_layer_mask)
+        if tree is None:
+            return None, None, None, None
 
-        location, normal, face_index, distance = tree.ray_cast(ray_origin_obj, ray_direction_obj, ray_dist)
-        if face_index is None:
+        stat_start = sprytile_stats.begin()
+        location, normal, tree_index, distance = tree.ray_cast(ray_origin_obj, ray_direction_obj, ray_dist)
+        sprytile_stats.end("raycast", stat_start)
+        sprytile_stats.count("raycasts")
+        if tree_index is None:
             return None, None, None, None
 
+        face_index = tree_face_indices[tree_index]
         face = mesh.faces[face_index]
 
-        work_layer_id = mesh.faces.layers.int.get(UvDataLayers.WORK_LAYER)
-        if work_layer_id is None:
-            return None, None, None, None
-        work_layer_value = face[work_layer_id]
-
         # Pass through faces under certain conditions
         do_pass_through = False
-        # Layer mask not matching
-        if work_layer_value != work_layer_mask:
-            do_pass_through = True
         # Hit face is backface
         if face.normal.dot(ray_direction) > 0:
             do_pass_through = not bpy.context.scene.sprytile_data.allow_backface
@@ -280,13 +356,23 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
             normal = matrix @ normal
         return location, normal, face_index, distance
 
+    def verify_grid_material(self, context):
+        # If the selected object does not own the painting material, add a slot for it here
+        grid = sprytile_utils.get_grid(context, context.object.sprytile_gridid)
+        if grid is not None:
+            grid_mat = sprytile_utils.get_grid_material(grid)
+            if not sprytile_utils.has_material(context.object, grid_mat):
+                bpy.ops.object.material_slot_add()
+                context.object.active_material = grid_mat
+
     def update_bmesh_tree(self, context, update_index=False):
         self.bmesh = bmesh.from_edit_mesh(context.object.data)
         if update_index:
             # Verify layers are created
             VIEW3D_OP_SprytileModalTool.verify_bmesh_layers(self.bmesh)
             self.bmesh = bmesh.from_edit_mesh(context.object.data)
-        self.tree = BVHTree.FromBMesh(self.bmesh)
+        # Raycasts go through the per work layer trees of sprytile_bvh, which sync themselves
+        self.has_mesh = True
 
 
     @staticmethod
@@ -329,9 +415,37 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
         :param threshold:
         :return:
         """
+        stat_start = sprytile_stats.begin()
+        face_index = self.construct_face_index(context, grid_coord, grid_size,
+                                               tile_xy, tile_origin,
+                                               grid_up, grid_right,
+                                               up_vector, right_vector, plane_normal,
+                                               require_base_layer, work_layer_mask, threshold)
+        sprytile_stats.end("construct_face", stat_start)
+        return face_index
+
+    def construct_face_index(self, context, grid_coord, grid_size,
+                             tile_xy, tile_origin,
+                             grid_up, grid_right,
+                             up_vector, right_vector, plane_normal,
+                             require_base_layer, work_layer_mask, threshold):
         scene = context.scene
         data = scene.sprytile_data
 
+        # Fully transparent tiles aren't built, single tiles are trimmed to their visible pixels
+        trim_rect = None
+        if data.trim_alpha:
+            obj = context.object
+            target_grid = sprytile_utils.get_grid(context, obj.sprytile_gridid)
+            analysis = sprytile_tiles.get_grid_analysis(obj, target_grid)
+            if analysis is not None:
+                if tuple(grid_size) == (1, 1):
+                    if analysis.is_empty(tile_xy[0], tile_xy[1]):
+                        return None
+                    trim_rect = self.get_trim_rect(data, target_grid, analysis, tile_xy)
+                elif analysis.is_selection_empty(tile_origin[0], tile_origin[1], grid_size[0], grid_size[1]):
+                    return None
+
         # Run a raycast on target work layer mask
         hit_loc, hit_normal, face_index, hit_dist = self.raycast_grid_coord(
             context, grid_coord[0], grid_coord[1],
@@ -360,9 +474,21 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
         # No face index, assume build face
         if face_index is None or face_index < 0:
             face_position = grid_origin + grid_coord[0] * grid_right + grid_coord[1] * grid_up
+            build_right = grid_right * grid_size[0]
+            build_up = grid_up * grid_size[1]
+
+            if trim_rect is not None:
+                # UVs stay centered on the whole tile, the face only covers part of it
+                tile_center = face_position + (build_right + build_up) * 0.5
+                x_min, y_min, x_max, y_max = trim_rect
+                pixel_right = grid_right / target_grid.grid[0]
+                pixel_up = grid_up / target_grid.grid[1]
+                face_position = face_position + pixel_right * x_min + pixel_up * y_min
+                build_right = pixel_right * (x_max - x_min)
+                build_up = pixel_up * (y_max - y_min)
 
             face_verts = sprytile_utils.get_build_vertices(face_position,
-                                                 grid_right * grid_size[0], grid_up * grid_size[1],
+                                                 build_right, build_up,
                                                  up_vector, right_vector)
             face_index = self.create_face(context, face_verts)
             did_build = True
@@ -382,25 +508,81 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
             if not check_coplanar or not check_dot:
                 return None
 
+        stat_start = sprytile_stats.begin()
         sprytile_uv.uv_map_face(context, up_vector, right_vector,
                                 tile_xy, tile_origin, face_index,
-                                self.bmesh, grid_size)
-
-        if did_build and data.auto_merge:
+                                self.bmesh, grid_size,
+                                vert_origin=tile_center if did_build and trim_rect is not None else None)
+        sprytile_stats.end("uv_map", stat_start)
+
+        # Cutouts stand on their own, they aren't merged with their neighbours
+        if did_build and data.build_cutout and data.paint_mode == 'MAKE_FACE':
+            self.refresh_mesh = True
+            return self.cutout_face(context, face_index, data.cutout_budget)
+
+        merge_now = data.auto_merge and not data.merge_at_stroke_end
+        if did_build and data.auto_merge and data.merge_at_stroke_end:
+            self.track_weld(context, self.bmesh.faces[face_index])
+        elif did_build and merge_now:
             if threshold is None:
                 threshold = (1 / data.world_pixels) * 1.25
 
             face = self.bmesh.faces[face_index]
 
-            face_position += grid_right * 0.5 + grid_up * 0.5
+            face_position += (build_right + build_up) * 0.5
             face_position += plane_normal * 0.01
             face_index = self.merge_doubles(context, face, face_position, -plane_normal, threshold)
 
         # Auto merge refreshes the mesh automatically
-        self.refresh_mesh = not data.auto_merge
+        self.refresh_mesh = not merge_now
 
         return face_index
 
+    def cutout_face(self, context, face_index, budget):
+        """
+        Replace a built quad with faces cut to the outline of its tile
+        :return: Index of the first cutout face, the quad's index if it was kept, or None if the tile is empty
+        """
+        obj = context.object
+        target_grid = sprytile_utils.get_grid(context, obj.sprytile_gridid)
+        target_img = sprytile_utils.get_grid_texture(obj, target_grid)
+        analysis = sprytile_tiles.get_analysis(target_img, target_grid)
+        if analysis is None:
+            return face_index
+
+        face = self.bmesh.faces[face_index]
+        uv_layer = self.bmesh.loops.layers.uv.verify()
+        new_faces = sprytile_cutout.cutout_face(self.bmesh, face, uv_layer, target_img.size,
+                                                target_grid, analysis, budget)
+        if new_faces is None:
+            return face_index
+
+        bmesh.ops.delete(self.bmesh, geom=[face], context='FACES')
+        for el in [self.bmesh.faces, self.bmesh.verts, self.bmesh.edges]:
+            el.index_update()
+            el.ensure_lookup_table()
+        sprytile_bvh.invalidate(obj.data)
+        bmesh.update_edit_mesh(obj.data, True, True)
+        if len(new_faces) == 0:
+            return None
+        return new_faces[0].index
+
+    @staticmethod
+    def get_trim_rect(data, target_grid, analysis, tile_xy):
+        """
+        Pixel rect of a tile to build an alpha trimmed face over, mirrored like the UV flips
+        :return: (min x, min y, max x, max y) in pixels from the tile's origin, or None to build the whole tile
+        """
+        bounds = analysis.get_bounds(tile_xy[0], tile_xy[1])
+        if bounds is None:
+            return None
+        x_min, y_min, x_max, y_max = bounds
+        if data.uv_flip_x:
+            x_min, x_max = target_grid.grid[0] - x_max, target_grid.grid[0] - x_min
+        if data.uv_flip_y:
+            y_min, y_max = target_grid.grid[1] - y_max, target_grid.grid[1] - y_min
+        return x_min, y_min, x_max, y_max
+
     def merge_doubles(self, context, face, ray_origin, ray_direction, threshold):
         face.select = True
         work_layer_id = self.bmesh.faces.layers.int.get(UvDataLayers.WORK_LAYER)
@@ -411,7 +593,10 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
         merge_threshold = 0.00
         if context.scene.sprytile_data.work_layer != 'BASE':
             merge_threshold = 0.01
+        stat_start = sprytile_stats.begin()
         bpy.ops.mesh.remove_doubles(threshold=merge_threshold, use_unselected=False)
+        sprytile_stats.end("merge_doubles", stat_start)
+        sprytile_stats.count("remove_doubles")
 
         for el in [self.bmesh.faces, self.bmesh.verts, self.bmesh.edges]:
             el.index_update()
@@ -434,6 +619,60 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
             self.bmesh.faces[new_face_idx].select = False
         return new_face_idx
 
+    def track_weld(self, context, face):
+        """Remember the corners of a face built without merging, to weld when the stroke ends"""
+        world_pixels = context.scene.sprytile_data.world_pixels
+        for vert in face.verts:
+            key = tuple(round(c * world_pixels) for c in vert.co)
+            self.weld_verts.setdefault(key, []).append(vert)
+
+    def weld_stroke(self, context):
+        """
+        Merge the corners of the faces built this stroke with each other, and
+        with the faces of the work layer around them, in a single pass
+        """
+        weld_verts = self.weld_verts
+        self.weld_verts = {}
+        if len(weld_verts) == 0 or context.object.mode != 'EDIT':
+            return
+
+        data = context.scene.sprytile_data
+        # Same thresholds as merging after every face
+        merge_threshold = 0.00
+        if data.work_layer != 'BASE':
+            merge_threshold = 0.01
+        search_dist = max(merge_threshold, 0.0001)
+
+        stat_start = sprytile_stats.begin()
+        self.bmesh = bmesh.from_edit_mesh(context.object.data)
+        self.bmesh.faces.ensure_lookup_table()
+        tree, tree_face_indices = sprytile_bvh.get_layer_tree(context.object.data, self.bmesh,
+                                                              sprytile_utils.get_work_layer_data(data))
+        merge_verts = set()
+        # Verts at the same pixel share a lookup of the faces already around them
+        for stroke_verts in weld_verts.values():
+            stroke_verts = [vert for vert in stroke_verts if vert.is_valid]
+            if len(stroke_verts) == 0:
+                continue
+            merge_verts.update(stroke_verts)
+            if tree is None:
+                continue
+            co = stroke_verts[0].co
+            for location, normal, tree_index, distance in tree.find_nearest_range(co, search_dist):
+                for vert in self.bmesh.faces[tree_face_indices[tree_index]].verts:
+                    if (vert.co - co).length <= search_dist:
+                        merge_verts.add(vert)
+
+        bmesh.ops.remove_doubles(self.bmesh, verts=list(merge_verts), dist=merge_threshold)
+        for el in [self.bmesh.faces, self.bmesh.verts, self.bmesh.edges]:
+            el.index_update()
+            el.ensure_lookup_table()
+        sprytile_bvh.invalidate(context.object.data)
+        bmesh.update_edit_mesh(context.object.data, True, True)
+        self.refresh_mesh = True
+        sprytile_stats.end("merge_doubles", stat_start)
+        sprytile_stats.count("remove_doubles")
+
     def create_face(self, context, world_vertices):
         """
         Create a face in the bmesh using the given world space vertices
@@ -456,9 +695,11 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
             el.index_update()
             el.ensure_lookup_table()
 
+        stat_start = sprytile_stats.begin()
         bmesh.update_edit_mesh(context.object.data, True, True)
+        sprytile_stats.end("update_edit_mesh", stat_start)
 
-        # Update the collision BVHTree with new data
+        # Refresh the edit mesh with the new data
         self.refresh_mesh = True
         return face.index
 
@@ -591,7 +832,27 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
         scene.cursor.location = grid_position
 
 
+class VIEW3D_OP_SprytileModalTool(SprytileToolHost, bpy.types.Operator):
+    """Tile based mesh creation/UV layout tool"""
+    bl_idname = "sprytile.modal_tool"
+    bl_label = "Sprytile Paint"
+    bl_options = {'REGISTER'}
+
+    no_undo = False
+
+    addon_keymaps = []
+    default_keymaps = []
+    tool_keymaps = { 
+        'MAKE_FACE' : "Sprytile Build Tool Map", 
+        'PAINT' : "Sprytile Paint Tool Map", 
+        'FILL' : "Sprytile Fill Tool Map"
+        }
+
     def modal(self, context, event):
+        # A tool is running a job in time slices, it gets all events until done
+        if self.job_runner.is_running:
+            return self.handle_job(context, event)
+
         do_exit = False
         sprytile_data = context.scene.sprytile_data
 
@@ -671,47 +932,79 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
         region = context.region
         rv3d = context.region_data
         coord = event.mouse_region_x, event.mouse_region_y
-        no_data = self.tree is None or rv3d is None
+        no_data = not self.has_mesh or rv3d is None
 
         if no_data is False:
             # get the ray from the viewport and mouse
+            stat_start = sprytile_stats.begin()
             ray_vector = view3d_utils.region_2d_to_vector_3d(region, rv3d, coord)
             ray_origin = view3d_utils.region_2d_to_origin_3d(region, rv3d, coord)
-            self.rx_data = DataObjectDict(
-                context=context,
-                ray_vector=ray_vector,
-                ray_origin=ray_origin
-            )
+            sprytile_stats.end("ray", stat_start)
+            self.tool_data = ToolData(context, ray_vector, ray_origin)
         else:
-            self.rx_data = None
+            self.tool_data = None
 
         self.call_tool(event, True, context)
+        sprytile_stats.end_event()
 
         return modal_return
 
 
+    def handle_job(self, context, event):
+        """Run the current job for a time slice, or cancel it on ESC"""
+        # Finish the stroke once the job is done
+        if event.type == 'LEFTMOUSE' and event.value == 'RELEASE':
+            self.exit_after_job = True
+
+        if event.type == 'ESC' and event.value == 'PRESS':
+            self.job_runner.cancel(context)
+        else:
+            self.job_runner.step(context)
+
+        if self.job_runner.is_running:
+            return {'RUNNING_MODAL'}
+
+        self.refresh_mesh = True
+        if self.exit_after_job or context.object.mode != 'EDIT':
+            self.exit_modal(event, context)
+            return {'CANCELLED'}
+        return {'RUNNING_MODAL'}
+
     def call_tool(self, event, left_down, context):
-        # Push the event data out through rx_observer for tool observers
+        # Push the event data out through the event bus to the tools
         sprytile_data = bpy.context.scene.sprytile_data
 
-        # If the selected object does not own the painting material, add a slot for it here
         if left_down:
-            grid = sprytile_utils.get_grid(context, context.object.sprytile_gridid)
-            if grid is not None:
-                grid_mat = sprytile_utils.get_grid_material(grid)
-                if not sprytile_utils.has_material(context.object, grid_mat):
-                    bpy.ops.object.material_slot_add()
-                    context.object.active_material = grid_mat
-
-        if self.rx_observer is not None:
-            self.rx_observer.on_next(
-                DataObjectDict(
-                    paint_mode=sprytile_data.paint_mode,
-                    event=event,
-                    left_down=left_down,
-                    build_preview=self.draw_preview,
-                )
+            self.verify_grid_material(context)
+
+        if self.event_bus is None:
+            return
+
+        if recorder.is_recording:
+            recorder.record(sprytile_data.paint_mode, left_down, self.tool_data)
+
+        # Skip mouse moves that queued up behind a slow stroke step, keeping
+        # the last skipped position so the stroke still ends where it should
+        if left_down and event.type == 'MOUSEMOVE' and not self.tool_throttle.is_ready(time.perf_counter()):
+            self.skipped_tool_data = self.tool_data
+            return
+
+        if not left_down and self.skipped_tool_data is not None:
+            tool_data = self.tool_data
+            self.tool_data = self.skipped_tool_data
+            self.event_bus.on_next(
+                ToolEvent(sprytile_data.paint_mode, event, True, self.draw_preview)
             )
+            self.tool_data = tool_data
+        self.skipped_tool_data = None
+
+        self.tool_throttle.begin(time.perf_counter())
+        stat_start = sprytile_stats.begin()
+        self.event_bus.on_next(
+            ToolEvent(sprytile_data.paint_mode, event, left_down, self.draw_preview)
+        )
+        sprytile_stats.end("tool_event", stat_start)
+        self.tool_throttle.end(time.perf_counter())
 
 
     def handle_mouse(self, context, event, draw_preview):
@@ -811,6 +1104,10 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
             self.report({'WARNING'}, "No valid materials")
             return {'CANCELLED'}
 
+        # Chunked tilemaps only edit the chunk the stroke starts in
+        if sprytile_chunks.is_chunked(obj):
+            obj = sprytile_chunks.activate_chunk(context, event, self.raycast_object)
+
         use_default_grid_id = obj.sprytile_gridid == -1
         if sprytile_utils.get_grid(context, obj.sprytile_gridid) is None:
             use_default_grid_id = True
@@ -826,23 +1123,10 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
             if cur_space.shading.type != 'MATERIAL':
                 cur_space.shading.type = 'MATERIAL'
 
-        self.virtual_cursor = deque([], 3)
+        # Face layer indexes are kept in sync while the tool edits the mesh
+        sprytile_bvh.hold(obj.data)
         VIEW3D_OP_SprytileModalTool.no_undo = False
-        self.update_bmesh_tree(context)
-        self.refresh_mesh = False
-
-        # Setup Rx Observer and Observables
-        self.rx_observer = None
-        observable_source = Observable.create(self.setup_rx_observer)
-        # Setup multi casting Observable
-        self.rx_source = observable_source.publish().auto_connect(1)
-
-        # Tools receive events from the Observable
-        self.tools = {
-            "build": ToolBuild(self, self.rx_source),
-            "paint": ToolPaint(self, self.rx_source),
-            "fill": ToolFill(self, self.rx_source)
-        }
+        self.setup_tools(context, addon_prefs.stroke_sample_interval / 1000)
 
         win_mgr = context.window_manager
 
@@ -863,13 +1147,18 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
                 sprytile_data.lock_normal = False
 
         self.update_bmesh_tree(context, True)
+
+        sprytile_journal.configure(addon_prefs.use_stroke_journal, addon_prefs.stroke_journal_memory)
+        sprytile_stats.configure(addon_prefs.use_timing_stats)
+        sprytile_journal.begin_stroke(obj.data, self.bmesh)
+        sprytile_profile.begin_stroke(context)
+        if recorder.is_recording:
+            recorder.begin_stroke(context)
+
         self.modal(context, event)
 
         return {'RUNNING_MODAL'}
 
-    def setup_rx_observer(self, observer):
-        self.rx_observer = observer
-
     def setup_user_keys(self, context):
         """Find the keymaps to pass through to Blender"""
         self.is_keyboard_list = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q',
@@ -922,12 +1211,18 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
 
     def exit_modal(self, event, context):
         self.call_tool(event, False, context)
-        if self.rx_observer is not None:
-            self.rx_observer.on_completed()
-        self.tree = None
+        recorder.end_stroke()
+        if self.event_bus is not None:
+            self.event_bus.on_completed()
+        sprytile_bvh.release(context.object.data)
+        self.has_mesh = False
         self.tools = None
         if context.object.mode == 'EDIT':
+            stat_start = sprytile_stats.begin()
             bmesh.update_edit_mesh(context.object.data, True, True)
+            sprytile_stats.end("update_edit_mesh", stat_start)
+        sprytile_stats.end_stroke()
+        sprytile_profile.end_stroke(context)
 
 
 # module classes
@@ -204,13 +204,22 @@ class VIEW3D_PT_SprytilePanel(bpy.types.Panel):
         if sprytile_data.paint_mode == 'FILL':
             row.separator()
             row.prop(sprytile_data, "auto_merge", toggle=True, text="", icon="AUTOMERGE_{0}".format("ON" if sprytile_data.auto_merge else "OFF"))
+            if sprytile_data.auto_merge:
+                row.prop(sprytile_data, "merge_at_stroke_end", toggle=True, text="", icon="TIME")
+            row.prop(sprytile_data, "trim_alpha", toggle=True, text="", icon="IMAGE_ALPHA")
 
         if sprytile_data.paint_mode == 'MAKE_FACE':
             # row = layout.row(align=True)
             row.separator()
             row.prop(sprytile_data, "auto_merge", toggle=True, text="", icon="AUTOMERGE_{0}".format("ON" if sprytile_data.auto_merge else "OFF"))
+            if sprytile_data.auto_merge:
+                row.prop(sprytile_data, "merge_at_stroke_end", toggle=True, text="", icon="TIME")
             row.prop(sprytile_data, "auto_join", toggle=True, text="", icon="MESH_GRID")
+            row.prop(sprytile_data, "trim_alpha", toggle=True, text="", icon="IMAGE_ALPHA")
+            row.prop(sprytile_data, "build_cutout", toggle=True, text="", icon="MOD_MASK")
             row.prop(sprytile_data, "allow_backface", toggle=True, text="", icon="NORMALS_FACE")
+            if sprytile_data.build_cutout:
+                layout.prop(sprytile_data, "cutout_budget")
 
         if sprytile_data.paint_mode == 'PAINT':
             row.separator()
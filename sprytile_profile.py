@@ -0,0 +1,257 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import re
+import tempfile
+import time
+import tracemalloc
+
+import bmesh
+import bpy
+
+from sprytile_tools import tool_recorder
+
+# Set by the add-on on register, to look up its preferences
+addon_name = None
+
+REPORT_LINES = 40
+
+
+def get_prefs(context):
+    if addon_name is None:
+        return None
+    addon = context.preferences.addons.get(addon_name)
+    return addon.preferences if addon is not None else None
+
+
+def get_output_dir(prefs):
+    folder = bpy.path.abspath(prefs.profile_capture_dir) if prefs.profile_capture_dir else ""
+    if folder == "":
+        folder = os.path.join(tempfile.gettempdir(), "sprytile_profiles")
+    return folder
+
+
+def get_face_count(obj):
+    if obj is None or obj.type != 'MESH':
+        return 0
+    if obj.mode == 'EDIT':
+        return len(bmesh.from_edit_mesh(obj.data).faces)
+    return len(obj.data.polygons)
+
+
+def describe_context(context):
+    """Mesh size and tool settings, to tag a capture with"""
+    obj = context.object
+    info = {
+        "blender": bpy.app.version_string,
+        "file": os.path.basename(bpy.data.filepath),
+        "object": obj.name if obj is not None else None,
+        "faces": get_face_count(obj),
+    }
+    if obj is not None and obj.type == 'MESH' and hasattr(context.scene, "sprytile_data"):
+        info["paint_mode"] = context.scene.sprytile_data.paint_mode
+        info.update(tool_recorder.capture_settings(context))
+    return info
+
+
+class ProfileCapture:
+    """
+    Profiles the next Sprytile operator runs or tool strokes, while the
+    capture preference is on. Each capture writes a cProfile .prof file
+    and a text report of the hottest functions and, optionally, the top
+    allocations made during the capture. Captures don't nest, an operator
+    called inside a captured stroke is part of the stroke's profile.
+    """
+    def __init__(self):
+        self.remaining = 0
+        self.profiler = None
+        self.label = None
+        self.info = None
+        self.start_time = 0.0
+        self.trace_memory = False
+
+    @property
+    def is_capturing(self):
+        return self.profiler is not None
+
+    def begin(self, context, label):
+        """
+        Start a capture if the preference asks for one
+        :return: True if a capture was started
+        """
+        if self.profiler is not None:
+            return False
+        prefs = get_prefs(context)
+        if prefs is None or not prefs.use_profile_capture:
+            self.remaining = 0
+            return False
+        if self.remaining <= 0:
+            self.remaining = prefs.profile_capture_count
+
+        self.label = label
+        self.info = describe_context(context)
+        # Someone else may already be tracing, leave their trace running
+        self.trace_memory = prefs.profile_trace_memory and not tracemalloc.is_tracing()
+        if self.trace_memory:
+            tracemalloc.start(10)
+        self.start_time = time.perf_counter()
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+        return True
+
+    def end(self, context):
+        """Stop the current capture and write its files"""
+        if self.profiler is None:
+            return None
+        self.profiler.disable()
+        duration = time.perf_counter() - self.start_time
+        snapshot = None
+        peak = 0
+        if self.trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        self.info["seconds"] = duration
+        self.info["faces_after"] = get_face_count(context.object)
+        if snapshot is not None:
+            self.info["peak_traced_bytes"] = peak
+
+        prefs = get_prefs(context)
+        filepath = None
+        try:
+            filepath = self.write(get_output_dir(prefs), snapshot)
+            print("Sprytile profile saved to", filepath)
+        except OSError as err:
+            print("Sprytile could not save profile:", err)
+
+        self.profiler = None
+        self.remaining -= 1
+        # Captured all that were asked for, turn capturing back off
+        if self.remaining <= 0 and prefs is not None:
+            prefs.use_profile_capture = False
+        return filepath
+
+    def write(self, folder, snapshot):
+        os.makedirs(folder, exist_ok=True)
+        name = "{0}_{1}".format(time.strftime("%Y%m%d_%H%M%S"), re.sub(r"[^\w]+", "_", self.label))
+        if self.info.get("object"):
+            name += "_{0}f".format(self.info["faces"])
+        base = os.path.join(folder, name)
+        # Several captures in the same second
+        suffix = 1
+        while os.path.exists(base + ".prof"):
+            suffix += 1
+            base = os.path.join(folder, "{0}_{1}".format(name, suffix))
+
+        self.profiler.dump_stats(base + ".prof")
+
+        report = io.StringIO()
+        report.write("Sprytile profile: {0}\n".format(self.label))
+        report.write(json.dumps(self.info, indent=2, default=str))
+        report.write("\n\nHottest functions, by cumulative time:\n")
+        stats = pstats.Stats(self.profiler, stream=report)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_LINES)
+        if snapshot is not None:
+            report.write("Top allocations still held at the end, by line:\n")
+            snapshot = snapshot.filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, cProfile.__file__),
+                tracemalloc.Filter(False, __file__),
+            ))
+            for stat in snapshot.statistics('lineno')[:REPORT_LINES]:
+                report.write("{0}\n".format(stat))
+        with open(base + ".txt", "w") as f:
+            f.write(report.getvalue())
+        return base + ".prof"
+
+
+capture = ProfileCapture()
+
+
+def begin_stroke(context):
+    return capture.begin(context, "stroke_" + context.scene.sprytile_data.paint_mode.lower())
+
+
+def end_stroke(context):
+    capture.end(context)
+
+
+def profile_call(func, label, self, context, *args):
+    if not capture.begin(context, label):
+        return func(self, context, *args)
+    try:
+        return func(self, context, *args)
+    finally:
+        capture.end(context)
+
+
+# Blender checks the argument count of operator methods, so the wrappers match it exactly
+def profiled_execute(func, label):
+    @functools.wraps(func)
+    def execute(self, context):
+        return profile_call(func, label, self, context)
+    return execute
+
+
+def profiled_invoke(func, label):
+    @functools.wraps(func)
+    def invoke(self, context, event):
+        return profile_call(func, label, self, context, event)
+    return invoke
+
+
+def wrap_operators(classes):
+    """
+    Route the invoke and execute of Sprytile's operators through the capture.
+    Modal operators are left alone, the modal tool captures whole strokes itself.
+    Must run before the classes are registered.
+    """
+    for cl in classes:
+        if not issubclass(cl, bpy.types.Operator) or hasattr(cl, "modal"):
+            continue
+        if not cl.bl_idname.startswith("sprytile.") or cl.__dict__.get("_sprytile_profiled"):
+            continue
+        if cl.__module__ == __name__:
+            continue
+        if "invoke" in cl.__dict__:
+            cl.invoke = profiled_invoke(cl.invoke, cl.bl_idname)
+        if "execute" in cl.__dict__:
+            cl.execute = profiled_execute(cl.execute, cl.bl_idname)
+        cl._sprytile_profiled = True
+
+
+class UTIL_OP_SprytileProfileOpenFolder(bpy.types.Operator):
+    bl_idname = "sprytile.profile_open_folder"
+    bl_label = "Open Profiles Folder"
+    bl_description = "Open the folder Sprytile profile captures are saved to"
+
+    def execute(self, context):
+        folder = get_output_dir(get_prefs(context))
+        os.makedirs(folder, exist_ok=True)
+        bpy.ops.wm.path_open(filepath=folder)
+        return {'FINISHED'}
+
+
+# module classes
+classes = (
+    UTIL_OP_SprytileProfileOpenFolder,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+
+
+def unregister():
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
+    if capture.is_capturing:
+        capture.profiler.disable()
+        capture.profiler = None
+        if capture.trace_memory:
+            tracemalloc.stop()
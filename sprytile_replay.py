@@ -0,0 +1,225 @@
+import time
+
+import bmesh
+import bpy
+from bpy_extras.io_utils import ExportHelper, ImportHelper
+from mathutils import Vector
+
+import sprytile_bvh
+import sprytile_utils
+from sprytile_modal import SprytileToolHost
+from sprytile_tools.tool_events import ToolData, ToolEvent
+from sprytile_tools.tool_recorder import PAINT_MODES, apply_settings, load_strokes, recorder
+from sprytile_jobs import MeshSnapshot
+
+
+class StageTimes:
+    """Durations of each stage of a replay, in seconds"""
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, duration):
+        self.stages.setdefault(stage, []).append(duration)
+
+    def summary(self):
+        """
+        :return: dict of stage -> dict of count, total, mean and max milliseconds
+        """
+        summary = {}
+        for stage, durations in self.stages.items():
+            total = sum(durations)
+            summary[stage] = {
+                "count": len(durations),
+                "total_ms": total * 1000,
+                "mean_ms": total * 1000 / len(durations),
+                "max_ms": max(durations) * 1000,
+            }
+        return summary
+
+
+class StrokeReplay(SprytileToolHost):
+    """
+    Replays recorded strokes through the tools against the active edit mesh,
+    without a viewport. Every recorded event is dispatched, without dropping
+    stale mouse moves, so replays of the same strokes on the same mesh always
+    do the same work. Spatial indexes start cold for each replay.
+    """
+    def __init__(self):
+        self.times = StageTimes()
+
+    def timed(self, stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.times.add(stage, time.perf_counter() - start)
+        return result
+
+    def replay(self, context, strokes):
+        """
+        :return: StageTimes of the replay
+        """
+        mesh = context.object.data
+        sprytile_bvh.invalidate(mesh)
+        sprytile_bvh.hold(mesh)
+        try:
+            for stroke in strokes:
+                self.replay_stroke(context, stroke)
+        finally:
+            sprytile_bvh.release(mesh)
+        return self.times
+
+    def replay_stroke(self, context, stroke):
+        stroke_start = time.perf_counter()
+
+        self.timed("settings", apply_settings, context, stroke)
+        self.timed("setup", self.setup_tools, context)
+        self.timed("bmesh_layers", self.update_bmesh_tree, context, True)
+        self.verify_grid_material(context)
+
+        sprytile_data = context.scene.sprytile_data
+        tool_event = None
+        for row in stroke["events"]:
+            paint_mode = PAINT_MODES[row[0]]
+            if sprytile_data.paint_mode != paint_mode:
+                sprytile_data.paint_mode = paint_mode
+            self.tool_data = ToolData(context, Vector(row[5:8]), Vector(row[2:5]))
+            tool_event = ToolEvent(paint_mode, None, row[1] == 1, False)
+            # Stroke ends are where the tools push the undo step
+            self.timed("tool_event" if tool_event.left_down else "stroke_end", self.event_bus.on_next, tool_event)
+            if self.job_runner.is_running:
+                self.timed("job", self.run_job, context)
+
+        # Recording stopped before the stroke ended
+        if tool_event is not None and tool_event.left_down:
+            tool_event = ToolEvent(tool_event.paint_mode, None, False, False)
+            self.timed("stroke_end", self.event_bus.on_next, tool_event)
+        self.event_bus.on_completed()
+        self.timed("mesh_update", bmesh.update_edit_mesh, context.object.data, True, True)
+        self.tools = None
+        self.times.add("stroke", time.perf_counter() - stroke_start)
+
+    def run_job(self, context):
+        while self.job_runner.is_running:
+            self.job_runner.step(context)
+        self.refresh_mesh = False
+        self.update_bmesh_tree(context, True)
+
+
+def replay_file(context, filepath, repeat=1):
+    """
+    Replay a stroke file against the active edit mesh
+    :param context:
+    :param filepath: Stroke file written by the recorder
+    :param repeat: Number of times to replay the strokes, from the same starting mesh
+    :return: Summary of the stage timings
+    """
+    strokes = load_strokes(filepath)
+    replay = StrokeReplay()
+    for i in range(repeat):
+        snapshot = MeshSnapshot(context.object) if i + 1 < repeat else None
+        replay.replay(context, strokes)
+        if snapshot is not None:
+            snapshot.restore(context)
+    return replay.times.summary()
+
+
+def format_summary(summary):
+    lines = []
+    for stage, stats in summary.items():
+        lines.append("{0:<14}{1:>8} {2:>12.2f} ms total {3:>10.3f} ms mean {4:>10.3f} ms max".format(
+            stage, stats["count"], stats["total_ms"], stats["mean_ms"], stats["max_ms"]))
+    return "\n".join(lines)
+
+
+class UTIL_OP_SprytileRecordStrokes(bpy.types.Operator, ExportHelper):
+    bl_idname = "sprytile.record_strokes"
+    bl_label = "Record Strokes"
+    bl_description = "Start recording Sprytile tool strokes to a file for replaying, or stop recording"
+
+    filename_ext = ".strokes"
+    filter_glob: bpy.props.StringProperty(
+        default="*.strokes",
+        options={'HIDDEN'},
+    )
+
+    def invoke(self, context, event):
+        if recorder.is_recording:
+            return self.execute(context)
+        return ExportHelper.invoke(self, context, event)
+
+    def execute(self, context):
+        if recorder.is_recording:
+            filepath = recorder.filepath
+            stroke_count = recorder.stop()
+            self.report({'INFO'}, "Saved {0} strokes to {1}".format(stroke_count, filepath))
+            return {'FINISHED'}
+        recorder.start(self.filepath)
+        self.report({'INFO'}, "Recording strokes")
+        return {'FINISHED'}
+
+
+class UTIL_OP_SprytileReplayStrokes(bpy.types.Operator, ImportHelper):
+    bl_idname = "sprytile.replay_strokes"
+    bl_label = "Replay Strokes"
+    bl_description = "Replay recorded Sprytile strokes on the active mesh and report the time of each stage"
+
+    filename_ext = ".strokes"
+    filter_glob: bpy.props.StringProperty(
+        default="*.strokes",
+        options={'HIDDEN'},
+    )
+    repeat: bpy.props.IntProperty(
+        name="Repeat",
+        description="Number of times to replay the strokes",
+        default=1,
+        min=1
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.object is not None and context.object.type == 'MESH' and context.object.mode == 'EDIT'
+
+    def execute(self, context):
+        try:
+            summary = replay_file(context, self.filepath, self.repeat)
+        except (OSError, ValueError, KeyError) as err:
+            self.report({'ERROR'}, "Could not replay {0}: {1}".format(self.filepath, err))
+            return {'CANCELLED'}
+        print(format_summary(summary))
+        stroke_stats = summary.get("stroke")
+        if stroke_stats is not None:
+            self.report({'INFO'}, "Replayed {0} strokes in {1:.1f} ms, see the console for stage times".format(
+                stroke_stats["count"], stroke_stats["total_ms"]))
+        return {'FINISHED'}
+
+
+def draw_replay_menu(self, context):
+    layout = self.layout
+    layout.separator()
+    text = "Stop Recording Strokes" if recorder.is_recording else "Record Strokes"
+    layout.operator("sprytile.record_strokes", text=text)
+    layout.operator("sprytile.replay_strokes")
+
+
+# module classes
+classes = (
+    UTIL_OP_SprytileRecordStrokes,
+    UTIL_OP_SprytileReplayStrokes,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.append(draw_replay_menu)
+
+
+def unregister():
+    sprytile_utils.VIEW3D_MT_SprytileWorkDropDown.remove(draw_replay_menu)
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
+    if recorder.is_recording:
+        recorder.stop()
+
+
+if __name__ == '__main__':
+    register()
@@ -0,0 +1,213 @@
+import csv
+import time
+from collections import deque
+
+import bpy
+from bpy_extras.io_utils import ExportHelper
+
+
+class RollingStat:
+    """The last samples of a value, for percentiles, and lifetime totals"""
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentiles(self, *percents):
+        """Nearest rank percentiles of the samples in the window"""
+        if len(self.samples) == 0:
+            return [0.0] * len(percents)
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return [ordered[min(last, int(round(p / 100 * last)))] for p in percents]
+
+    def summary(self):
+        """
+        :return: tuple of lifetime count and mean, then p50, p90, p99 and max of the window
+        """
+        mean = self.total / self.count if self.count > 0 else 0.0
+        p50, p90, p99 = self.percentiles(50, 90, 99)
+        peak = max(self.samples) if len(self.samples) > 0 else 0.0
+        return self.count, mean, p50, p90, p99, peak
+
+
+class StageStats:
+    """
+    Timings of the hot stages of the tools, and counters of expensive calls.
+
+    Stages are timed with begin and end. Times include any nested stage,
+    e.g. construct_face includes its raycasts. Counters are aggregated per
+    modal event and per stroke, so rates like raycasts per event can be
+    seen, as well as lifetime totals. Everything is a no-op when disabled.
+    """
+    def __init__(self, window=256):
+        self.enabled = False
+        self.window = window
+        # Stage name -> RollingStat of seconds
+        self.stages = {}
+        # Counter name -> lifetime total
+        self.counters = {}
+        # Counter name -> RollingStat of counts per event, and per stroke
+        self.per_event = {}
+        self.per_stroke = {}
+        self.event_counts = {}
+        self.stroke_counts = {}
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+        self.per_event = {}
+        self.per_stroke = {}
+        self.event_counts = {}
+        self.stroke_counts = {}
+
+    def begin(self):
+        if not self.enabled:
+            return None
+        return time.perf_counter()
+
+    def end(self, stage, start):
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        stat = self.stages.get(stage)
+        if stat is None:
+            stat = self.stages[stage] = RollingStat(self.window)
+        stat.add(duration)
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + amount
+        self.event_counts[name] = self.event_counts.get(name, 0) + amount
+        self.stroke_counts[name] = self.stroke_counts.get(name, 0) + amount
+
+    def end_event(self):
+        if not self.enabled:
+            return
+        self.push_counts(self.per_event, self.event_counts)
+        self.event_counts = {}
+
+    def end_stroke(self):
+        if not self.enabled:
+            return
+        self.push_counts(self.per_stroke, self.stroke_counts)
+        self.stroke_counts = {}
+
+    def push_counts(self, rolling, counts):
+        # Events without a call count as zero
+        for name in self.counters:
+            stat = rolling.get(name)
+            if stat is None:
+                stat = rolling[name] = RollingStat(self.window)
+            stat.add(counts.get(name, 0))
+
+    def rows(self):
+        """
+        :return: list of (kind, name, count, mean, p50, p90, p99, max), stage times in milliseconds
+        """
+        rows = []
+        for name in sorted(self.stages):
+            count, mean, p50, p90, p99, peak = self.stages[name].summary()
+            rows.append(("stage_ms", name, count, mean * 1000, p50 * 1000, p90 * 1000, p99 * 1000, peak * 1000))
+        for kind, rolling in (("per_event", self.per_event), ("per_stroke", self.per_stroke)):
+            for name in sorted(rolling):
+                rows.append((kind, name) + rolling[name].summary())
+        for name in sorted(self.counters):
+            rows.append(("total", name, self.counters[name], 0.0, 0.0, 0.0, 0.0, 0.0))
+        return rows
+
+    def write_csv(self, filepath):
+        with open(filepath, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(("kind", "name", "count", "mean", "p50", "p90", "p99", "max"))
+            for row in self.rows():
+                writer.writerow(row[:3] + tuple("{0:.4f}".format(v) for v in row[3:]))
+
+
+stats = StageStats()
+
+
+def configure(enabled):
+    stats.enabled = enabled
+
+
+def begin():
+    """Start timing a stage, pass the result to end"""
+    return stats.begin()
+
+
+def end(stage, start):
+    stats.end(stage, start)
+
+
+def count(name, amount=1):
+    stats.count(name, amount)
+
+
+def end_event():
+    stats.end_event()
+
+
+def end_stroke():
+    stats.end_stroke()
+
+
+class UTIL_OP_SprytileStatsExport(bpy.types.Operator, ExportHelper):
+    bl_idname = "sprytile.stats_export"
+    bl_label = "Export Timing Stats"
+    bl_description = "Save the Sprytile timing stats as CSV, to send along with performance reports"
+
+    filename_ext = ".csv"
+    filter_glob: bpy.props.StringProperty(
+        default="*.csv",
+        options={'HIDDEN'},
+    )
+
+    def execute(self, context):
+        try:
+            stats.write_csv(self.filepath)
+        except OSError as err:
+            self.report({'ERROR'}, "Could not write {0}: {1}".format(self.filepath, err))
+            return {'CANCELLED'}
+        self.report({'INFO'}, "Saved timing stats to {0}".format(self.filepath))
+        return {'FINISHED'}
+
+
+class UTIL_OP_SprytileStatsReset(bpy.types.Operator):
+    bl_idname = "sprytile.stats_reset"
+    bl_label = "Reset Timing Stats"
+    bl_description = "Clear the Sprytile timing stats"
+
+    def execute(self, context):
+        stats.reset()
+        return {'FINISHED'}
+
+
+# module classes
+classes = (
+    UTIL_OP_SprytileStatsExport,
+    UTIL_OP_SprytileStatsReset,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+
+
+def unregister():
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
+    stats.reset()
+
+
+if __name__ == '__main__':
+    register()
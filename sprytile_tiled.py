@@ -0,0 +1,595 @@
+import base64
+import json
+import os
+import zlib
+import xml.etree.ElementTree as ElementTree
+
+import bpy
+import numpy
+from bpy_extras.io_utils import ImportHelper
+
+import sprytile_stats
+import sprytile_utils
+from sprytile_uv import UvDataLayers
+
+# Flip flags in the high bits of Tiled's global tile IDs
+FLIP_H = 0x80000000
+FLIP_V = 0x40000000
+FLIP_D = 0x20000000
+GID_MASK = 0x0FFFFFFF
+
+# Face corners are built bottom left, bottom right, top right, top left.
+# Each flip swaps which corner of the tile image a face corner shows
+CORNERS_FLIP_H = (1, 0, 3, 2)
+CORNERS_FLIP_V = (3, 2, 1, 0)
+CORNERS_FLIP_D = (2, 1, 0, 3)
+
+
+def get_flip_table():
+    """
+    Corner order of the tile image for each combination of flip flags,
+    indexed by D << 2 | H << 1 | V. Tiled flips diagonally first, then
+    horizontally and vertically, so the corner lookups run the other way
+    """
+    table = numpy.zeros((8, 4), dtype=numpy.int64)
+    for code in range(8):
+        for corner in range(4):
+            idx = corner
+            if code & 1:
+                idx = CORNERS_FLIP_V[idx]
+            if code & 2:
+                idx = CORNERS_FLIP_H[idx]
+            if code & 4:
+                idx = CORNERS_FLIP_D[idx]
+            table[code, corner] = idx
+    return table
+
+
+FLIP_TABLE = get_flip_table()
+
+# Closest Sprytile paint rotation and flips for each combination of flip flags,
+# as (rotation, flip x, flip y), rotation encoded as in sprytile_utils.get_paint_settings
+FLIP_PAINT_SETTINGS = (
+    (0, 0, 0), (0, 0, 1), (0, 1, 0), (2, 0, 0),
+    (3, 1, 0), (3, 0, 0), (1, 0, 0), (1, 1, 0),
+)
+# Paint settings of a face made by the build tool, center aligned with all toggles on
+BUILD_PAINT_SETTINGS = 5 | 0xF0
+
+
+class TiledTileset:
+    """A Tiled tileset made from one image, laid out in rows of tiles"""
+    def __init__(self, firstgid, name, tile_size, spacing, margin, columns, tile_count, image_path, image_size):
+        self.firstgid = firstgid
+        self.name = name
+        self.tile_size = tuple(tile_size)
+        self.spacing = spacing
+        self.margin = margin
+        self.columns = columns
+        self.tile_count = tile_count
+        self.image_path = image_path
+        self.image_size = tuple(image_size)
+
+    @property
+    def rows(self):
+        """Rows of tiles that fit on the image"""
+        return max(1, (self.image_size[1] - self.margin * 2 + self.spacing) // (self.tile_size[1] + self.spacing))
+
+    def get_grid_layout(self):
+        """
+        The Sprytile grid matching the tileset. Sprytile counts tile rows from
+        the bottom of the image and puts spacing on the right and bottom
+        :return: grid, margin, offset
+        """
+        offset_y = self.image_size[1] - self.margin - self.tile_size[1] - \
+            (self.rows - 1) * (self.tile_size[1] + self.spacing)
+        return (self.tile_size,
+                (0, self.spacing, self.spacing, 0),
+                (self.margin, max(0, offset_y)))
+
+
+class TiledLayer:
+    """
+    A tile layer as an (height, width) array of global tile IDs, with rows
+    from the top like Tiled. Origin is the cell of the first entry, which
+    is only away from zero for infinite maps
+    """
+    def __init__(self, name, gids, origin, offset):
+        self.name = name
+        self.gids = gids
+        self.origin = tuple(origin)
+        self.offset = tuple(offset)
+
+
+class TiledMap:
+    def __init__(self, size, tile_size, tilesets, layers):
+        self.size = tuple(size)
+        self.tile_size = tuple(tile_size)
+        self.tilesets = sorted(tilesets, key=lambda tileset: tileset.firstgid)
+        self.layers = layers
+
+
+def decode_data(data, encoding, compression, count):
+    """
+    Decode the tile IDs of a layer or chunk
+    :param data: CSV or base64 text, or a list of IDs
+    :return: array of count uint32 global tile IDs
+    """
+    if isinstance(data, list):
+        gids = numpy.array(data, dtype=numpy.int64).astype(numpy.uint32)
+    elif encoding == 'csv':
+        gids = numpy.fromstring(data, dtype=numpy.int64, sep=',').astype(numpy.uint32)
+    elif encoding == 'base64':
+        raw = base64.b64decode(data.strip())
+        if compression == 'zlib':
+            raw = zlib.decompress(raw)
+        elif compression == 'gzip':
+            raw = zlib.decompress(raw, 16 + zlib.MAX_WBITS)
+        elif compression:
+            raise ValueError("Unsupported layer compression: {0}".format(compression))
+        gids = numpy.frombuffer(raw, dtype='<u4').astype(numpy.uint32)
+    else:
+        raise ValueError("Unsupported layer encoding: {0}".format(encoding))
+    if len(gids) != count:
+        raise ValueError("Expected {0} tiles in layer data, found {1}".format(count, len(gids)))
+    return gids
+
+
+def assemble_chunks(chunks):
+    """
+    Join the chunks of an infinite map layer into one array
+    :param chunks: list of ((x, y), (width, height), gids)
+    :return: gids array and the cell of its first entry
+    """
+    min_x = min(pos[0] for pos, size, gids in chunks)
+    min_y = min(pos[1] for pos, size, gids in chunks)
+    max_x = max(pos[0] + size[0] for pos, size, gids in chunks)
+    max_y = max(pos[1] + size[1] for pos, size, gids in chunks)
+    layer = numpy.zeros((max_y - min_y, max_x - min_x), dtype=numpy.uint32)
+    for pos, size, gids in chunks:
+        x, y = pos[0] - min_x, pos[1] - min_y
+        layer[y:y + size[1], x:x + size[0]] = gids.reshape(size[1], size[0])
+    return layer, (min_x, min_y)
+
+
+def parse_tileset_xml(node, firstgid, base_dir):
+    """TiledTileset from a <tileset> element, None if it isn't made from a single image"""
+    image = node.find('image')
+    if image is None:
+        return None
+    tile_size = (int(node.get('tilewidth')), int(node.get('tileheight')))
+    spacing = int(node.get('spacing', 0))
+    margin = int(node.get('margin', 0))
+    image_size = (int(image.get('width', 0)), int(image.get('height', 0)))
+    columns = int(node.get('columns', 0)) or \
+        max(1, (image_size[0] - margin * 2 + spacing) // (tile_size[0] + spacing))
+    return TiledTileset(firstgid, node.get('name', ''), tile_size, spacing, margin, columns,
+                        int(node.get('tilecount', 0)), os.path.join(base_dir, image.get('source')), image_size)
+
+
+def parse_tileset_json(data, firstgid, base_dir):
+    """TiledTileset from a JSON tileset, None if it isn't made from a single image"""
+    if 'image' not in data:
+        return None
+    tile_size = (int(data['tilewidth']), int(data['tileheight']))
+    spacing = int(data.get('spacing', 0))
+    margin = int(data.get('margin', 0))
+    image_size = (int(data.get('imagewidth', 0)), int(data.get('imageheight', 0)))
+    columns = int(data.get('columns', 0)) or \
+        max(1, (image_size[0] - margin * 2 + spacing) // (tile_size[0] + spacing))
+    return TiledTileset(firstgid, data.get('name', ''), tile_size, spacing, margin, columns,
+                        int(data.get('tilecount', 0)), os.path.join(base_dir, data['image']), image_size)
+
+
+def read_external_tileset(path, firstgid):
+    """Tilesets saved in their own .tsx or .tsj file"""
+    base_dir = os.path.dirname(path)
+    if path.lower().endswith('.tsx'):
+        return parse_tileset_xml(ElementTree.parse(path).getroot(), firstgid, base_dir)
+    with open(path, 'r', encoding='utf-8') as file:
+        return parse_tileset_json(json.load(file), firstgid, base_dir)
+
+
+def iter_layers_xml(node, offset=(0.0, 0.0)):
+    """Visible tile layers, going into groups, with their offsets added up"""
+    for child in node:
+        if child.get('visible', '1') == '0':
+            continue
+        child_offset = (offset[0] + float(child.get('offsetx', 0)), offset[1] + float(child.get('offsety', 0)))
+        if child.tag == 'group':
+            yield from iter_layers_xml(child, child_offset)
+        elif child.tag == 'layer':
+            yield child, child_offset
+
+
+def read_tmx(filepath):
+    root = ElementTree.parse(filepath).getroot()
+    base_dir = os.path.dirname(filepath)
+    if root.get('orientation', 'orthogonal') != 'orthogonal':
+        raise ValueError("Only orthogonal maps can be imported")
+
+    tilesets = []
+    for node in root.findall('tileset'):
+        firstgid = int(node.get('firstgid'))
+        if node.get('source') is not None:
+            tileset = read_external_tileset(os.path.join(base_dir, node.get('source')), firstgid)
+        else:
+            tileset = parse_tileset_xml(node, firstgid, base_dir)
+        if tileset is not None:
+            tilesets.append(tileset)
+
+    layers = []
+    for node, offset in iter_layers_xml(root):
+        data = node.find('data')
+        if data is None:
+            continue
+        encoding = data.get('encoding')
+        compression = data.get('compression')
+        chunk_nodes = data.findall('chunk')
+        if len(chunk_nodes) > 0:
+            chunks = []
+            for chunk in chunk_nodes:
+                size = (int(chunk.get('width')), int(chunk.get('height')))
+                gids = read_tmx_data(chunk, encoding, compression, size[0] * size[1])
+                chunks.append(((int(chunk.get('x')), int(chunk.get('y'))), size, gids))
+            gids, origin = assemble_chunks(chunks)
+        else:
+            size = (int(node.get('width')), int(node.get('height')))
+            gids = read_tmx_data(data, encoding, compression, size[0] * size[1]).reshape(size[1], size[0])
+            origin = (0, 0)
+        layers.append(TiledLayer(node.get('name', ''), gids, origin, offset))
+
+    return TiledMap((int(root.get('width')), int(root.get('height'))),
+                    (int(root.get('tilewidth')), int(root.get('tileheight'))), tilesets, layers)
+
+
+def read_tmx_data(node, encoding, compression, count):
+    if encoding is None:
+        # Unencoded data lists each tile as its own element
+        return decode_data([int(tile.get('gid', 0)) for tile in node.findall('tile')], None, None, count)
+    return decode_data(node.text or '', encoding, compression, count)
+
+
+def iter_layers_json(layers, offset=(0.0, 0.0)):
+    for layer in layers:
+        if not layer.get('visible', True):
+            continue
+        layer_offset = (offset[0] + float(layer.get('offsetx', 0)), offset[1] + float(layer.get('offsety', 0)))
+        if layer.get('type') == 'group':
+            yield from iter_layers_json(layer.get('layers', []), layer_offset)
+        elif layer.get('type') == 'tilelayer':
+            yield layer, layer_offset
+
+
+def read_tiled_json(filepath):
+    with open(filepath, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    base_dir = os.path.dirname(filepath)
+    if data.get('orientation', 'orthogonal') != 'orthogonal':
+        raise ValueError("Only orthogonal maps can be imported")
+
+    tilesets = []
+    for entry in data.get('tilesets', []):
+        firstgid = int(entry['firstgid'])
+        if 'source' in entry:
+            tileset = read_external_tileset(os.path.join(base_dir, entry['source']), firstgid)
+        else:
+            tileset = parse_tileset_json(entry, firstgid, base_dir)
+        if tileset is not None:
+            tilesets.append(tileset)
+
+    layers = []
+    for layer, offset in iter_layers_json(data.get('layers', [])):
+        encoding = layer.get('encoding', 'csv')
+        compression = layer.get('compression')
+        if 'chunks' in layer:
+            chunks = []
+            for chunk in layer['chunks']:
+                size = (int(chunk['width']), int(chunk['height']))
+                gids = decode_data(chunk['data'], encoding, compression, size[0] * size[1])
+                chunks.append(((int(chunk['x']), int(chunk['y'])), size, gids))
+            if len(chunks) == 0:
+                continue
+            gids, origin = assemble_chunks(chunks)
+        else:
+            size = (int(layer['width']), int(layer['height']))
+            gids = decode_data(layer['data'], encoding, compression, size[0] * size[1]).reshape(size[1], size[0])
+            origin = (0, 0)
+        layers.append(TiledLayer(layer.get('name', ''), gids, origin, offset))
+
+    return TiledMap((int(data['width']), int(data['height'])),
+                    (int(data['tilewidth']), int(data['tileheight'])), tilesets, layers)
+
+
+def read_map(filepath):
+    """Read a Tiled map saved as .tmx, or as .tmj or .json"""
+    if filepath.lower().endswith('.tmx'):
+        return read_tmx(filepath)
+    return read_tiled_json(filepath)
+
+
+class LayerFaces:
+    """
+    The faces of a tile layer, as arrays with one entry per face, or per
+    face corner for the verts and UVs. Corners are welded with their
+    neighbours into a shared vertex grid.
+    """
+    def __init__(self, tiled_map, layer, tilesets):
+        gids = layer.gids
+        raw = gids[gids != 0]
+        cell_y, cell_x = numpy.nonzero(gids != 0)
+        gid = raw & GID_MASK
+
+        firstgids = numpy.array([tileset.firstgid for tileset in tilesets], dtype=numpy.int64)
+        tileset_index = numpy.searchsorted(firstgids, gid, side='right') - 1
+        valid = tileset_index >= 0
+        local_id = gid.astype(numpy.int64) - firstgids[numpy.maximum(tileset_index, 0)]
+        tile_counts = numpy.array([tileset.tile_count or tileset.columns * tileset.rows for tileset in tilesets],
+                                  dtype=numpy.int64)
+        valid &= local_id < tile_counts[numpy.maximum(tileset_index, 0)]
+        self.skipped = int((~valid).sum())
+
+        self.tileset_index = tileset_index[valid]
+        self.local_id = local_id[valid]
+        flips = raw[valid]
+        self.flip_code = ((flips & FLIP_D) != 0) * 4 + ((flips & FLIP_H) != 0) * 2 + ((flips & FLIP_V) != 0)
+        cell_x = cell_x[valid] + layer.origin[0]
+        cell_y = cell_y[valid] + layer.origin[1]
+
+        def per_tileset(values):
+            return numpy.array(values, dtype=numpy.int64)[self.tileset_index]
+        tile_w = per_tileset([tileset.tile_size[0] for tileset in tilesets])
+        tile_h = per_tileset([tileset.tile_size[1] for tileset in tilesets])
+
+        # Pixel corners, y up. Tiles larger than the map's cells sit on the bottom left of their cell
+        x0 = cell_x * tiled_map.tile_size[0]
+        y0 = (tiled_map.size[1] - 1 - cell_y) * tiled_map.tile_size[1]
+        corners_x = numpy.stack((x0, x0 + tile_w, x0 + tile_w, x0), axis=1).ravel()
+        corners_y = numpy.stack((y0, y0, y0 + tile_h, y0 + tile_h), axis=1).ravel()
+        if len(corners_x) > 0:
+            span = int(corners_y.max() - corners_y.min()) + 1
+            keys = (corners_x - corners_x.min()) * span + (corners_y - corners_y.min())
+            unique_keys, self.loop_verts = numpy.unique(keys, return_inverse=True)
+            self.verts = numpy.stack((unique_keys // span + corners_x.min(),
+                                      unique_keys % span + corners_y.min()), axis=1).astype(numpy.float64)
+        else:
+            self.loop_verts = numpy.zeros(0, dtype=numpy.int64)
+            self.verts = numpy.zeros((0, 2), dtype=numpy.float64)
+        self.verts += (layer.offset[0], -layer.offset[1])
+
+        # Pixel rect of each tile on its tileset image, rows from the top
+        columns = per_tileset([tileset.columns for tileset in tilesets])
+        margin = per_tileset([tileset.margin for tileset in tilesets])
+        spacing = per_tileset([tileset.spacing for tileset in tilesets])
+        image_w = per_tileset([tileset.image_size[0] for tileset in tilesets]).astype(numpy.float64)
+        image_h = per_tileset([tileset.image_size[1] for tileset in tilesets]).astype(numpy.float64)
+        column = self.local_id % columns
+        row = self.local_id // columns
+        u0 = (margin + column * (tile_w + spacing)) / image_w
+        u1 = u0 + tile_w / image_w
+        v1 = 1.0 - (margin + row * (tile_h + spacing)) / image_h
+        v0 = v1 - tile_h / image_h
+        image_uvs = numpy.stack((numpy.stack((u0, v0), axis=1), numpy.stack((u1, v0), axis=1),
+                                 numpy.stack((u1, v1), axis=1), numpy.stack((u0, v1), axis=1)), axis=1)
+        corner_order = FLIP_TABLE[self.flip_code]
+        self.uvs = image_uvs[numpy.arange(len(image_uvs))[:, None], corner_order]
+
+        # Sprytile's tile coordinates count rows from the bottom of the image
+        rows = per_tileset([tileset.rows for tileset in tilesets])
+        row_size = numpy.ceil(image_w / tile_w).astype(numpy.int64)
+        self.tile_id = (rows - 1 - row) * row_size + column
+
+        paint = numpy.array([BUILD_PAINT_SETTINGS + (rotation << 10) + (flip_x << 9) + (flip_y << 8)
+                             for rotation, flip_x, flip_y in FLIP_PAINT_SETTINGS], dtype=numpy.int64)
+        self.paint_settings = paint[self.flip_code]
+
+    def __len__(self):
+        return len(self.local_id)
+
+
+def get_plane_coords(verts, plane, pixel_unit, depth):
+    """Place pixel positions on the XZ plane facing -Y, or the XY plane facing +Z"""
+    coords = numpy.empty((len(verts), 3), dtype=numpy.float64)
+    coords[:, 0] = verts[:, 0] * pixel_unit
+    if plane == 'XZ':
+        coords[:, 1] = -depth
+        coords[:, 2] = verts[:, 1] * pixel_unit
+    else:
+        coords[:, 1] = verts[:, 1] * pixel_unit
+        coords[:, 2] = depth
+    return coords
+
+
+def build_mesh(name, faces, coords, material_slots):
+    """
+    Create a mesh from layer faces in one pass
+    :param material_slots: array mapping tileset index to material index
+    """
+    face_count = len(faces)
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(coords))
+    mesh.vertices.foreach_set('co', coords.ravel())
+    mesh.loops.add(face_count * 4)
+    mesh.loops.foreach_set('vertex_index', faces.loop_verts.astype(numpy.int32))
+    mesh.polygons.add(face_count)
+    mesh.polygons.foreach_set('loop_start', numpy.arange(0, face_count * 4, 4, dtype=numpy.int32))
+    mesh.polygons.foreach_set('loop_total', numpy.full(face_count, 4, dtype=numpy.int32))
+    mesh.polygons.foreach_set('material_index', material_slots[faces.tileset_index].astype(numpy.int32))
+    mesh.update(calc_edges=True)
+
+    uv_layer = mesh.uv_layers.new()
+    uv_layer.data.foreach_set('uv', faces.uvs.ravel().astype(numpy.float32))
+
+    ones = numpy.ones(face_count, dtype=numpy.int32)
+    values = {
+        UvDataLayers.GRID_TILE_ID: faces.tile_id,
+        UvDataLayers.GRID_SEL_WIDTH: ones,
+        UvDataLayers.GRID_SEL_HEIGHT: ones,
+        UvDataLayers.GRID_SEL_ORIGIN: faces.tile_id,
+        UvDataLayers.PAINT_SETTINGS: faces.paint_settings,
+        UvDataLayers.WORK_LAYER: numpy.zeros(face_count, dtype=numpy.int32),
+    }
+    for layer_name in UvDataLayers.LAYER_NAMES:
+        layer = mesh.polygon_layers_int.new(name=layer_name)
+        if layer_name in values:
+            layer.data.foreach_set('value', values[layer_name].astype(numpy.int32))
+    return mesh
+
+
+def load_tileset_image(tileset):
+    """Load a tileset's image, its actual size replaces the one saved in the map"""
+    image = bpy.data.images.load(tileset.image_path, check_existing=True)
+    if image.size[0] > 0 and image.size[1] > 0:
+        tileset.image_size = tuple(image.size)
+    return image
+
+
+def setup_tileset_material(context, obj, slot, name, image):
+    """Make a Sprytile material showing a tileset's image, on a material slot of obj"""
+    material = bpy.data.materials.new(name)
+    obj.data.materials.append(material)
+    obj.active_material_index = slot
+    bpy.ops.sprytile.material_setup()
+    sprytile_utils.set_material_texture(material, image)
+    sprytile_utils.UTIL_OP_SprytileSetupTexture.setup_tex(context)
+    return material
+
+
+def setup_tileset_grid(context, material, tileset):
+    """Lay out the tile grid Sprytile made for a tileset's material, returns its grid ID"""
+    mat_data = sprytile_utils.get_mat_data(context, material.name)
+    if mat_data is None or len(mat_data.grids) == 0:
+        return -1
+    tile_grid = mat_data.grids[0]
+    grid, margin, offset = tileset.get_grid_layout()
+    tile_grid.grid = grid
+    tile_grid.margin = margin
+    tile_grid.offset = offset
+    return tile_grid.id
+
+
+class UTIL_OP_SprytileImportTiled(bpy.types.Operator, ImportHelper):
+    bl_idname = "sprytile.import_tiled"
+    bl_label = "Import Tiled Map"
+    bl_description = "Build the tile layers of a Tiled map as Sprytile meshes, with a tile grid per tileset"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filter_glob: bpy.props.StringProperty(
+        default="*.tmx;*.tmj;*.json",
+        options={'HIDDEN'},
+    )
+    plane: bpy.props.EnumProperty(
+        name="Plane",
+        description="Plane the map is built on",
+        items=[
+            ('XZ', "Front", "Build on the XZ plane, facing -Y", 1),
+            ('XY', "Top", "Build on the XY plane, facing +Z", 2),
+        ],
+        default='XZ'
+    )
+    layer_spacing: bpy.props.FloatProperty(
+        name="Layer Spacing",
+        description="Distance between the tile layers, later layers are built towards the view",
+        default=0.01,
+        min=0.0
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == 'OBJECT'
+
+    def execute(self, context):
+        stat_start = sprytile_stats.begin()
+        try:
+            tiled_map = read_map(self.filepath)
+        except (OSError, ValueError, KeyError, ElementTree.ParseError, zlib.error) as error:
+            self.report({'ERROR'}, "Couldn't read Tiled map: {0}".format(error))
+            return {'CANCELLED'}
+        if len(tiled_map.tilesets) == 0:
+            self.report({'ERROR'}, "The map has no tilesets made from a single image")
+            return {'CANCELLED'}
+
+        map_name = bpy.path.display_name_from_filepath(self.filepath)
+        tilesets = tiled_map.tilesets
+        try:
+            images = [load_tileset_image(tileset) for tileset in tilesets]
+        except RuntimeError as error:
+            self.report({'ERROR'}, "Couldn't load tileset image: {0}".format(error))
+            return {'CANCELLED'}
+        if any(tileset.image_size[0] <= 0 or tileset.image_size[1] <= 0 for tileset in tilesets):
+            self.report({'ERROR'}, "A tileset image has no size")
+            return {'CANCELLED'}
+        pixel_unit = 1.0 / context.scene.sprytile_data.world_pixels
+        collection = context.view_layer.active_layer_collection.collection
+
+        layer_faces = [LayerFaces(tiled_map, layer, tilesets) for layer in tiled_map.layers]
+        used = sorted(set().union(*(set(numpy.unique(faces.tileset_index).tolist()) for faces in layer_faces)))
+        if len(used) == 0:
+            self.report({'INFO'}, "The map has no tiles to import")
+            return {'CANCELLED'}
+        # Tileset index -> material slot, the same on every layer object
+        material_slots = numpy.zeros(len(tilesets), dtype=numpy.int64)
+        material_slots[used] = numpy.arange(len(used))
+
+        for other in context.selected_objects:
+            other.select_set(False)
+        objects = []
+        for idx, (layer, faces) in enumerate(zip(tiled_map.layers, layer_faces)):
+            if len(faces) == 0:
+                continue
+            name = "{0}_{1}".format(map_name, layer.name) if layer.name else map_name
+            coords = get_plane_coords(faces.verts, self.plane, pixel_unit, idx * self.layer_spacing)
+            obj = bpy.data.objects.new(name, build_mesh(name, faces, coords, material_slots))
+            collection.objects.link(obj)
+            obj.select_set(True)
+            objects.append((obj, faces))
+
+        # Materials are set up on the first object, the others share them
+        first = objects[0][0]
+        context.view_layer.objects.active = first
+        materials = [setup_tileset_material(context, first, slot,
+                                            tilesets[idx].name or images[idx].name, images[idx])
+                     for slot, idx in enumerate(used)]
+        for obj, faces in objects[1:]:
+            for material in materials:
+                obj.data.materials.append(material)
+
+        bpy.ops.sprytile.validate_grids()
+        grid_ids = numpy.full(len(tilesets), -1, dtype=numpy.int64)
+        for material, idx in zip(materials, used):
+            grid_ids[idx] = setup_tileset_grid(context, material, tilesets[idx])
+        for obj, faces in objects:
+            layer = obj.data.polygon_layers_int[UvDataLayers.GRID_INDEX]
+            layer.data.foreach_set('value', grid_ids[faces.tileset_index].astype(numpy.int32))
+            obj.sprytile_gridid = int(grid_ids[used[0]])
+            obj.data.update()
+        bpy.ops.sprytile.build_grid_list()
+
+        face_count = sum(len(faces) for obj, faces in objects)
+        skipped = sum(faces.skipped for faces in layer_faces)
+        sprytile_stats.end("import_tiled", stat_start)
+        self.report({'INFO'}, "Imported {0} tiles on {1} layers{2}".format(
+            face_count, len(objects), ", skipped {0} tiles with unknown tilesets".format(skipped) if skipped else ""))
+        return {'FINISHED'}
+
+
+def draw_import_menu(self, context):
+    self.layout.operator(UTIL_OP_SprytileImportTiled.bl_idname, text="Tiled Map (Sprytile)")
+
+
+# module classes
+classes = (
+    UTIL_OP_SprytileImportTiled,
+)
+
+
+def register():
+    for cl in classes:
+        bpy.utils.register_class(cl)
+    bpy.types.TOPBAR_MT_file_import.append(draw_import_menu)
+
+
+def unregister():
+    bpy.types.TOPBAR_MT_file_import.remove(draw_import_menu)
+    for cl in classes:
+        bpy.utils.unregister_class(cl)
@@ -0,0 +1,309 @@
+import hashlib
+import math
+
+import bpy
+import numpy
+from bpy.app.handlers import persistent
+
+import sprytile_stats
+import sprytile_utils
+
+# Tile alpha states
+TILE_EMPTY = 0
+TILE_PARTIAL = 1
+TILE_OPAQUE = 2
+
+
+class TileAnalysis:
+    """
+    Pixel content of every tile of a tileset image, as laid out by a tile grid.
+    Arrays are indexed [tile_y, tile_x], with tile coordinates counted from
+    the bottom left like the tile selection. Bounds are the [min, max)
+    pixel rect of the tile's visible pixels, relative to the tile's origin.
+    Tiles reaching past the image edge count their missing pixels as empty.
+    """
+    def __init__(self, tile_size, states, bounds, hashes, alpha):
+        self.tile_size = tile_size
+        self.states = states
+        self.bounds = bounds
+        self.hashes = hashes
+        # Alpha bytes of each tile, indexed [tile_y, tile_x, pixel_y, pixel_x]
+        self.alpha = alpha
+
+    @property
+    def tile_count(self):
+        return self.states.shape[1], self.states.shape[0]
+
+    def in_range(self, tile_x, tile_y):
+        return 0 <= tile_x < self.states.shape[1] and 0 <= tile_y < self.states.shape[0]
+
+    def get_state(self, tile_x, tile_y):
+        # Tiles the analysis doesn't cover are left as they are
+        if not self.in_range(tile_x, tile_y):
+            return TILE_PARTIAL
+        return int(self.states[tile_y, tile_x])
+
+    def is_empty(self, tile_x, tile_y):
+        return self.get_state(tile_x, tile_y) == TILE_EMPTY
+
+    def get_bounds(self, tile_x, tile_y):
+        """
+        :return: (min x, min y, max x, max y) of the visible pixels, or None for empty tiles
+        """
+        if not self.in_range(tile_x, tile_y):
+            return 0, 0, self.tile_size[0], self.tile_size[1]
+        if self.states[tile_y, tile_x] == TILE_EMPTY:
+            return None
+        return tuple(int(v) for v in self.bounds[tile_y, tile_x])
+
+    def get_hash(self, tile_x, tile_y):
+        if not self.in_range(tile_x, tile_y):
+            return None
+        return self.hashes[tile_y][tile_x]
+
+    def get_alpha(self, tile_x, tile_y):
+        if not self.in_range(tile_x, tile_y):
+            return None
+        return self.alpha[tile_y, tile_x]
+
+    def is_selection_empty(self, tile_x, tile_y, width, height):
+        """True if every tile of a tile selection is empty"""
+        if width <= 0 or height <= 0:
+            return False
+        if not (self.in_range(tile_x, tile_y) and self.in_range(tile_x + width - 1, tile_y + height - 1)):
+            return False
+        return bool(numpy.all(self.states[tile_y:tile_y + height, tile_x:tile_x + width] == TILE_EMPTY))
+
+
+def get_cell_size(tile_grid):
+    """Pixels from one tile to the next, including padding and margins"""
+    cell_x = tile_grid.grid[0] + tile_grid.padding[0] * 2 + tile_grid.margin[1] + tile_grid.margin[3]
+    cell_y = tile_grid.grid[1] + tile_grid.padding[1] * 2 + tile_grid.margin[0] + tile_grid.margin[2]
+    return cell_x, cell_y
+
+
+def get_tile_origin(tile_grid, tile_x, tile_y):
+    """Pixel position of the bottom left corner of a tile, matching the UV placement of sprytile_uv"""
+    cell_x, cell_y = get_cell_size(tile_grid)
+    return (tile_grid.offset[0] + tile_grid.padding[0] + tile_x * cell_x,
+            tile_grid.offset[1] + tile_grid.padding[1] + tile_y * cell_y)
+
+
+def get_tile_at(tile_grid, pixel_x, pixel_y):
+    """Coordinate of the tile cell a pixel position is in"""
+    cell_x, cell_y = get_cell_size(tile_grid)
+    origin_x, origin_y = get_tile_origin(tile_grid, 0, 0)
+    return int(math.floor((pixel_x - origin_x) / cell_x)), int(math.floor((pixel_y - origin_y) / cell_y))
+
+
+def get_tile_rects(image_size, tile_grid):
+    """
+    Pixel origins of the tile columns and rows
+    :return: numpy arrays of x origins and y origins
+    """
+    cell_x, cell_y = get_cell_size(tile_grid)
+    start_x, start_y = get_tile_origin(tile_grid, 0, 0)
+    count_x = max(0, -(-(image_size[0] - start_x) // cell_x))
+    count_y = max(0, -(-(image_size[1] - start_y) // cell_y))
+    origins_x = start_x + numpy.arange(count_x, dtype=numpy.int64) * cell_x
+    origins_y = start_y + numpy.arange(count_y, dtype=numpy.int64) * cell_y
+    return origins_x, origins_y
+
+
+def read_pixels(image):
+    """Image pixels as an (height, width, 4) array of bytes, read in one call"""
+    width, height = image.size
+    pixels = numpy.empty(width * height * 4, dtype=numpy.float32)
+    image.pixels.foreach_get(pixels)
+    pixels = numpy.clip(pixels * 255.0 + 0.5, 0, 255).astype(numpy.uint8)
+    return pixels.reshape(height, width, 4)
+
+
+def analyze(image, tile_grid):
+    """
+    Split an image by a tile grid and analyze the pixels of each tile
+    :return: TileAnalysis, or None if the image has no pixels or the grid can't be analyzed
+    """
+    width, height = image.size
+    size_x, size_y = tile_grid.grid[0], tile_grid.grid[1]
+    # Rotated grids don't line up with pixel rows
+    if width == 0 or height == 0 or size_x <= 0 or size_y <= 0 or tile_grid.rotate != 0:
+        return None
+    # Single pixel grids would get a tile per pixel
+    if sprytile_utils.grid_is_single_pixel(tile_grid):
+        return None
+
+    stat_start = sprytile_stats.begin()
+    pixels = read_pixels(image)
+    origins_x, origins_y = get_tile_rects((width, height), tile_grid)
+
+    # Gather every tile into a (tiles y, tiles x, size y, size x, 4) array,
+    # pixels outside of the image are transparent
+    cols = origins_x[:, None] + numpy.arange(size_x)
+    rows = origins_y[:, None] + numpy.arange(size_y)
+    valid = ((rows >= 0) & (rows < height))[:, None, :, None] & ((cols >= 0) & (cols < width))[None, :, None, :]
+    tiles = pixels[numpy.clip(rows, 0, height - 1)[:, None, :, None],
+                   numpy.clip(cols, 0, width - 1)[None, :, None, :]]
+    tiles[~valid] = 0
+
+    alpha = tiles[..., 3]
+    visible = alpha > 0
+    states = numpy.full(alpha.shape[:2], TILE_PARTIAL, dtype=numpy.int8)
+    states[~visible.any(axis=(2, 3))] = TILE_EMPTY
+    states[(alpha == 255).all(axis=(2, 3))] = TILE_OPAQUE
+
+    # First and last visible column and row of each tile
+    visible_cols = visible.any(axis=2)
+    visible_rows = visible.any(axis=3)
+    bounds = numpy.stack((
+        visible_cols.argmax(axis=2),
+        visible_rows.argmax(axis=2),
+        size_x - visible_cols[..., ::-1].argmax(axis=2),
+        size_y - visible_rows[..., ::-1].argmax(axis=2),
+    ), axis=-1).astype(numpy.int32)
+
+    # Fully transparent pixels hash the same whatever their color
+    tiles[~visible] = 0
+    hashes = [[hashlib.blake2b(tiles[y, x].tobytes(), digest_size=8).hexdigest()
+               for x in range(tiles.shape[1])]
+              for y in range(tiles.shape[0])]
+
+    sprytile_stats.end("tile_analysis", stat_start)
+    return TileAnalysis((size_x, size_y), states, bounds, hashes, numpy.ascontiguousarray(alpha))
+
+
+def get_pixel_checksum(image):
+    """Checksum of an image's pixels as they are in Blender"""
+    width, height = image.size
+    pixels = numpy.empty(width * height * 4, dtype=numpy.float32)
+    image.pixels.foreach_get(pixels)
+    return hashlib.blake2b(pixels, digest_size=8).hexdigest()
+
+
+# Image name -> generation, bumped when the image's pixels are seen to change
+generations = {}
+# Image name -> pixel checksum, of images edited inside Blender
+checksums = {}
+# Images checksummed since the last update that could have changed their pixels
+checked = set()
+
+
+def get_generation(image):
+    """
+    Generation of an image's pixels. Changes to the image file are only seen
+    once the image is reloaded, the reload operators invalidate the image's
+    analysis. Pixels edited inside Blender, by texture paint or on a
+    generated image, aren't in the file, so those images are checksummed,
+    at most once between the image updates, mode changes and undo steps
+    that can change them.
+    """
+    name = image.name
+    if (image.is_dirty or image.source == 'GENERATED') and name not in checked:
+        checked.add(name)
+        checksum = get_pixel_checksum(image)
+        previous = checksums.get(name)
+        checksums[name] = checksum
+        if previous is not None and previous != checksum:
+            generations[name] = generations.get(name, 0) + 1
+    return generations.get(name, 0)
+
+
+def get_cache_key(image, tile_grid):
+    return (image.filepath, tuple(image.size), get_generation(image),
+            tuple(tile_grid.grid), tuple(tile_grid.padding), tuple(tile_grid.margin),
+            tuple(tile_grid.offset), round(tile_grid.rotate, 5))
+
+
+# Image name -> (cache key, TileAnalysis)
+cache = {}
+
+
+def get_analysis(image, tile_grid):
+    """
+    The tile analysis of an image for a tile grid, analyzed on first use
+    :return: TileAnalysis or None
+    """
+    if image is None or tile_grid is None:
+        return None
+    key = get_cache_key(image, tile_grid)
+    cached = cache.get(image.name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    analysis = analyze(image, tile_grid)
+    cache[image.name] = (key, analysis)
+    return analysis
+
+
+def get_grid_analysis(obj, tile_grid):
+    """The tile analysis of the texture of a tile grid"""
+    return get_analysis(sprytile_utils.get_grid_texture(obj, tile_grid), tile_grid)
+
+
+def invalidate(image=None):
+    """Drop the cached analysis of an image, or of all images"""
+    if image is None:
+        cache.clear()
+        checksums.clear()
+        checked.clear()
+    else:
+        cache.pop(image.name, None)
+        checksums.pop(image.name, None)
+        checked.discard(image.name)
+
+
+# Object mode at the last depsgraph update
+last_mode = None
+
+
+@persistent
+def sprytile_tiles_depsgraph_handler(scene, depsgraph):
+    global last_mode
+    # Only image updates need edited images checked again, not the mesh
+    # updates of every Sprytile stroke. Texture paint strokes aren't always
+    # seen as image updates, but leaving texture paint is a mode change
+    mode = bpy.context.mode
+    if mode != last_mode:
+        last_mode = mode
+        checked.clear()
+    for update in depsgraph.updates:
+        id_data = update.id.original
+        if isinstance(id_data, bpy.types.Image):
+            # Already a new generation, the next check only takes the new checksum
+            generations[id_data.name] = generations.get(id_data.name, 0) + 1
+            checksums.pop(id_data.name, None)
+            checked.discard(id_data.name)
+
+
+@persistent
+def sprytile_tiles_undo_handler(dummy):
+    # Undoing texture paint puts old pixels back
+    checked.clear()
+
+
+@persistent
+def sprytile_tiles_load_handler(dummy):
+    invalidate()
+
+
+undo_handlers = (
+    bpy.app.handlers.undo_post,
+    bpy.app.handlers.redo_post,
+)
+
+
+def register():
+    bpy.app.handlers.depsgraph_update_post.append(sprytile_tiles_depsgraph_handler)
+    bpy.app.handlers.load_post.append(sprytile_tiles_load_handler)
+    for handler in undo_handlers:
+        handler.append(sprytile_tiles_undo_handler)
+
+
+def unregister():
+    for handler in undo_handlers:
+        if sprytile_tiles_undo_handler in handler:
+            handler.remove(sprytile_tiles_undo_handler)
+    if sprytile_tiles_load_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(sprytile_tiles_load_handler)
+    if sprytile_tiles_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(sprytile_tiles_depsgraph_handler)
+    invalidate()
@@ -1,9 +1,9 @@
-import bpy
 from math import floor, ceil
 from mathutils import Vector, Quaternion
 from mathutils.geometry import distance_point_to_plane
 
 import sprytile_utils
+import sprytile_journal
 import sprytile_uv
 import sprytile_preview
 
@@ -13,25 +13,24 @@ class ToolBuild:
     start_coord = None
     can_build = False
 
-    def __init__(self, modal, rx_source):
+    def __init__(self, modal, event_bus):
         self.modal = modal
-        rx_source.filter(
-            lambda modal_evt: modal_evt.paint_mode == 'MAKE_FACE'
-        ).subscribe(
-            on_next=lambda modal_evt: self.process_tool(modal_evt),
-            on_error=lambda err: self.handle_error(err),
-            on_completed=lambda: self.handle_complete()
+        event_bus.subscribe(
+            'MAKE_FACE',
+            on_next=self.process_tool,
+            on_error=self.handle_error,
+            on_completed=self.handle_complete
         )
 
     def process_tool(self, modal_evt):
-        if self.modal.rx_data is None:
+        if self.modal.tool_data is None:
             return
 
         # get the context arguments
-        context = self.modal.rx_data.context
+        context = self.modal.tool_data.context
         scene = context.scene
-        ray_origin = self.modal.rx_data.ray_origin
-        ray_vector = self.modal.rx_data.ray_vector
+        ray_origin = self.modal.tool_data.ray_origin
+        ray_vector = self.modal.tool_data.ray_vector
 
         if modal_evt.left_down:
             is_start = self.left_down is False
@@ -41,7 +40,8 @@ class ToolBuild:
             self.left_down = False
             self.start_coord = None
             # self.modal.virtual_cursor.clear()
-            bpy.ops.ed.undo_push()
+            self.modal.weld_stroke(context)
+            sprytile_journal.end_stroke(context, "Sprytile Build")
 
         #if modal_evt.build_preview:
         #    self.build_preview(context, scene, ray_origin, ray_vector)
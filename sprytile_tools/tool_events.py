@@ -0,0 +1,127 @@
+class ToolData:
+    """Per modal event data shared by the tools"""
+    __slots__ = ("context", "ray_vector", "ray_origin")
+
+    def __init__(self, context, ray_vector, ray_origin):
+        self.context = context
+        self.ray_vector = ray_vector
+        self.ray_origin = ray_origin
+
+
+class ToolEvent:
+    """Event record pushed from the modal operator to the tools"""
+    __slots__ = ("paint_mode", "event", "left_down", "build_preview")
+
+    def __init__(self, paint_mode, event, left_down, build_preview):
+        self.paint_mode = paint_mode
+        self.event = event
+        self.left_down = left_down
+        self.build_preview = build_preview
+
+
+class ToolEventBus:
+    """
+    Dispatches tool events to the tools subscribed to the event's paint mode.
+    Follows the observer contract the tools were written against: events are
+    delivered with on_next until on_completed or on_error is called once, after
+    which the bus is stopped and ignores everything else.
+    """
+    __slots__ = ("handlers", "observers", "is_stopped")
+
+    def __init__(self):
+        # paint_mode -> list of on_next callbacks, the hot path
+        self.handlers = {}
+        # (paint_mode, on_next, on_error, on_completed) per subscription
+        self.observers = []
+        self.is_stopped = False
+
+    def subscribe(self, paint_mode, on_next, on_error=None, on_completed=None):
+        """
+        Subscribe a tool to events for a paint mode
+        :param paint_mode: paint_mode value of the events to receive
+        :param on_next: Called with each ToolEvent
+        :param on_error: Called with the exception if the bus errors
+        :param on_completed: Called once the modal operator exits
+        :return: Function that removes the subscription
+        """
+        observer = (paint_mode, on_next, on_error, on_completed)
+        self.observers.append(observer)
+        self.handlers.setdefault(paint_mode, []).append(on_next)
+
+        def dispose():
+            self.remove(observer)
+        return dispose
+
+    def remove(self, observer):
+        if observer not in self.observers:
+            return
+        self.observers.remove(observer)
+        paint_mode, on_next = observer[0], observer[1]
+        handlers = self.handlers[paint_mode]
+        handlers.remove(on_next)
+        if len(handlers) == 0:
+            del self.handlers[paint_mode]
+
+    def on_next(self, tool_event):
+        if self.is_stopped:
+            return
+        handlers = self.handlers.get(tool_event.paint_mode)
+        if handlers is None:
+            return
+        for on_next in handlers:
+            on_next(tool_event)
+
+    def on_error(self, err):
+        if self.is_stopped:
+            return
+        self.is_stopped = True
+        observers = self.observers
+        self.observers = []
+        self.handlers = {}
+        for observer in observers:
+            if observer[2] is not None:
+                observer[2](err)
+
+    def on_completed(self):
+        if self.is_stopped:
+            return
+        self.is_stopped = True
+        observers = self.observers
+        self.observers = []
+        self.handlers = {}
+        for observer in observers:
+            if observer[3] is not None:
+                observer[3]()
+
+
+class EventThrottle:
+    """
+    Backpressure for work driven by a stream of events, like stroke steps or
+    preview rebuilds. After the work runs, it is not ready again until the
+    longer of the minimum interval or the duration of that run has passed.
+    Events that queued up while slow work was running fall inside that
+    window and can be dropped, so the work catches up with the cursor
+    instead of replaying every stale position.
+    """
+    __slots__ = ("interval", "start_time", "ready_time")
+
+    def __init__(self, interval=0.0):
+        """
+        :param interval: Minimum seconds between the end of one run and the start of the next
+        """
+        self.interval = interval
+        self.start_time = 0.0
+        self.ready_time = 0.0
+
+    def is_ready(self, now):
+        return now >= self.ready_time
+
+    def begin(self, now):
+        self.start_time = now
+
+    def end(self, now):
+        cost = now - self.start_time
+        self.ready_time = now + max(self.interval, cost)
+
+    def reset(self):
+        self.ready_time = 0.0
@@ -1,43 +1,52 @@
-import bpy
 import numpy
 from mathutils import Matrix
 from mathutils.geometry import intersect_line_plane
 
 import sprytile_utils
+import sprytile_journal
 import sprytile_uv
+import sprytile_bvh
 from sprytile_uv import UvDataLayers
+from sprytile_jobs import SprytileJob, MeshSnapshot
 
 class ToolFill:
     modal = None
     left_down = False
+    # The job runner pushes the undo step for fills it runs
+    ran_job = False
 
-    def __init__(self, modal, rx_source):
+    def __init__(self, modal, event_bus):
         self.modal = modal
-        rx_source.filter(
-            lambda modal_evt: modal_evt.paint_mode == 'FILL'
-        ).subscribe(
-            on_next=lambda modal_evt: self.process_tool(modal_evt),
-            on_error=lambda err: self.handle_error(err),
-            on_completed=lambda: self.handle_complete()
+        event_bus.subscribe(
+            'FILL',
+            on_next=self.process_tool,
+            on_error=self.handle_error,
+            on_completed=self.handle_complete
         )
 
     def process_tool(self, modal_evt):
-        if self.modal.rx_data is None:
+        if self.modal.tool_data is None:
             return
 
         # get the context arguments
-        context = self.modal.rx_data.context
+        context = self.modal.tool_data.context
         scene = context.scene
-        ray_origin = self.modal.rx_data.ray_origin
-        ray_vector = self.modal.rx_data.ray_vector
+        ray_origin = self.modal.tool_data.ray_origin
+        ray_vector = self.modal.tool_data.ray_vector
 
         if modal_evt.left_down:
             if self.left_down is False:
                 self.left_down = True
-                self.execute_fill(context, scene, ray_origin, ray_vector)
+                job = self.execute_fill(context, scene, ray_origin, ray_vector)
+                self.ran_job = job is not None
+                if job is not None:
+                    self.modal.job_runner.start(context, job)
         elif self.left_down:
             self.left_down = False
-            bpy.ops.ed.undo_push()
+            if not self.ran_job:
+                self.modal.weld_stroke(context)
+                sprytile_journal.end_stroke(context, "Sprytile Fill")
+            self.ran_job = False
 
     def handle_error(self, err):
         pass
@@ -46,13 +55,17 @@ class ToolFill:
         pass
 
     def execute_fill(self, context, scene, ray_origin, ray_vector):
+        """
+        Set up a fill from the work plane coordinate under the mouse
+        :return: SprytileJob that builds the fill, or None if there is nothing to fill
+        """
         up_vector, right_vector, plane_normal = sprytile_utils.get_current_grid_vectors(scene, with_rotation=False)
 
         # Intersect on the virtual plane
         plane_hit = intersect_line_plane(ray_origin, ray_origin + ray_vector, scene.cursor.location, plane_normal)
         # Didn't hit the plane exit
         if plane_hit is None:
-            return
+            return None
         grid = sprytile_utils.get_grid(context, context.object.sprytile_gridid)
         sprytile_data = scene.sprytile_data
 
@@ -78,14 +91,43 @@ class ToolFill:
             grid_max[0] += x_offset
 
         if hit_coord.x < grid_min[0] or hit_coord.x >= grid_max[0]:
-            return
+            return None
         if hit_coord.y < grid_min[1] or hit_coord.y >= grid_max[1]:
-            return
+            return None
+
+        snapshot = MeshSnapshot(context.object)
+
+        def rollback(context):
+            snapshot.restore(context)
+            sprytile_bvh.invalidate(context.object.data)
+            self.modal.update_bmesh_tree(context)
+
+        def on_finish(context):
+            self.modal.weld_stroke(context)
+            snapshot.free()
 
-        # Build the fill map
+        steps = self.fill_steps(context, scene, grid, hit_coord, grid_up, grid_right,
+                                plane_normal, plane_size, grid_min, grid_max)
+        return SprytileJob("Sprytile Fill", steps, rollback, on_finish)
+
+    def fill_steps(self, context, scene, grid, hit_coord, grid_up, grid_right,
+                   plane_normal, plane_size, grid_min, grid_max):
+        """
+        Generator running the fill, yields the progress after each row of the
+        fill map and each built face. See SprytileJob
+        """
+        sprytile_data = scene.sprytile_data
+
+        # Build the fill map, the first half of the work
         sel_coords, sel_size, sel_ids = sprytile_utils.get_grid_selection_ids(context, grid)
-        fill_map, face_idx_array = self.build_fill_map(context, grid_up, grid_right, plane_normal,
-                                                       plane_size, grid_min, grid_max, sel_ids)
+        fill_map = numpy.full((plane_size[1], plane_size[0]), -1)
+        face_idx_array = numpy.full((plane_size[1], plane_size[0]), -1)
+        row_count = grid_max[1] - grid_min[1]
+        for idx_y in range(row_count):
+            self.build_fill_map_row(context, grid_up, grid_right, plane_normal,
+                                    grid_min, grid_max, idx_y, sel_ids,
+                                    fill_map[idx_y], face_idx_array[idx_y])
+            context = (yield 0.5 * (idx_y + 1) / row_count) or context
 
         # Convert from grid coordinate to map coordinate
         hit_array_coord = [int(hit_coord.x) - grid_min[0],
@@ -119,6 +161,7 @@ class ToolFill:
         origin_xy = (grid.tile_selection[0], grid.tile_selection[1])
         data = scene.sprytile_data
         # Loop through list of coords to be filled
+        fill_count = len(fill_coords)
         for idx, cell_coord in enumerate(fill_coords):
             # Fetch the paint settings from cache
             if paint_setting_cache is not None:
@@ -140,37 +183,30 @@ class ToolFill:
                                       plane_normal,
                                       require_base_layer=require_base_layer,
                                       work_layer_mask=work_layer_mask)
+            context = (yield 0.5 + 0.5 * (idx + 1) / fill_count) or context
 
-    def build_fill_map(self, context, grid_up, grid_right,
-                       plane_normal, plane_size, grid_min, grid_max,
-                       selected_ids):
-        # Use raycast_grid_coord to build a 2d array of work plane
-
-        fill_array = numpy.full((plane_size[1], plane_size[0]), -1)
-        face_idx_array = numpy.full((plane_size[1], plane_size[0]), -1)
-        idx_y = 0
+    def build_fill_map_row(self, context, grid_up, grid_right,
+                           plane_normal, grid_min, grid_max, idx_y,
+                           selected_ids, fill_row, face_idx_row):
+        # Use raycast_grid_coord to build one row of the 2d array of work plane
+        y = grid_min[1] + idx_y
         idx_x = 0
-        for y in range(grid_min[1], grid_max[1]):
-            for x in range(grid_min[0], grid_max[0]):
-                hit_loc, hit_normal, face_index, hit_dist = self.modal.raycast_grid_coord(
-                                                                context, x, y,
-                                                                grid_up, grid_right, plane_normal)
-
-                if hit_loc is not None:
-                    grid_id, tile_packed_id, width, height, origin = self.modal.get_tiledata_from_index(face_index)
-                    map_value = 1
-                    if tile_packed_id is not None:
-                        map_value = tile_packed_id
-                        if selected_ids is not None and tile_packed_id in selected_ids:
-                            map_value = selected_ids[0]
-                    fill_array[idx_y][idx_x] = map_value
-                    face_idx_array[idx_y][idx_x] = face_index
-
-                idx_x += 1
-            idx_x = 0
-            idx_y += 1
-
-        return fill_array, face_idx_array
+        for x in range(grid_min[0], grid_max[0]):
+            hit_loc, hit_normal, face_index, hit_dist = self.modal.raycast_grid_coord(
+                                                            context, x, y,
+                                                            grid_up, grid_right, plane_normal)
+
+            if hit_loc is not None:
+                grid_id, tile_packed_id, width, height, origin = self.modal.get_tiledata_from_index(face_index)
+                map_value = 1
+                if tile_packed_id is not None:
+                    map_value = tile_packed_id
+                    if selected_ids is not None and tile_packed_id in selected_ids:
+                        map_value = selected_ids[0]
+                fill_row[idx_x] = map_value
+                face_idx_row[idx_x] = face_index
+
+            idx_x += 1
 
     @staticmethod
     def scan_line(fill_map, test_x, test_y, current, old_tile_idx, fill_stack):
@@ -1,8 +1,8 @@
-import bpy
 import bmesh
 from mathutils import Vector, Matrix, Quaternion
 
 import sprytile_utils
+import sprytile_journal
 import sprytile_uv
 import sprytile_preview
 import sprytile_modal
@@ -12,32 +12,31 @@ class ToolPaint:
     modal = None
     left_down = False
 
-    def __init__(self, modal, rx_source):
+    def __init__(self, modal, event_bus):
         self.modal = modal
-        rx_source.filter(
-            lambda modal_evt: modal_evt.paint_mode == 'PAINT'
-        ).subscribe(
-            on_next=lambda modal_evt: self.process_tool(modal_evt),
-            on_error=lambda err: self.handle_error(err),
-            on_completed=lambda: self.handle_complete()
+        event_bus.subscribe(
+            'PAINT',
+            on_next=self.process_tool,
+            on_error=self.handle_error,
+            on_completed=self.handle_complete
         )
 
     def process_tool(self, modal_evt):
-        if self.modal.rx_data is None:
+        if self.modal.tool_data is None:
             return
 
         # get the context arguments
-        context = self.modal.rx_data.context
+        context = self.modal.tool_data.context
         scene = context.scene
-        ray_origin = self.modal.rx_data.ray_origin
-        ray_vector = self.modal.rx_data.ray_vector
+        ray_origin = self.modal.tool_data.ray_origin
+        ray_vector = self.modal.tool_data.ray_vector
 
         if modal_evt.left_down:
             self.left_down = True
             self.execute(context, scene, ray_origin, ray_vector)
         elif self.left_down:
             self.left_down = False
-            bpy.ops.ed.undo_push()
+            sprytile_journal.end_stroke(context, "Sprytile Paint")
 
         #if modal_evt.build_preview:
         #    self.build_preview(context, scene, ray_origin, ray_vector)
@@ -0,0 +1,149 @@
+import gzip
+import json
+import time
+
+import sprytile_utils
+
+FORMAT_VERSION = 1
+
+PAINT_MODES = ('MAKE_FACE', 'PAINT', 'FILL', 'SET_NORMAL')
+
+# Scene settings the tools read while running a stroke
+STROKE_SETTINGS = (
+    'work_layer',
+    'work_layer_mode',
+    'mesh_decal_offset',
+    'world_pixels',
+    'lock_normal',
+    'paint_normal_vector',
+    'paint_up_vector',
+    'snap_translate',
+    'uv_flip_x',
+    'uv_flip_y',
+    'mesh_rotate',
+    'cursor_snap',
+    'cursor_flow',
+    'paint_align',
+    'paint_hinting',
+    'paint_stretch_x',
+    'paint_stretch_y',
+    'paint_edge_snap',
+    'edge_threshold',
+    'paint_uv_snap',
+    'auto_merge',
+    'merge_at_stroke_end',
+    'trim_alpha',
+    'build_cutout',
+    'cutout_budget',
+    'auto_join',
+    'allow_backface',
+    'fill_lock_transform',
+    'fill_plane_size',
+)
+
+
+def capture_settings(context):
+    """Snapshot of the settings a stroke depends on"""
+    sprytile_data = context.scene.sprytile_data
+    settings = {}
+    for name in STROKE_SETTINGS:
+        value = getattr(sprytile_data, name)
+        if not isinstance(value, (bool, int, float, str)):
+            value = list(value)
+        settings[name] = value
+
+    obj = context.object
+    grid = sprytile_utils.get_grid(context, obj.sprytile_gridid)
+    return {
+        "settings": settings,
+        "cursor": list(context.scene.cursor.location),
+        "grid_id": obj.sprytile_gridid,
+        "tile_selection": list(grid.tile_selection) if grid is not None else None,
+    }
+
+
+def apply_settings(context, stroke):
+    sprytile_data = context.scene.sprytile_data
+    for name, value in stroke["settings"].items():
+        setattr(sprytile_data, name, value)
+    context.scene.cursor.location = stroke["cursor"]
+
+    obj = context.object
+    if sprytile_utils.get_grid(context, stroke["grid_id"]) is not None:
+        obj.sprytile_gridid = stroke["grid_id"]
+    grid = sprytile_utils.get_grid(context, obj.sprytile_gridid)
+    if grid is not None and stroke["tile_selection"] is not None:
+        grid.tile_selection = stroke["tile_selection"]
+
+
+class StrokeRecorder:
+    """
+    Records the inputs the modal tool sends to the tools, one stroke per
+    modal operator run. Each event is stored as a row of
+    [paint mode index, left down, ray origin xyz, ray vector xyz, seconds since stroke start]
+    """
+    def __init__(self):
+        self.filepath = None
+        self.strokes = []
+        self.stroke = None
+        self.start_time = 0.0
+
+    @property
+    def is_recording(self):
+        return self.filepath is not None
+
+    def start(self, filepath):
+        self.filepath = filepath
+        self.strokes = []
+        self.stroke = None
+
+    def begin_stroke(self, context):
+        self.stroke = capture_settings(context)
+        self.stroke["events"] = []
+        self.start_time = time.perf_counter()
+
+    def record(self, paint_mode, left_down, tool_data):
+        if self.stroke is None or tool_data is None:
+            return
+        row = [PAINT_MODES.index(paint_mode), 1 if left_down else 0]
+        row.extend(tool_data.ray_origin)
+        row.extend(tool_data.ray_vector)
+        row.append(round(time.perf_counter() - self.start_time, 4))
+        self.stroke["events"].append(row)
+
+    def end_stroke(self):
+        if self.stroke is None:
+            return
+        if len(self.stroke["events"]) > 0:
+            self.strokes.append(self.stroke)
+        self.stroke = None
+
+    def stop(self):
+        """
+        Stop recording and write the recorded strokes
+        :return: Number of strokes written
+        """
+        self.end_stroke()
+        stroke_count = len(self.strokes)
+        save_strokes(self.filepath, self.strokes)
+        self.filepath = None
+        self.strokes = []
+        return stroke_count
+
+
+def save_strokes(filepath, strokes):
+    data = {"version": FORMAT_VERSION, "strokes": strokes}
+    with gzip.open(filepath, 'wt', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+
+
+def load_strokes(filepath):
+    with gzip.open(filepath, 'rt', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get("version") != FORMAT_VERSION:
+        raise ValueError("Unsupported stroke file version: {0}".format(data.get("version")))
+    return data["strokes"]
+
+
+# Fed the tool inputs by the modal tool while recording
+recorder = StrokeRecorder()
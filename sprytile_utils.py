@@ -17,6 +17,7 @@ from datetime import datetime
 from os import path
 import sprytile_modal
 import sprytile_preview
+import sprytile_tiles
 import addon_updater_ops
 
 
@@ -975,6 +976,8 @@ class UTIL_OP_SprytileLoadTileset(bpy.types.Operator, ImportHelper):
                 bpy.ops.sprytile.viewport_setup('INVOKE_DEFAULT')
             if addon_prefs.auto_grid_setup:
                 bpy.ops.sprytile.setup_grid('INVOKE_DEFAULT')
+            if addon_prefs.auto_grid_detect:
+                bpy.ops.sprytile.detect_grid('INVOKE_DEFAULT')
 
 
 class UTIL_OP_SprytileNewTileset(bpy.types.Operator, ImportHelper):
@@ -1229,6 +1232,7 @@ class UTIL_OP_SprytileReloadImages(bpy.types.Operator):
             if img is None:
                 continue
             img.reload()
+            sprytile_tiles.invalidate(img)
         for window in context.window_manager.windows:
             for area in window.screen.areas:
                 if area.type in {'VIEW_3D', 'IMAGE_EDITOR'}:
@@ -1270,6 +1274,7 @@ class UTIL_OP_SprytileReloadImagesAuto(bpy.types.Operator):
             if self.last_check_time is None or filetime > self.last_check_time:
                 print("Reloading", img.filepath)
                 img.reload()
+                sprytile_tiles.invalidate(img)
                 did_reload = True
         self.last_check_time = datetime.now()
         return did_reload
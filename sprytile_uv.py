@@ -4,6 +4,9 @@ import bmesh
 from mathutils import Vector, Matrix
 
 import sprytile_utils
+import sprytile_bvh
+import sprytile_journal
+import sprytile_stats
 
 
 class UvDataLayers:
@@ -235,7 +238,8 @@ def get_uv_paint_modify(data, uv_verts, uv_matrix, pad_scale, uv_unit_x, uv_unit
     return uv_verts
 
 
-def uv_map_face(context, up_vector, right_vector, tile_xy, origin_xy, face_index, mesh, tile_size=(1, 1)):
+def uv_map_face(context, up_vector, right_vector, tile_xy, origin_xy, face_index, mesh, tile_size=(1, 1),
+                vert_origin=None):
     """
     UV map the given face
     :param context:
@@ -246,6 +250,7 @@ def uv_map_face(context, up_vector, right_vector, tile_xy, origin_xy, face_index
     :param face_index: Face index to UV map
     :param mesh:
     :param tile_size: Tile units being UV mapped
+    :param vert_origin: World position the tile is centered on, defaults to the center of the face
     :return:
     """
     if mesh is None:
@@ -271,7 +276,8 @@ def uv_map_face(context, up_vector, right_vector, tile_xy, origin_xy, face_index
     if face.hide:
         return None, None
 
-    vert_origin = context.object.matrix_world @ face.calc_center_bounds()
+    if vert_origin is None:
+        vert_origin = context.object.matrix_world @ face.calc_center_bounds()
     verts = []
     for loop in face.loops:
         vert = loop.vert
@@ -310,6 +316,9 @@ def apply_uvs(context, face, uv_verts, target_grid,
     if uv_layer is None:
         uv_layer = mesh.loops.layers.uv.verify()
 
+    # Keep what the face looked like before this stroke, for undo
+    sprytile_journal.record_face(mesh, face)
+
     # Apply the UV positions on the face verts
     idx = 0
     for loop in face.loops:
@@ -350,9 +359,13 @@ def apply_uvs(context, face, uv_verts, target_grid,
     face[grid_sel_height] = sel_height
     face[grid_sel_origin] = origin_id
     face[paint_settings_id] = paint_settings
+    if face[work_layer_id] != work_layer_data:
+        sprytile_bvh.set_face_layer(context.object.data, face.index, work_layer_data)
     face[work_layer_id] = work_layer_data
 
+    stat_start = sprytile_stats.begin()
     bmesh.update_edit_mesh(context.object.data)
+    sprytile_stats.end("update_edit_mesh", stat_start)
     mesh.faces.index_update()
 
     return face.index, target_grid